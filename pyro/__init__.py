@@ -22,6 +22,18 @@ CORRIDOR = 4
 BLOCKING = (WALL, VOID)
 WALKABLE = (ROOM, FLOOR, CORRIDOR)
 
+# stored in GameMap.room_id for cells that don't belong to any room
+NO_ROOM = -1
+
+# feature codes stored in GameMap.feature; FEATURES maps a code to its gamedata name.
+FEATURE_NONE = 0
+FEATURE_FLOOR = 1
+FEATURE_DIRT = 2
+FEATURE_GRASS = 3
+FEATURE_WATER = 4
+
+FEATURES = (None, "floor", "dirt", "grass", "water")
+
 
 class PotionType(Enum):
     HEALTH = 0
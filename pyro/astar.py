@@ -1,82 +1,458 @@
 """
-http://code.activestate.com/recipes/578919-python-a-pathfinding-with-binary-heap/
+A* path finding over the cells of a GameMap.
+
+Cells are addressed by their flat index in the map arrays (x * height + y) and neighbors are
+expanded with the walkable neighbor masks of the map (see GameMap.neighbor_masks()), so a search
+never builds Vector2's or GameCell's until the path is returned. Scores live in flat buffers reused
+between searches: instead of clearing them, each search has its own stamp and a value is valid only
+when it was written with the current stamp.
+
+On maps without cost multipliers, jump_search() finds paths of the same cost with Jump Point Search:
+straight and diagonal runs across open areas are scanned without pushing their cells on the open
+list, so a search through large rooms expands a handful of nodes.
 """
+import math
 import heapq
-from .utils import Direction
-from . import WALL, VOID
+import weakref
+from .gamemap import NEIGHBOR_OFFSETS, MASK_DIRECTIONS, MASK_CARDINAL_DIRECTIONS
+from .journal import CHANGED_KIND
+from .utils import Vector2
+
+
+DIAGONAL_COST = math.sqrt(2)
+# maps larger than this (in cells) use dictionaries instead of flat buffers
+FLAT_BUFFERS_LIMIT = 1 << 20
+
+
+class _FlatLayer:
+    """Flat index access to a ChunkedLayer"""
+
+    def __init__(self, layer, height):
+        self.layer = layer
+        self.height = height
+
+    def __getitem__(self, index):
+        x, y = divmod(index, self.height)
+        return self.layer[x, y]
+
+
+class AStar:
+    """A* engine for a GameMap.
+
+    With `diagonal` moves the path costs are octile distances (a diagonal step costs sqrt(2)),
+    otherwise Manhattan distances. `costs` is an optional (width, height) array of cost multipliers,
+    one for each cell and all of them >= 1, applied to the steps entering the cell.
+    """
+
+    def __init__(self, game_map):
+        # engines are cached by map: don't keep the map alive
+        self._game_map = weakref.ref(game_map)
+        self.width = game_map.width
+        self.height = game_map.height
+
+        size = self.width * self.height
+        self.flat_buffers = size <= FLAT_BUFFERS_LIMIT and not game_map.chunked
+        if self.flat_buffers:
+            self._seen = [0] * size
+            self._closed = [0] * size
+            self._g = [0.0] * size
+            self._parent = [0] * size
+        self._stamp = 0
+
+        # walkable neighbor masks, flattened, and the map version they were copied at
+        self._walk = None
+        self._version = None
+
+        self._moves = {
+            True: self._build_moves(MASK_DIRECTIONS),
+            False: self._build_moves(MASK_CARDINAL_DIRECTIONS),
+        }
+        # (dx, dy) -> neighbor mask bit
+        self._bits = {offset: 1 << bit for bit, offset in enumerate(NEIGHBOR_OFFSETS)}
+        # number of nodes expanded by the last search
+        self.expanded = 0
+
+    @property
+    def game_map(self):
+        return self._game_map()
+
+    def _build_moves(self, mask_directions):
+        """For each neighbor mask, the (index delta, step cost) of each allowed move"""
 
+        return tuple(
+            tuple(
+                (d.x * self.height + d.y, DIAGONAL_COST if d.x and d.y else 1.0) for d in directions
+            )
+            for directions in mask_directions
+        )
 
-class PriorityQueue:
-    def __init__(self):
-        self.elements = []
+    def _sync(self):
+        """Bring the flattened walkable masks up to date with the map"""
 
-    def empty(self):
-        return len(self.elements) == 0
+        game_map = self.game_map
+        if self._version == game_map.version:
+            return
 
-    def put(self, item, priority):
-        heapq.heappush(self.elements, (priority, item))
+        walk = game_map.neighbor_masks()[0]
+        changes = None
+        if self._version is not None:
+            changes = game_map.journal.changes_since(self._version)
 
-    def get(self):
-        return heapq.heappop(self.elements)[1]
+        if game_map.chunked:
+            self._walk = _FlatLayer(walk, self.height)
+        elif changes is None:
+            self._walk = walk.ravel().tolist()
+        else:
+            for (x, y), flags in changes.items():
+                if not flags & CHANGED_KIND:
+                    continue
+                for nx in range(max(x - 1, 0), min(x + 2, self.width)):
+                    for ny in range(max(y - 1, 0), min(y + 2, self.height)):
+                        self._walk[nx * self.height + ny] = int(walk[nx, ny])
+        self._version = game_map.version
 
-    def contain(self, item):
-        for _, i in self.elements:
-            if i == item:
-                return True
-        return False
+    def _buffers(self):
+        """Return a new stamp and the seen, closed, g score and parent buffers"""
 
+        self._stamp += 1
+        if self.flat_buffers:
+            return self._stamp, self._seen, self._closed, self._g, self._parent
+        return self._stamp, _Stamps(), _Stamps(), {}, {}
 
-def _heuristic(a, b):
-    """Heuristic between two Vector2's"""
+    def search(self, start, goal, diagonal=True, max_nodes=None, costs=None):
+        """Return the path from start to goal as a list of Vector2's.
 
-    return abs(a.x - b.x) + abs(a.y - b.y)
+        The path doesn't include the start position and ends with the goal; it's empty when the
+        goal can't be reached or when more than `max_nodes` nodes would be expanded.
+        """
+
+        self._sync()
+        walk = self._walk
+        moves = self._moves[bool(diagonal)]
+        height = self.height
+        stamp, seen, closed, g, parent = self._buffers()
+        if costs is not None:
+            costs = costs.ravel().tolist()
+
+        gx, gy = goal.x, goal.y
+        start_index = start.x * height + start.y
+        goal_index = gx * height + gy
+
+        seen[start_index] = stamp
+        g[start_index] = 0.0
+        parent[start_index] = -1
+        heap = [(0.0, start_index)]
+        heappush = heapq.heappush
+        heappop = heapq.heappop
+        diagonal_extra = DIAGONAL_COST - 2
+
+        expanded = 0
+        while heap:
+            _, index = heappop(heap)
+            if closed[index] == stamp:
+                # a stale entry, the node was already reached with a lower cost
+                continue
+            if index == goal_index:
+                self.expanded = expanded
+                return self._path(parent, index)
+
+            if expanded == max_nodes:
+                break
+            closed[index] = stamp
+            expanded += 1
+
+            g_index = g[index]
+            for delta, step in moves[walk[index]]:
+                neighbor = index + delta
+                if closed[neighbor] == stamp:
+                    continue
+                if costs is None:
+                    cost = g_index + step
+                else:
+                    cost = g_index + step * costs[neighbor]
+                if seen[neighbor] == stamp and cost >= g[neighbor]:
+                    continue
+
+                seen[neighbor] = stamp
+                g[neighbor] = cost
+                parent[neighbor] = index
+                x, y = divmod(neighbor, height)
+                dx = abs(x - gx)
+                dy = abs(y - gy)
+                if diagonal:
+                    # octile distance
+                    h = dx + dy + diagonal_extra * min(dx, dy)
+                else:
+                    h = dx + dy
+                heappush(heap, (cost + h, neighbor))
+
+        self.expanded = expanded
+        return []
+
+    def jump_search(self, start, goal, diagonal=True, max_nodes=None, costs=None):
+        """Like search(), with Jump Point Search.
+
+        Paths have the same cost as the ones of search(), though they may take other cells. With
+        `costs` JPS doesn't apply and this is just search(); `max_nodes` counts jump points.
+        """
+
+        if costs is not None:
+            return self.search(start, goal, diagonal, max_nodes, costs)
+
+        self._sync()
+        height = self.height
+        stamp, seen, closed, g, parent = self._buffers()
+
+        gx, gy = goal.x, goal.y
+        start_index = start.x * height + start.y
+        goal_index = gx * height + gy
+
+        seen[start_index] = stamp
+        g[start_index] = 0.0
+        parent[start_index] = -1
+        heap = [(0.0, start_index)]
+        heappush = heapq.heappush
+        heappop = heapq.heappop
+        diagonal_extra = DIAGONAL_COST - 2
+
+        expanded = 0
+        while heap:
+            _, index = heappop(heap)
+            if closed[index] == stamp:
+                continue
+            if index == goal_index:
+                self.expanded = expanded
+                return self._jump_path(parent, index)
 
+            if expanded == max_nodes:
+                break
+            closed[index] = stamp
+            expanded += 1
 
-def astar(dungeon, start, goal, diagonal=True):
+            g_index = g[index]
+            for dx, dy in self._jump_directions(index, parent[index], diagonal):
+                found = self._jump(index, dx, dy, goal_index, diagonal)
+                if found is None:
+                    continue
+                jump_point, steps = found
+                if closed[jump_point] == stamp:
+                    continue
+                cost = g_index + steps * (DIAGONAL_COST if dx and dy else 1.0)
+                if seen[jump_point] == stamp and cost >= g[jump_point]:
+                    continue
+
+                seen[jump_point] = stamp
+                g[jump_point] = cost
+                parent[jump_point] = index
+                x, y = divmod(jump_point, height)
+                dx = abs(x - gx)
+                dy = abs(y - gy)
+                if diagonal:
+                    h = dx + dy + diagonal_extra * min(dx, dy)
+                else:
+                    h = dx + dy
+                heappush(heap, (cost + h, jump_point))
+
+        self.expanded = expanded
+        return []
+
+    def _jump_directions(self, index, parent_index, diagonal):
+        """Return the (dx, dy) directions worth scanning from a jump point"""
+
+        mask = self._walk[index]
+        if parent_index == -1:
+            directions = MASK_DIRECTIONS[mask] if diagonal else MASK_CARDINAL_DIRECTIONS[mask]
+            return [(d.x, d.y) for d in directions]
+
+        bits = self._bits
+        px, py = divmod(parent_index, self.height)
+        x, y = divmod(index, self.height)
+        dx = (x > px) - (x < px)
+        dy = (y > py) - (y < py)
+
+        if diagonal:
+            if dx and dy:
+                directions = [(dx, 0), (0, dy), (dx, dy)]
+                if not mask & bits[(-dx, 0)]:
+                    directions.append((-dx, dy))
+                if not mask & bits[(0, -dy)]:
+                    directions.append((dx, -dy))
+            elif dx:
+                directions = [(dx, 0)]
+                for side in (1, -1):
+                    if not mask & bits[(0, side)]:
+                        directions.append((dx, side))
+            else:
+                directions = [(0, dy)]
+                for side in (1, -1):
+                    if not mask & bits[(side, 0)]:
+                        directions.append((side, dy))
+        elif dx:
+            # horizontal runs may turn at any cell
+            directions = [(dx, 0), (0, 1), (0, -1)]
+        else:
+            directions = [(0, dy)]
+            for side in (1, -1):
+                if not mask & bits[(side, -dy)]:
+                    directions.append((side, 0))
+        return [d for d in directions if mask & bits[d]]
+
+    def _jump(self, index, dx, dy, goal_index, diagonal):
+        """Scan from a cell in one direction; return the (jump point, steps) found or None"""
+
+        walk = self._walk
+        bits = self._bits
+        bit = bits[(dx, dy)]
+        delta = dx * self.height + dy
+        steps = 0
+        while True:
+            if not walk[index] & bit:
+                return None
+            index += delta
+            steps += 1
+            if index == goal_index:
+                return index, steps
+
+            mask = walk[index]
+            if diagonal:
+                if dx and dy:
+                    # a forced neighbor, only reachable through this cell
+                    if (not mask & bits[(-dx, 0)] and mask & bits[(-dx, dy)]) or (
+                        not mask & bits[(0, -dy)] and mask & bits[(dx, -dy)]
+                    ):
+                        return index, steps
+                    if (
+                        self._jump(index, dx, 0, goal_index, True) is not None
+                        or self._jump(index, 0, dy, goal_index, True) is not None
+                    ):
+                        return index, steps
+                elif dx:
+                    if (not mask & bits[(0, 1)] and mask & bits[(dx, 1)]) or (
+                        not mask & bits[(0, -1)] and mask & bits[(dx, -1)]
+                    ):
+                        return index, steps
+                elif (not mask & bits[(1, 0)] and mask & bits[(1, dy)]) or (
+                    not mask & bits[(-1, 0)] and mask & bits[(-1, dy)]
+                ):
+                    return index, steps
+            elif dx:
+                if (
+                    self._jump(index, 0, 1, goal_index, False) is not None
+                    or self._jump(index, 0, -1, goal_index, False) is not None
+                ):
+                    return index, steps
+            elif (mask & bits[(1, 0)] and not mask & bits[(1, -dy)]) or (
+                mask & bits[(-1, 0)] and not mask & bits[(-1, -dy)]
+            ):
+                # a side passage opens
+                return index, steps
+
+    def _jump_path(self, parent, index):
+        """Return the path through a chain of jump points, filling the runs between them"""
+
+        height = self.height
+        path = []
+        while parent[index] != -1:
+            x, y = divmod(index, height)
+            px, py = divmod(parent[index], height)
+            dx = (x > px) - (x < px)
+            dy = (y > py) - (y < py)
+            for step in range(max(abs(x - px), abs(y - py))):
+                path.append(Vector2(x - step * dx, y - step * dy))
+            index = parent[index]
+        path.reverse()
+        return path
+
+    def dijkstra(self, target, diagonal=True, max_cost=None, stop=None):
+        """Return the walking cost from each cell to `target`, up to `max_cost`.
+
+        Return a (costs, truncated) tuple: costs is a dictionary mapping the flat index of each
+        reached cell to its cost, the same costs used by search(); since moves are symmetric they
+        are also the costs from the target to each cell. truncated is True when some cells were
+        not reached because of max_cost.
+
+        The cells whose flat index is in `stop`, other than the target, are reached but the search
+        doesn't go past them.
+        """
+
+        self._sync()
+        walk = self._walk
+        moves = self._moves[bool(diagonal)]
+        heappush = heapq.heappush
+        heappop = heapq.heappop
+
+        target_index = target.x * self.height + target.y
+        result = {}
+        truncated = False
+        best = {target_index: 0.0}
+        heap = [(0.0, target_index)]
+        while heap:
+            cost, index = heappop(heap)
+            if index in result:
+                continue
+            result[index] = cost
+            if stop is not None and index in stop and index != target_index:
+                continue
+            for delta, step in moves[walk[index]]:
+                neighbor = index + delta
+                new_cost = cost + step
+                if max_cost is not None and new_cost > max_cost:
+                    truncated = True
+                    continue
+                if new_cost < best.get(neighbor, new_cost + 1):
+                    best[neighbor] = new_cost
+                    heappush(heap, (new_cost, neighbor))
+        return result, truncated
+
+    def step_costs(self, index, diagonal=True):
+        """Iterate over (neighbor index, step cost) for the walkable neighbors of a cell"""
+
+        self._sync()
+        for delta, step in self._moves[bool(diagonal)][self._walk[index]]:
+            yield index + delta, step
+
+    def _path(self, parent, index):
+        path = []
+        height = self.height
+        while parent[index] != -1:
+            path.append(Vector2(*divmod(index, height)))
+            index = parent[index]
+        path.reverse()
+        return path
+
+
+class _Stamps(dict):
+    """Sparse stamp buffer for the maps too large for flat buffers"""
+
+    def __missing__(self, key):
+        return 0
+
+
+_engines = weakref.WeakKeyDictionary()
+
+
+def get_engine(game_map):
+    """Return the AStar engine of a map, creating it on first use"""
+
+    engine = _engines.get(game_map)
+    if engine is None:
+        engine = _engines[game_map] = AStar(game_map)
+    return engine
+
+
+def astar(dungeon, start, goal, diagonal=True, max_nodes=None, costs=None, jps=False):
     """A* between two Vector2's.
 
     - dungeon: a GameMap
     - start: Vector2
     - end: Vector2
     - diagonal: bool - can move diagonally
+    - max_nodes: give up after expanding this many nodes
+    - costs: optional array of cost multipliers (see AStar)
+    - jps: use Jump Point Search, ignored when there are costs
     """
 
-    close_set = set()
-    came_from = {}
-    g_score = {start: 0}
-    f_score = {start: _heuristic(start, goal)}
-    oheap = PriorityQueue()
-
-    if diagonal:
-        directions = Direction.all()
-    else:
-        directions = Direction.cardinal()
-
-    oheap.put(start, f_score[start])
-
-    while not oheap.empty():
-        current = oheap.get()
-        if current == goal:
-            result = []
-            while current in came_from:
-                result.append(current)
-                current = came_from[current]
-            result.reverse()
-            return result
-
-        close_set.add(current)
-        for d in directions:
-            neighbor = current + d
-            tentative_g_score = g_score[current] + _heuristic(current, neighbor)
-            cell = dungeon.get_at(neighbor)
-            if cell is None or not cell.walkable:
-                continue
-            if neighbor in close_set and tentative_g_score >= g_score.get(neighbor, 0):
-                continue
-
-            if tentative_g_score < g_score.get(neighbor, 0) or not oheap.contain(neighbor):
-                came_from[neighbor] = current
-                g_score[neighbor] = tentative_g_score
-                f_score[neighbor] = tentative_g_score + _heuristic(neighbor, goal)
-                oheap.put(neighbor, f_score[neighbor])
-    return []
+    engine = get_engine(dungeon)
+    if jps:
+        return engine.jump_search(start, goal, diagonal, max_nodes, costs)
+    return engine.search(start, goal, diagonal, max_nodes, costs)
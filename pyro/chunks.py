@@ -0,0 +1,154 @@
+"""
+Chunked 2D arrays for very large maps.
+
+A ChunkedLayer looks like a (width, height) NumPy array indexed by [x, y], but its cells are stored
+in square chunks which are allocated only when something different from the fill value is written
+into them: a 4000x4000 map where just a few areas have been carved only pays for those areas.
+
+Indexing supports a pair of integers (a single cell) or a mix of integers and slices with no step
+(a rectangular region); reading a region always returns a new array, so changes to it must be
+written back with another assignment.
+"""
+import numpy as np
+
+
+DEFAULT_CHUNK_SIZE = 64
+
+
+def _bounds(index, size):
+    """Turn an integer or a slice into (start, stop, is_integer)"""
+
+    if isinstance(index, slice):
+        if index.step not in (None, 1):
+            raise IndexError("slices with a step are not supported")
+        start, stop, _ = index.indices(size)
+        return start, max(start, stop), False
+
+    index = int(index)
+    if index < 0:
+        index += size
+    if not 0 <= index < size:
+        raise IndexError("index %d is out of bounds for size %d" % (index, size))
+    return index, index + 1, True
+
+
+class ChunkedLayer:
+    def __init__(self, shape, dtype, fill_value=0, chunk_size=DEFAULT_CHUNK_SIZE, chunks=None):
+        self.shape = tuple(shape)
+        self.dtype = np.dtype(dtype)
+        self.fill_value = fill_value
+        self.chunk_size = chunk_size
+        # (chunk x, chunk y) -> (chunk_size, chunk_size) array
+        self._chunks = {} if chunks is None else chunks
+
+    ndim = 2
+
+    def __len__(self):
+        return self.shape[0]
+
+    def __array__(self, dtype=None, copy=None):
+        array = self[:, :]
+        if dtype is not None:
+            array = array.astype(dtype, copy=False)
+        return array
+
+    @property
+    def allocated(self):
+        """Number of allocated chunks"""
+
+        return len(self._chunks)
+
+    @property
+    def nbytes(self):
+        return sum(chunk.nbytes for chunk in self._chunks.values())
+
+    def chunk_keys(self):
+        """Return the (chunk x, chunk y) keys of the allocated chunks, sorted"""
+
+        return sorted(self._chunks)
+
+    def get_chunk(self, cx, cy):
+        """Return the array of a chunk, or None when it has not been allocated"""
+
+        return self._chunks.get((cx, cy))
+
+    def _chunk_for_write(self, key):
+        chunk = self._chunks.get(key)
+        if chunk is None:
+            chunk = np.full((self.chunk_size, self.chunk_size), self.fill_value, dtype=self.dtype)
+            self._chunks[key] = chunk
+        return chunk
+
+    def _parts(self, x0, x1, y0, y1):
+        """Split a region into chunks.
+
+        Yield the key of each chunk overlapping the region, the slices selecting the overlap
+        inside the chunk and the slices selecting it inside the region.
+        """
+
+        size = self.chunk_size
+        for cx in range(x0 // size, (x1 - 1) // size + 1):
+            ax0, ax1 = max(x0, cx * size), min(x1, (cx + 1) * size)
+            for cy in range(y0 // size, (y1 - 1) // size + 1):
+                ay0, ay1 = max(y0, cy * size), min(y1, (cy + 1) * size)
+                inner = (
+                    slice(ax0 - cx * size, ax1 - cx * size),
+                    slice(ay0 - cy * size, ay1 - cy * size),
+                )
+                outer = (slice(ax0 - x0, ax1 - x0), slice(ay0 - y0, ay1 - y0))
+                yield (cx, cy), inner, outer
+
+    def _region(self, key):
+        if not isinstance(key, tuple) or len(key) != 2:
+            raise IndexError("a ChunkedLayer needs exactly two indexes")
+        x0, x1, int_x = _bounds(key[0], self.shape[0])
+        y0, y1, int_y = _bounds(key[1], self.shape[1])
+        return x0, x1, y0, y1, int_x, int_y
+
+    def __getitem__(self, key):
+        x0, x1, y0, y1, int_x, int_y = self._region(key)
+        size = self.chunk_size
+
+        if int_x and int_y:
+            chunk = self._chunks.get((x0 // size, y0 // size))
+            if chunk is None:
+                return self.dtype.type(self.fill_value)
+            return chunk[x0 % size, y0 % size]
+
+        result = np.full((x1 - x0, y1 - y0), self.fill_value, dtype=self.dtype)
+        if x1 > x0 and y1 > y0:
+            for chunk_key, inner, outer in self._parts(x0, x1, y0, y1):
+                chunk = self._chunks.get(chunk_key)
+                if chunk is not None:
+                    result[outer] = chunk[inner]
+
+        if int_x:
+            return result[0]
+        if int_y:
+            return result[:, 0]
+        return result
+
+    def __setitem__(self, key, value):
+        x0, x1, y0, y1, int_x, int_y = self._region(key)
+        size = self.chunk_size
+
+        if int_x and int_y:
+            chunk_key = (x0 // size, y0 // size)
+            if chunk_key in self._chunks or value != self.fill_value:
+                self._chunk_for_write(chunk_key)[x0 % size, y0 % size] = value
+            return
+
+        value = np.asarray(value, dtype=self.dtype)
+        if value.ndim == 1 and (int_x or int_y):
+            # a single row or column: restore the dimension dropped by the integer index
+            value = value[np.newaxis, :] if int_x else value[:, np.newaxis]
+        value = np.broadcast_to(value, (x1 - x0, y1 - y0))
+        if value.size == 0:
+            return
+
+        for chunk_key, inner, outer in self._parts(x0, x1, y0, y1):
+            part = value[outer]
+            if chunk_key not in self._chunks and (part == self.fill_value).all():
+                # keep empty chunks unallocated
+                continue
+            self._chunk_for_write(chunk_key)[inner] = part
@@ -3,6 +3,7 @@ from .combat import CombatComponent
 from .door import DoorComponent
 from .health import HealthComponent
 from .inventory import InventoryComponent
+from .light import LightComponent
 from .monster_ai import MonsterAiComponent
 from .potion import PotionComponent
 
@@ -14,4 +15,5 @@ COMPONENT_CLASS = {
     "monster_ai": MonsterAiComponent,
     "potion": PotionComponent,
     "inventory": InventoryComponent,
+    "light": LightComponent,
 }
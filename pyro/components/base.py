@@ -5,6 +5,16 @@ class Component:
     def setup(self, config):
         raise NotImplementedError
 
+    def get_state(self):
+        """Return the state of this component as a JSON serializable dictionary"""
+
+        return dict(vars(self))
+
+    def set_state(self, state):
+        """Restore the state returned by get_state()"""
+
+        self.__dict__.update(state)
+
     @property
     def name(self):
         words = re.findall(r"[A-Z][^A-Z]*", self.__class__.__name__)
@@ -5,19 +5,40 @@ class DoorComponent(Component):
     def __init__(self, initial_state=False):
         super(DoorComponent, self).__init__()
         self.state = initial_state
+        # called with the door every time it's opened or closed, see GameMap.move_entity
+        self.listeners = []
 
     def setup(self, config):
         pass
 
+    def get_state(self):
+        return {"state": self.state}
+
+    def set_state(self, state):
+        self._set(state["state"])
+
     @property
     def is_open(self):
         return self.state
 
+    def add_listener(self, callback):
+        self.listeners.append(callback)
+
+    def remove_listener(self, callback):
+        self.listeners.remove(callback)
+
+    def _set(self, state):
+        if state == self.state:
+            return
+        self.state = state
+        for callback in list(self.listeners):
+            callback(self)
+
     def toggle(self):
-        self.state = not self.state
+        self._set(not self.state)
 
     def open(self):
-        self.state = True
+        self._set(True)
 
     def close(self):
-        self.state = False
+        self._set(False)
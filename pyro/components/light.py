@@ -0,0 +1,21 @@
+from . import Component
+
+
+class LightComponent(Component):
+    """A light source, see pyro.lighting"""
+
+    def __init__(self):
+        super(LightComponent, self).__init__()
+        self.radius = 4
+        self.color = (255, 255, 255)
+
+    def setup(self, config):
+        if "RADIUS" in config:
+            self.radius = int(config["RADIUS"])
+        if "COLOR" in config:
+            # e.g. COLOR:255,160,60
+            self.color = tuple(int(value) for value in config["COLOR"].split(","))
+
+    def set_state(self, state):
+        super(LightComponent, self).set_state(state)
+        self.color = tuple(self.color)
@@ -1,10 +1,11 @@
 import random
 import inspect
 import logging
-import tcod
 from . import Component
-from ..astar import astar
-from ..utils import Direction, weighted_choice, probability
+from ..flowfield import get_flow_fields
+from ..pathcache import get_path_cache
+from ..roomgraph import get_pathfinder, HIERARCHICAL_MIN_CELLS
+from ..utils import Vector2, weighted_choice, probability
 
 
 logger = logging.getLogger(__name__)
@@ -31,16 +32,31 @@ class MonsterAiComponent(Component):
         if "AGGRESSIVE" in config:
             self.aggressive = bool(int(config["AGGRESSIVE"]))
 
+    def get_state(self):
+        state = super(MonsterAiComponent, self).get_state()
+        for key in ("last_player_pos", "cur_direction"):
+            if state[key] is not None:
+                state[key] = (state[key].x, state[key].y)
+        return state
+
+    def set_state(self, state):
+        super(MonsterAiComponent, self).set_state(state)
+        for key in ("last_player_pos", "cur_direction"):
+            if state.get(key) is not None:
+                setattr(self, key, Vector2(*state[key]))
+
     def move_to(self, monster, cur_map, entity_manager, pos):
         """Move the entity to a pos, if possible"""
 
         new_cell = cur_map.get_at(pos)
-        caller = inspect.stack()[1][3]
 
+        # NOTE: inspect.stack() is slow, only look up the caller when something is wrong
         if new_cell is None:
+            caller = inspect.stack()[1][3]
             print("move_to: %r is outside of map (caller: %s)" % (new_cell, caller))
             return False
         elif not new_cell.walkable:
+            caller = inspect.stack()[1][3]
             print("move_to: %r is not walkable (caller: %s)" % (new_cell, caller))
             return False
 
@@ -52,21 +68,41 @@ class MonsterAiComponent(Component):
         cur_map.move_entity(monster, pos)
         return True
 
+    def next_step(self, monster, cur_map):
+        """Return the next step toward last_player_pos, or None if there's no way to get there.
+
+        Monsters chasing the same target share its flow field; A* is used only when the monster is
+        too far away to be on the field, and its path is cached: while the monster follows it the
+        next turns are cache hits. On large maps only the path to the next doorway is searched,
+        routing over the room graph.
+        """
+
+        field = get_flow_fields(cur_map).get(self.last_player_pos, self.can_move_diagonal)
+        if monster.position in field:
+            return field.next_step(monster.position)
+        if not field.truncated:
+            # the field covers all the cells connected to the target
+            return None
+
+        if cur_map.width * cur_map.height > HIERARCHICAL_MIN_CELLS:
+            path = get_pathfinder(cur_map).next_segment(
+                monster.position, self.last_player_pos, self.can_move_diagonal
+            )
+        else:
+            path = get_path_cache(cur_map).get(
+                monster.position, self.last_player_pos, self.can_move_diagonal
+            )
+        if path:
+            return path[0]
+        return None
+
     def wander(self, monster, game):
         """Wander around randomly"""
 
-        candidates = []
         cur_map = game.world.get_current_map()
-        for d in Direction.all():
-            dest = monster.position + d
-            cell = cur_map.get_at(dest)
-            if not cell.walkable:
-                continue
-            for eid in cell.entities:
-                e = game.world.entity_manager.get_entity(eid)
-                if e in game.world.entity_manager.components["monster_ai"]:
-                    continue
-            candidates.append(dest)
+        position = monster.position
+        # cells busy with other monsters are refused later by move_to()
+        candidates = [position + d for d in cur_map.walkable_directions(position.x, position.y)]
 
         # chose a new random direction, with a preference on following the current direction, just
         # to make it look slightly less random.
@@ -98,42 +134,36 @@ class MonsterAiComponent(Component):
         player = game.player
         cur_map = game.world.get_current_map()
         em = game.world.entity_manager
-        fov_map = game.fov_map
 
         if self.last_player_pos is not None and monster.position == self.last_player_pos:
             self.last_player_pos = None
             logger.debug(f"{monster} stopping chase, reached last player position")
             self.chasing = False
 
-        # check if the player is directly adjacent, so that we can skip calculating the FOV for this
-        # monster.
-        for d in Direction.all():
-            pos = monster.position + d
-            if pos == player.position:
-                self.last_player_pos = player.position.copy()
-                logger.debug(f"{monster} attacking {player}")
-                self.chasing = True
-                game.fight(monster, player)
-                return
-
-        # update fov
-        fov_map.compute_fov(
-            monster.position.x, monster.position.y, radius=self.radius, algorithm=tcod.FOV_DIAMOND
-        )
-        # if the player position is "lit", then we see the player.
-        # if we're already chasing (going to lasy_player_pos) we skip this check.
-        if fov_map.fov[player.position.y, player.position.x]:
+        # check if the player is directly adjacent, so that we can skip looking for the player.
+        dx = player.position.x - monster.position.x
+        dy = player.position.y - monster.position.y
+        if max(abs(dx), abs(dy)) == 1:
+            self.last_player_pos = player.position.copy()
+            logger.debug(f"{monster} attacking {player}")
+            self.chasing = True
+            game.fight(monster, player)
+            return
+
+        # the FOV computed from the player once per turn tells if we see each other (see
+        # Perception).
+        if game.perception.can_see(monster.position, self.radius):
             self.chasing = True
             self.last_player_pos = player.position.copy()
             logger.debug(f"{monster} can see the player")
 
         if self.chasing:
-            path = astar(cur_map, monster.position, self.last_player_pos, self.can_move_diagonal)
-            if path:
+            step = self.next_step(monster, cur_map)
+            if step is not None:
                 logger.debug(f"{monster} chasing the player to {self.last_player_pos}")
-                if not self.move_to(monster, cur_map, em, path[0]):
-                    logger.warning(f"{monster} can't move to {path[0]}: cell is busy")
+                if not self.move_to(monster, cur_map, em, step):
+                    logger.warning(f"{monster} can't move to {step}: cell is busy")
             else:
-                logger.warning("A* Path for {monster} is empty")
+                logger.warning(f"A* Path for {monster} is empty")
         else:
             self.maybe_move(monster, game)
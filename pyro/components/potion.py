@@ -1,4 +1,5 @@
 from . import Component
+from .. import PotionType
 
 
 class PotionComponent(Component):
@@ -16,3 +17,9 @@ class PotionComponent(Component):
 
     def setup(self, config):
         return
+
+    def get_state(self):
+        return {"potion_type": self.potion_type.value}
+
+    def set_state(self, state):
+        self.potion_type = PotionType(state["potion_type"])
@@ -2,6 +2,7 @@ import random
 import logging
 import tcod.bsp
 from ..gamemap import GameMap, Room
+from ..roomgraph import walking_distances
 from ..utils import Rect, tcod_random
 from .. import ROOM, WALL
 
@@ -86,28 +87,38 @@ class BspGameMap(GameMap):
         self._place_outer_walls()
 
         # split game map with BSP
-        bsp = tcod.bsp.BSP(x=1, y=1, width=self.width - 2, height=self.height - 2)
-        bsp.split_recursive(
-            depth=self.depth,
-            min_width=self.min_room_width + 1,
-            min_height=self.min_room_height + 1,
-            max_horizontal_ratio=1.5,
-            max_vertical_ratio=1.5,
-            seed=tcod_random.rng,
-        )
+        with self.timed("split"):
+            bsp = tcod.bsp.BSP(x=1, y=1, width=self.width - 2, height=self.height - 2)
+            bsp.split_recursive(
+                depth=self.depth,
+                min_width=self.min_room_width + 1,
+                min_height=self.min_room_height + 1,
+                max_horizontal_ratio=1.5,
+                max_vertical_ratio=1.5,
+                seed=tcod_random.rng,
+            )
 
         # traverse all the nodes to place rooms and connect them
-        self._traverse(bsp)
-
-        # we're lazy and we just delete unconnected rooms
-        unconnected_rooms = [room for room in self.rooms.values() if not room.connected]
-        logger.debug("BSP map: Deleting %d unconnected rooms" % len(unconnected_rooms))
-        for room in unconnected_rooms:
-            self._cancel_room(room)
-
-        self._tag_rooms()
-        self._select_start_and_end(entity_manager)
-        self._place_creatures_in_rooms(level, entity_manager)
-        self._place_doors(entity_manager)
-        self._add_features()
-        self._place_items_in_rooms(entity_manager)
+        with self.timed("traverse"):
+            self._traverse(bsp)
+
+            # we're lazy and we just delete unconnected rooms
+            unconnected_rooms = [room for room in self.rooms.values() if not room.connected]
+            logger.debug("BSP map: Deleting %d unconnected rooms" % len(unconnected_rooms))
+            for room in unconnected_rooms:
+                self._cancel_room(room)
+
+        with self.timed("tag"):
+            self._tag_rooms()
+        with self.timed("graph"):
+            self.start_distances = walking_distances(self, self._select_start_room())
+        with self.timed("stairs"):
+            self._select_start_and_end(entity_manager)
+        with self.timed("creatures"):
+            self._place_creatures_in_rooms(level, entity_manager)
+        with self.timed("doors"):
+            self._place_doors(entity_manager)
+        with self.timed("features"):
+            self._add_features()
+        with self.timed("items"):
+            self._place_items_in_rooms(entity_manager)
@@ -1,6 +1,9 @@
 import random
-from ..gamemap import GameMap
-from .. import WALL, ROOM
+import numpy as np
+from ..gamemap import GameMap, Room
+from ..rooms import room_1
+from ..roomgraph import walking_distances
+from .. import WALL
 
 
 class TunnelingGameMap(GameMap):
@@ -10,13 +13,35 @@ class TunnelingGameMap(GameMap):
         max_room_size = 16
         min_room_size = 5
         max_rooms = 30
-        weird_done = False
-        is_weird = False
 
         self._place_outer_walls()
 
+        with self.timed("rooms"):
+            self._dig_rooms(max_rooms, min_room_size, max_room_size)
+
+        with self.timed("tag"):
+            self._tag_rooms()
+        with self.timed("graph"):
+            self.start_distances = walking_distances(self, self._select_start_room())
+        with self.timed("stairs"):
+            self._select_start_and_end(entity_manager)
+        with self.timed("creatures"):
+            self._place_creatures_in_rooms(level, entity_manager)
+        with self.timed("doors"):
+            self._place_doors(entity_manager)
+        with self.timed("features"):
+            self._add_features()
+        with self.timed("items"):
+            self._place_items_in_rooms(entity_manager)
+
+    def _dig_rooms(self, max_rooms, min_room_size, max_room_size):
+        """Randomly place up to max_rooms rooms, connecting each one to the previous one"""
+
+        weird_done = False
+
         for _ in range(max_rooms):
             lines = []
+            is_weird = False
             if random.random() > 0.8 and not weird_done:
                 template = room_1.strip()
                 lines = template.split("\n")
@@ -46,21 +71,11 @@ class TunnelingGameMap(GameMap):
 
             # special case for creating prefab rooms
             if is_weird:
-                for y, line in enumerate(lines):
-                    for x, c in enumerate(line):
-                        if c == "#":
-                            self.cells[room.x + x][room.y + y].kind = WALL
-                is_weird = False
+                mask = np.array([[c == "#" for c in line] for line in lines]).T
+                self.retag_region(room, WALL, mask=mask)
 
             if len(self.rooms) > 1:
-                last_room = self.rooms.values()[-2]
+                last_room = list(self.rooms.values())[-2]
                 self._connect_rooms(room, last_room)
             else:
                 self.start_room_id = room.rid
-
-        self._tag_rooms()
-        self._select_start_and_end(entity_manager)
-        self._place_creatures_in_rooms(level, entity_manager)
-        self._place_doors(entity_manager)
-        self._add_features()
-        self._place_items_in_rooms(entity_manager)
@@ -1,6 +1,6 @@
 import re
 from .utils import Vector2
-from . import LAYER_CREATURES, LAYER_ITEMS
+from . import LAYER_CREATURES, LAYER_ITEMS, PotionType
 from .gamedata import gamedata
 from .potions import POTION_AVATAR, POTION_COLOR
 from .components import COMPONENT_CLASS, PotionComponent
@@ -74,6 +74,15 @@ class Entity:
     def is_potion(self):
         return any([c.name == "potion" for c in self.components.values()])
 
+    def get_state(self):
+        """Return the name and the components state of this entity; see EntityManager.restore"""
+
+        return {
+            "eid": self.eid,
+            "name": self.name,
+            "components": {name: c.get_state() for name, c in self.components.items()},
+        }
+
     def __repr__(self):
         return (
             f"<Entity(eid={self.eid}, name={self.name} ({self.display_name}), pos={self.position})>"
@@ -92,8 +101,13 @@ class EntityManager:
         # keys will be Component's names (e.g. "health").
         self.components = {}
 
-    def next_eid(self):
-        """Allocate and return new Entity ID"""
+    def next_eid(self, eid=None):
+        """Allocate and return new Entity ID, or reserve `eid` when given"""
+
+        if eid is not None:
+            assert eid not in self.entities, "Entity ID %d already in use" % eid
+            self._eid = max(self._eid, eid + 1)
+            return eid
 
         rv = self._eid
         self._eid += 1
@@ -107,15 +121,16 @@ class EntityManager:
     def get_component_by_eid(self, eid, component_name):
         return self.components[component_name].get(eid)
 
-    def create_entity(self, name, entity_data=None):
+    def create_entity(self, name, entity_data=None, eid=None):
         """
         Create a new Entity from game data.
 
         `entity_data` is either a dictionary containing the configuration for the entity
-        or `None` when the EntityManager should do the lookup by itself.
+        or `None` when the EntityManager should do the lookup by itself; `eid` is used to
+        re-create an entity with a known ID.
 
         """
-        eid = self.next_eid()
+        eid = self.next_eid(eid)
 
         if entity_data is None:
             entity_data = gamedata.get_entity(name)
@@ -142,8 +157,8 @@ class EntityManager:
         self.entities[entity.eid] = entity
         return entity
 
-    def create_potion(self, potion_type):
-        eid = self.next_eid()
+    def create_potion(self, potion_type, eid=None):
+        eid = self.next_eid(eid)
         entity = Entity(eid, "potion", POTION_AVATAR, POTION_COLOR, layer=LAYER_ITEMS)
         pc = PotionComponent(potion_type)
         entity.add_component(pc)
@@ -151,6 +166,19 @@ class EntityManager:
         self.entities[entity.eid] = entity
         return entity
 
+    def restore_entity(self, state):
+        """Re-create an entity from the state returned by Entity.get_state()"""
+
+        if state["name"] == "potion":
+            potion_type = PotionType(state["components"]["potion"]["potion_type"])
+            entity = self.create_potion(potion_type, eid=state["eid"])
+        else:
+            entity = self.create_entity(state["name"], eid=state["eid"])
+
+        for name, component_state in state["components"].items():
+            entity.get_component(name).set_state(component_state)
+        return entity
+
     def destroy_entity(self, eid):
         """Destroy and entity and unregister all its components"""
 
@@ -0,0 +1,121 @@
+"""
+Dijkstra maps shared by the monsters chasing the same target.
+
+A FlowField holds the walking cost from every cell around a target to the target itself: a
+monster standing on the field reaches the target by repeatedly stepping to the neighbor with the
+lowest cost, without running its own search. Fields are cached per map by FlowFields and rebuilt
+only when the walkable cells change, so the AI cost grows with the number of distinct targets
+instead of the number of chasing monsters.
+"""
+import logging
+import weakref
+from collections import OrderedDict
+from .astar import get_engine
+from .journal import CHANGED_KIND
+from .utils import Vector2
+
+
+logger = logging.getLogger(__name__)
+
+# fields don't extend further than this walking cost from their target
+DEFAULT_MAX_COST = 100
+
+
+class FlowField:
+    def __init__(self, game_map, target, diagonal=True, max_cost=DEFAULT_MAX_COST):
+        self.target = target.copy()
+        self.diagonal = diagonal
+        self.max_cost = max_cost
+        self.height = game_map.height
+        self.version = game_map.version
+        self._engine = get_engine(game_map)
+        # flat cell index -> walking cost to the target; when the field is not truncated it covers
+        # every cell connected to the target.
+        self.costs, self.truncated = self._engine.dijkstra(target, diagonal, max_cost)
+
+    def __contains__(self, pos):
+        return pos.x * self.height + pos.y in self.costs
+
+    def cost(self, pos):
+        """Return the walking cost from pos to the target, None if pos is not on the field"""
+
+        return self.costs.get(pos.x * self.height + pos.y)
+
+    def next_step(self, pos):
+        """Return the first step of the shortest path from pos to the target.
+
+        Return None when pos is not on the field or it is the target itself.
+        """
+
+        index = pos.x * self.height + pos.y
+        if self.costs.get(index, 0.0) == 0.0:
+            return None
+
+        costs = self.costs
+        best, best_cost = None, None
+        for neighbor, step in self._engine.step_costs(index, self.diagonal):
+            cost = costs.get(neighbor)
+            if cost is None:
+                continue
+            if best_cost is None or step + cost < best_cost:
+                best, best_cost = neighbor, step + cost
+        if best is None:
+            return None
+        return Vector2(*divmod(best, self.height))
+
+
+class FlowFields:
+    """The FlowField's of a map, rebuilt when the walkable cells of the map change"""
+
+    def __init__(self, game_map, max_fields=8, max_cost=DEFAULT_MAX_COST):
+        self._game_map = weakref.ref(game_map)
+        self.max_fields = max_fields
+        self.max_cost = max_cost
+        # (x, y, diagonal) -> FlowField, least recently used first
+        self._fields = OrderedDict()
+        self.builds = 0
+        self.hits = 0
+
+    def get(self, target, diagonal=True):
+        """Return the FlowField toward a target, building it if needed"""
+
+        game_map = self._game_map()
+        key = (target.x, target.y, bool(diagonal))
+        field = self._fields.get(key)
+        if field is not None and not self._is_valid(field, game_map):
+            field = None
+
+        if field is None:
+            logger.debug("Building flow field toward %r (diagonal=%r)", target, diagonal)
+            field = FlowField(game_map, target, diagonal, self.max_cost)
+            self._fields[key] = field
+            self.builds += 1
+            while len(self._fields) > self.max_fields:
+                self._fields.popitem(last=False)
+        else:
+            self.hits += 1
+        self._fields.move_to_end(key)
+        return field
+
+    def _is_valid(self, field, game_map):
+        if field.version == game_map.version:
+            return True
+
+        changes = game_map.journal.changes_since(field.version)
+        if changes is None or any(flags & CHANGED_KIND for flags in changes.values()):
+            return False
+        # only entities moved: the field is still good
+        field.version = game_map.version
+        return True
+
+
+_flow_fields = weakref.WeakKeyDictionary()
+
+
+def get_flow_fields(game_map):
+    """Return the FlowFields of a map, creating them on first use"""
+
+    fields = _flow_fields.get(game_map)
+    if fields is None:
+        fields = _flow_fields[game_map] = FlowFields(game_map)
+    return fields
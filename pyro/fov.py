@@ -1,4 +1,8 @@
 # http://www.roguebasin.com/index.php?title=PythonShadowcastingImplementation
+import numpy as np
+from .fovcache import FovCache
+from .journal import CHANGED_TRANSPARENCY
+
 
 multipliers = [
     (1, 0, 0, -1, -1, 0, 0, 1),
@@ -16,104 +20,238 @@ multipliers = [
 # 0, 1, -1, 0 -> S-SE
 # 1, 0, 0, -1 -> SE-E
 
+# radius -> octant tables, see octant_tables()
+_tables = {}
+
+# the symmetric shadowcasting of symmetric_shadowcast(), an algorithm for VisionPool workspaces
+SYMMETRIC_SHADOWCAST = "symmetric_shadowcast"
+# (x, y) of the cell at (depth, column) of a quadrant is origin + depth * d + column * c: (d, c)
+quadrants = [((0, -1), (1, 0)), ((1, 0), (0, 1)), ((0, 1), (1, 0)), ((-1, 0), (0, 1))]
+
+
+def octant_tables(radius):
+    """Return the cells scanned by the shadowcaster for a radius, building them on first use.
+
+    The cells are those of a (2 * radius + 1) square centered on the origin, flattened by columns.
+    For each octant, a list of rows (one per distance from the origin, from 1 to radius) holds
+    the cells in scan order as (index in the square, left slope, right slope, within radius)
+    tuples.
+    """
+
+    tables = _tables.get(radius)
+    if tables is not None:
+        return tables
+
+    size = 2 * radius + 1
+    radius_squared = radius * radius
+    tables = []
+    for octant in range(8):
+        xx, xy, yx, yy = (multipliers[i][octant] for i in range(4))
+        rows = []
+        for j in range(1, radius + 1):
+            dy = -j
+            rows.append(
+                [
+                    (
+                        (radius + dx * xx + dy * xy) * size + radius + dx * yx + dy * yy,
+                        (dx - 0.5) / (dy + 0.5),
+                        (dx + 0.5) / (dy - 0.5),
+                        dx * dx + dy * dy < radius_squared,
+                    )
+                    for dx in range(-j, 1)
+                ]
+            )
+        tables.append(rows)
+    _tables[radius] = tables
+    return tables
+
 
 class Fov:
-    def __init__(self, radius=6):
+    """Shadowcasting over a transparency array.
+
+    setup() copies the transparent cells of a GameMap in a (width, height) boolean array, in a single
+    NumPy pass. calculate() works on a copy of the square around the origin only and, on `fovmap`,
+    clears just the cells lit by the previous call: its cost grows with the radius, not with the
+    map size. The cells to scan come from the octant tables of the radius, see octant_tables().
+
+    The cells lit from a position are kept in a FovCache until the transparent cells change.
+    """
+
+    def __init__(self, radius=6, max_cached=256):
         self.radius = radius
-        self.mapdata = None
+        self.transparent = None
         self.width = 0
         self.height = 0
+        # the cells lit by the last calculate(), as a (width, height) boolean array...
         self.fovmap = None
-        self.los_cache = None
+        # ...and as a (n, 2) array of x, y coordinates
+        self.lit = None
+        # version of the game map transparent was copied from
+        self.version = None
+        # incremented by every change of transparent
+        self.transparency_version = 0
+        self.cache = FovCache(max_cached)
 
     def setup(self, mapdata):
-        self.width = len(mapdata.cells)
-        self.height = len(mapdata.cells[0])
+        self.width = mapdata.width
+        self.height = mapdata.height
 
-        self.mapdata = [[False for y in range(self.height)] for x in range(self.width)]
-        self.fovmap = [[False for y in range(self.height)] for x in range(self.width)]
+        self.transparent = ~mapdata.blocking_mask()
+        self.fovmap = np.zeros((self.width, self.height), dtype=bool)
+        self.lit = np.empty((0, 2), dtype=np.intp)
+        self.version = mapdata.version
+        self._transparency_changed()
 
-        for x in range(self.width):
-            for y in range(self.height):
-                cell = mapdata.get_at(x, y)
-                if not cell.blocking:
-                    self.mapdata[x][y] = True
+    def _transparency_changed(self):
+        self.transparency_version += 1
+        self.cache.clear()
 
-    def calculate(self, x, y):
-        self.los_cache = set()
-        self._reset_fovmap()
-        row = 1
-        start = 1.0
-        end = 0.0
-        for octant in range(8):
-            self._cast_light(
-                x,
-                y,
-                row,
-                start,
-                end,
-                multipliers[0][octant],
-                multipliers[1][octant],
-                multipliers[2][octant],
-                multipliers[3][octant],
-            )
-        return self.los_cache
+    def sync(self, mapdata):
+        """Copy the cells changed since setup() (or the last sync) from the game map"""
 
-    def _cast_light(self, start_x, start_y, row, start, end, xx, xy, yx, yy):
-        if start < end:
+        changes = mapdata.journal.changes_since(self.version)
+        if changes is None:
+            self.setup(mapdata)
             return
 
-        radius_squared = self.radius * self.radius
-        new_start = None
+        changed = False
+        for (x, y), flags in changes.items():
+            if flags & CHANGED_TRANSPARENCY:
+                self.transparent[x, y] = not mapdata.get_at(x, y).blocking
+                changed = True
+        self.version = mapdata.version
+        if changed:
+            self._transparency_changed()
 
-        # j is distance
-        # dx and dy are deltas
-        for j in range(row, self.radius + 1):
-            dx, dy = -j - 1, -j
-            blocked = False
+    def calculate(self, x, y):
+        """Light the cells seen from x, y; return them as a (n, 2) array of x, y coordinates"""
 
-            while dx <= 0:
-                dx += 1
-                x = start_x + dx * xx + dy * xy
-                y = start_y + dx * yx + dy * yy
+        # dirty reset: only the cells lit last time
+        self.fovmap[self.lit[:, 0], self.lit[:, 1]] = False
 
-                l_slope = (dx - 0.5) / (dy + 0.5)
-                r_slope = (dx + 0.5) / (dy - 0.5)
+        radius = self.radius
+        left, top = max(x - radius, 0), max(y - radius, 0)
+        window = self.transparent[left : x + radius + 1, top : y + radius + 1]
 
-                if start < r_slope:
+        key = (x, y, radius, "shadowcast", self.transparency_version)
+        square = self.cache.get(key)
+        if square is not None:
+            lit = np.argwhere(square) + (left, top)
+            self.fovmap[lit[:, 0], lit[:, 1]] = True
+            self.lit = lit
+            return lit
+
+        # the square centered on the origin; outside of the map everything is blocked
+        size = 2 * radius + 1
+        opaque = np.ones((size, size), dtype=bool)
+        inner = (
+            slice(left - x + radius, left - x + radius + window.shape[0]),
+            slice(top - y + radius, top - y + radius + window.shape[1]),
+        )
+        opaque[inner] = ~window
+        cells = self._cast(opaque.ravel().tolist(), octant_tables(radius))
+
+        # drop the cells outside of the map
+        square = np.frombuffer(cells, dtype=bool).reshape(size, size)[inner]
+        self.cache.put(key, square)
+        lit = np.argwhere(square) + (left, top)
+
+        self.fovmap[lit[:, 0], lit[:, 1]] = True
+        self.lit = lit
+        return lit
+
+    def is_lit(self, x, y):
+        return bool(self.fovmap[x, y])
+
+    def _cast(self, opaque, tables):
+        """Return the cells lit in the square, flattened, given its flattened opaque cells.
+
+        Each octant is scanned row by row from the origin, keeping the (start, end) slopes not in
+        shadow; a blocked cell starts a new scan of the rows beyond it, pushed on a stack instead
+        of recursing.
+        """
+
+        lit = bytearray(len(opaque))
+        last_row = self.radius - 1
+        for rows in tables:
+            # (row, start slope, end slope)
+            scans = [(0, 1.0, 0.0)]
+            while scans:
+                row, start, end = scans.pop()
+                if start < end:
                     continue
-                elif end > l_slope:
-                    break
-                else:
-                    # light a square
-                    if dx * dx + dy * dy < radius_squared:
-                        self._light_cell(x, y)
 
-                    if blocked:
-                        if self._is_blocked(x, y):
-                            new_start = r_slope
+                new_start = None
+                for j in range(row, last_row + 1):
+                    blocked = False
+                    for index, l_slope, r_slope, in_radius in rows[j]:
+                        if start < r_slope:
                             continue
-                        else:
-                            blocked = False
-                            start = new_start
-                    else:
-                        if self._is_blocked(x, y) and j < self.radius:
+                        elif end > l_slope:
+                            break
+
+                        if in_radius:
+                            lit[index] = 1
+
+                        if blocked:
+                            if opaque[index]:
+                                new_start = r_slope
+                            else:
+                                blocked = False
+                                start = new_start
+                        elif opaque[index] and j < last_row:
                             blocked = True
-                            self._cast_light(
-                                start_x, start_y, j + 1, start, l_slope, xx, xy, yx, yy
-                            )
+                            scans.append((j + 1, start, l_slope))
                             new_start = r_slope
-            if blocked:
-                break
+                    if blocked:
+                        break
+        return lit
+
+
+def symmetric_shadowcast(transparent, x, y, radius):
+    """Return the cells seen from x, y up to radius, as a boolean array shaped like transparent.
 
-    def _is_blocked(self, x, y):
-        return self.mapdata[x][y] is False
+    transparent is a (width, height) boolean array. Unlike Fov, the cells lit from x, y are the
+    cells that see x, y: the symmetric shadowcasting (https://www.albertford.com/shadowcasting/),
+    the algorithm of FOV_SYMMETRIC_SHADOWCAST in recent tcod releases (whose implementation may
+    light a few different cells). Each quadrant is scanned row by row, keeping the slopes of the
+    visible sector as exact fractions; the rows to scan go on a stack.
+    """
 
-    def _reset_fovmap(self):
-        for x in range(self.width):
-            for y in range(self.height):
-                self.fovmap[x][y] = False
+    width, height = transparent.shape
+    opaque = (~transparent).tolist()
+    lit = np.zeros((width, height), dtype=bool)
+    lit[x, y] = True
+    radius_squared = radius * radius
 
-    def _light_cell(self, x, y):
-        self.fovmap[x][y] = True
-        self.los_cache.add((x, y))
+    for (dx, dy), (cx, cy) in quadrants:
+        # (depth, start slope numerator, denominator, end slope numerator, denominator)
+        rows = [(1, -1, 1, 1, 1)]
+        while rows:
+            depth, start_n, start_d, end_n, end_d = rows.pop()
+            if depth > radius:
+                continue
+            # the columns from depth * start slope, rounding ties up, to depth * end slope,
+            # rounding ties down
+            first = (2 * depth * start_n + start_d) // (2 * start_d)
+            last = -((end_d - 2 * depth * end_n) // (2 * end_d))
+            prev_wall = None
+            for column in range(first, last + 1):
+                cell_x = x + depth * dx + column * cx
+                cell_y = y + depth * dy + column * cy
+                inside = 0 <= cell_x < width and 0 <= cell_y < height
+                wall = not inside or opaque[cell_x][cell_y]
+                if inside and depth * depth + column * column < radius_squared:
+                    if wall or (
+                        column * start_d >= depth * start_n and column * end_d <= depth * end_n
+                    ):
+                        lit[cell_x, cell_y] = True
+                if prev_wall is not None:
+                    if prev_wall and not wall:
+                        start_n, start_d = 2 * column - 1, 2 * depth
+                    elif not prev_wall and wall:
+                        rows.append((depth + 1, start_n, start_d, 2 * column - 1, 2 * depth))
+                prev_wall = wall
+            if prev_wall is False:
+                rows.append((depth + 1, start_n, start_d, end_n, end_d))
+    return lit
@@ -0,0 +1,60 @@
+"""
+Cache of FOV results.
+
+An observer that doesn't move (an idle monster, the player waiting) sees the same cells turn after
+turn: the FOV computed from a cell is kept, keyed by (x, y, radius, algorithm, transparency
+version), until the transparent cells change. Only the square around the origin is stored, packed
+8 cells per byte, so an entry of radius 6 takes 22 bytes.
+"""
+from collections import OrderedDict
+import numpy as np
+
+
+class FovCache:
+    def __init__(self, max_entries=256):
+        self.max_entries = max_entries
+        # key -> (shape of the square, its packed cells); least recently used first
+        self._entries = OrderedDict()
+
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    @property
+    def hit_rate(self):
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def stats(self):
+        return {
+            "entries": len(self._entries),
+            "bytes": sum(bits.nbytes for _, bits in self._entries.values()),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hit_rate,
+        }
+
+    def clear(self):
+        self._entries.clear()
+
+    def get(self, key):
+        """Return the boolean array stored for key, or None"""
+
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        self._entries.move_to_end(key)
+        shape, bits = entry
+        size = shape[0] * shape[1]
+        return np.unpackbits(bits)[:size].reshape(shape).astype(bool)
+
+    def put(self, key, fov):
+        self._entries[key] = (fov.shape, np.packbits(fov, axis=None))
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
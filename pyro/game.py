@@ -12,6 +12,9 @@ class Game:
         self.game_width = game_width
         self.game_height = game_height
         self.DEBUG = False
+        # devel options
+        self.dungeon_algorithm = None
+        self.chunk_size = None
         self.font = font
         self.screen_width = screen_width
         self.screen_height = screen_height
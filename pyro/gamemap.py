@@ -1,14 +1,53 @@
+import functools
 import logging
 import random
+import time
+from contextlib import contextmanager
+from itertools import product
 from collections import OrderedDict
-import noise
+import numpy as np
 from .utils import Rect, Vector2, Direction
 from .gamedata import gamedata
-from . import CORRIDOR, VOID, WALKABLE, BLOCKING, WALL, ROOM, PotionType
+from .spatial import SpatialIndex
+from .chunks import ChunkedLayer
+from .journal import ChangeJournal, CHANGED_KIND, CHANGED_TRANSPARENCY, CHANGED_ENTITIES
+from .noisefield import noise_field, noise_at
+from . import (
+    CORRIDOR,
+    FLOOR,
+    VOID,
+    WALKABLE,
+    BLOCKING,
+    WALL,
+    ROOM,
+    NO_ROOM,
+    FEATURE_NONE,
+    FEATURE_FLOOR,
+    FEATURE_DIRT,
+    FEATURE_GRASS,
+    FEATURE_WATER,
+    FEATURES,
+    PotionType,
+)
 
 
 logger = logging.getLogger(__name__)
 
+# Neighbor masks: bit i of a mask is set when the neighbor in the direction Direction.all()[i] is
+# walkable (or transparent, for sight masks).
+NEIGHBOR_OFFSETS = tuple((d.x, d.y) for d in Direction.all())
+
+
+def _mask_directions(directions):
+    bits = [1 << NEIGHBOR_OFFSETS.index((d.x, d.y)) for d in directions]
+    return tuple(tuple(d for bit, d in zip(bits, directions) if mask & bit) for mask in range(256))
+
+
+# mask -> the Direction's selected by the mask, in the Direction.all() order
+MASK_DIRECTIONS = _mask_directions(Direction.all())
+# mask -> the cardinal Direction's selected by the mask, in the Direction.cardinal() order
+MASK_CARDINAL_DIRECTIONS = _mask_directions(Direction.cardinal())
+
 
 class Room(Rect):
     """Holds coordinates for a Room"""
@@ -48,24 +87,72 @@ class SpecialRoom:
 
 
 class GameCell:
-    """A single dungeon cell"""
+    """A view over a single dungeon cell
+
+    The cell data lives in the arrays of the GameMap; a GameCell is created on the fly by
+    GameMap.get_at() and reads and writes straight through to those arrays.
+    """
+
+    __slots__ = ("game_map", "x", "y")
+
+    def __init__(self, game_map, x, y):
+        self.game_map = game_map
+        self.x = x
+        self.y = y
+
+    @property
+    def kind(self):
+        return int(self.game_map.kind[self.x, self.y])
+
+    @kind.setter
+    def kind(self, value):
+        self.game_map.set_kind(self.x, self.y, value)
 
-    def __init__(self):
-        self.kind = VOID
-        self.entities = set()
-        self.room_id = None
-        self.feature = None
-        # a debug value
-        self.value = None
+    @property
+    def room_id(self):
+        room_id = int(self.game_map.room_id[self.x, self.y])
+        if room_id == NO_ROOM:
+            return None
+        return room_id
+
+    @room_id.setter
+    def room_id(self, value):
+        self.game_map.room_id[self.x, self.y] = NO_ROOM if value is None else value
+
+    @property
+    def feature(self):
+        return FEATURES[self.game_map.feature[self.x, self.y]]
+
+    @feature.setter
+    def feature(self, value):
+        self.game_map.feature[self.x, self.y] = FEATURES.index(value)
+
+    @property
+    def value(self):
+        """A debug value"""
+        return self.game_map.values.get((self.x, self.y))
+
+    @value.setter
+    def value(self, value):
+        if value is None:
+            self.game_map.values.pop((self.x, self.y), None)
+        else:
+            self.game_map.values[(self.x, self.y)] = value
+
+    @property
+    def entities(self):
+        return self.game_map.entity_index.at(self.x, self.y)
 
     def add_entity(self, entity):
-        self.entities.add(entity.eid)
+        self.game_map.place_entity_id(entity.eid, self.x, self.y)
 
     def remove_entity(self, entity):
-        self.entities.remove(entity.eid)
+        self.remove_entity_by_id(entity.eid)
 
     def remove_entity_by_id(self, entity_id):
-        self.entities.remove(entity_id)
+        if entity_id not in self.entities:
+            raise KeyError(entity_id)
+        self.game_map.remove_entity_id(entity_id)
 
     def has_entities(self):
         return bool(len(self.entities))
@@ -88,26 +175,193 @@ class GameCell:
 
 
 class GameMap:
-    """The dungeon"""
+    """The dungeon
 
-    def __init__(self, width, height, min_room_width=6, min_room_height=6):
+    Cells are stored column-wise in NumPy arrays indexed by [x, y]: `kind` holds the cell kind,
+    `room_id` the ID of the room owning the cell (NO_ROOM for none) and `feature` a feature code
+    (see pyro.FEATURES). Entities are kept in `entity_index`, a SpatialIndex owned by the map.
+
+    With a `chunk_size` the arrays are ChunkedLayer's instead, whose chunks are allocated only when
+    first carved: this is meant for very large maps, which are mostly empty. Code working on whole
+    layers should go through iter_regions() so that only the allocated parts are visited.
+
+    Changes to single cells and entity moves are recorded in `journal`, a ChangeJournal; the bulk
+    carving primitives invalidate it instead, as they are meant for the map generation.
+
+    neighbor_masks() returns two more layers with, for each cell, the 8-bit mask of its walkable
+    and transparent neighbors (see NEIGHBOR_OFFSETS); they are rebuilt or patched from the journal
+    when needed. On chunked maps only the cells of the allocated chunks have a mask.
+    """
+
+    def __init__(
+        self, width, height, min_room_width=6, min_room_height=6, cells=None, chunk_size=None
+    ):
         self.width = width
         self.height = height
         self.min_room_width = min_room_width
         self.min_room_height = min_room_height
-
-        self.cells = [[GameCell() for y in range(self.height)] for x in range(self.width)]
+        self.chunk_size = chunk_size
+        # the dungeon level (floor) of this map
+        self.level = None
+
+        if cells is None:
+            self.kind = self.new_layer(np.uint8, VOID)
+            self.room_id = self.new_layer(np.int32, NO_ROOM)
+            self.feature = self.new_layer(np.uint8, FEATURE_NONE)
+        else:
+            # use existing (kind, room_id, feature) arrays, e.g. the ones of a saved level
+            self.kind, self.room_id, self.feature = cells
+        # the cells the player has seen, see DungeonScene.compute_fov
+        self.visited = self.new_layer(bool, False)
+        self.entity_index = SpatialIndex()
+        self.journal = ChangeJournal()
+        # entity ID -> DoorComponent of the doors placed on the map, and the listeners recording
+        # their changes in the journal
+        self.doors = {}
+        self._door_listeners = {}
+        # neighbor masks and the map version they were computed for
+        self._walk_mask = None
+        self._sight_mask = None
+        self._masks_version = None
+        # debug values, keyed by (x, y)
+        self.values = {}
         self.rooms = OrderedDict()
         self.start_vec = None
         self.end_vec = None
         self.start_room_id = None
         self.end_room_id = None
+        # RoomGraph's of the map by diagonal moves and the RoomDistances between its rooms, built on
+        # first use, see pyro.roomgraph
+        self.room_graphs = {}
+        self.room_distances = None
+        # walking distance from the start room to the rooms reached from it, by room ID: measured
+        # by the diggers to place the stairs and the creatures
+        self.start_distances = None
         # tunnel_id is just used to debug corridors
         self._tunnel_id = 0
+        # seconds spent in each phase of generate()
+        self.timings = OrderedDict()
 
     def generate(self, level, entity_manager):
         raise NotImplementedError
 
+    @property
+    def version(self):
+        """The version of the map, incremented by every change; see ChangeJournal"""
+
+        return self.journal.version
+
+    def set_kind(self, x, y, kind):
+        """Change the kind of a single cell, recording the change in the journal"""
+
+        old = self.kind[x, y]
+        if old == kind:
+            return
+        self.kind[x, y] = kind
+        flags = CHANGED_KIND
+        if (old in BLOCKING) != (kind in BLOCKING):
+            flags |= CHANGED_TRANSPARENCY
+        self.journal.record(x, y, flags)
+
+    def touch(self, x, y, flags=CHANGED_TRANSPARENCY):
+        """Record a change to a cell made outside of the map, e.g. a door being opened"""
+
+        return self.journal.record(x, y, flags)
+
+    def neighbor_masks(self):
+        """Return the (walk, sight) neighbor mask layers, updated to the current version"""
+
+        if self._masks_version == self.version:
+            return self._walk_mask, self._sight_mask
+
+        changes = None
+        if self._masks_version is not None:
+            changes = self.journal.changes_since(self._masks_version)
+
+        if changes is None:
+            self._walk_mask = self.new_layer(np.uint8, 0)
+            self._sight_mask = self.new_layer(np.uint8, 0)
+            for region in self.iter_regions():
+                self._compute_neighbor_masks(region)
+        else:
+            for (x, y), flags in changes.items():
+                if flags & CHANGED_KIND:
+                    self._compute_neighbor_masks(Rect(x - 1, y - 1, 3, 3))
+
+        self._masks_version = self.version
+        return self._walk_mask, self._sight_mask
+
+    def _compute_neighbor_masks(self, rect):
+        """Compute the neighbor masks of the cells inside a Rect"""
+
+        # clip the rect to the map, then read the kinds with a one cell margin around it
+        x, y = max(rect.x, 0), max(rect.y, 0)
+        width, height = min(rect.endX, self.width) - x, min(rect.endY, self.height) - y
+        x0, y0 = max(x - 1, 0), max(y - 1, 0)
+        x1, y1 = min(x + width + 1, self.width), min(y + height + 1, self.height)
+        kind = self.kind[x0:x1, y0:y1]
+
+        for layer, selected in (
+            (self._walk_mask, np.isin(kind, WALKABLE)),
+            (self._sight_mask, ~np.isin(kind, BLOCKING)),
+        ):
+            # cells outside the map are neither walkable nor transparent
+            padded = np.zeros((x1 - x0 + 2, y1 - y0 + 2), dtype=bool)
+            padded[1:-1, 1:-1] = selected
+            # position of the rect inside the padded array
+            px, py = x - x0 + 1, y - y0 + 1
+            mask = np.zeros((width, height), dtype=np.uint8)
+            for bit, (dx, dy) in enumerate(NEIGHBOR_OFFSETS):
+                neighbors = padded[px + dx : px + dx + width, py + dy : py + dy + height]
+                mask |= neighbors.astype(np.uint8) << bit
+            layer[x : x + width, y : y + height] = mask
+
+    def walkable_directions(self, x, y, diagonal=True):
+        """Return the Direction's leading from x, y to a walkable cell"""
+
+        mask = self.neighbor_masks()[0][x, y]
+        if diagonal:
+            return MASK_DIRECTIONS[mask]
+        return MASK_CARDINAL_DIRECTIONS[mask]
+
+    @property
+    def chunked(self):
+        return self.chunk_size is not None
+
+    def new_layer(self, dtype, fill_value):
+        """Return a new (width, height) layer, chunked if the map is"""
+
+        if self.chunked:
+            return ChunkedLayer((self.width, self.height), dtype, fill_value, self.chunk_size)
+        return np.full((self.width, self.height), fill_value, dtype=dtype)
+
+    def iter_regions(self):
+        """Iterate over Rect's covering the parts of the map that may hold something.
+
+        A map with plain arrays is a single region; a chunked map yields the area of each allocated
+        chunk of the `kind` layer, clipped to the map.
+        """
+
+        if not self.chunked:
+            yield Rect(0, 0, self.width, self.height)
+            return
+
+        size = self.chunk_size
+        for cx, cy in self.kind.chunk_keys():
+            x, y = cx * size, cy * size
+            yield Rect(x, y, min(size, self.width - x), min(size, self.height - y))
+
+    @contextmanager
+    def timed(self, phase):
+        """Record the time spent in a phase of the map generation into self.timings"""
+
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            self.timings[phase] = self.timings.get(phase, 0.0) + elapsed
+
     def describe(self):
         """Describe a Game Map"""
 
@@ -134,38 +388,101 @@ class GameMap:
         v = self._tunnel_id
         self._tunnel_id += 1
 
-        if random.random() < 0.5:
-            self._create_horizontal_tunnel(start.x, end.x, start.y, v)
-            self._create_vertical_tunnel(start.y, end.y, end.x, v)
+        self.carve_corridor(start, end, random.random() < 0.5, v)
+
+    # Bulk carving primitives: each one of them works on whole slices of the map arrays.
+
+    @staticmethod
+    def _slice(rect):
+        return (slice(rect.x, rect.endX), slice(rect.y, rect.endY))
+
+    def fill_rect(self, rect, kind, room_id=None):
+        """Set the kind, and optionally the room ID, of every cell inside a Rect"""
+
+        area = self._slice(rect)
+        self.kind[area] = kind
+        if room_id is not None:
+            self.room_id[area] = room_id
+        self.journal.invalidate()
+
+    def retag_region(self, rect, kind, only=None, mask=None):
+        """Set the kind of the cells inside a Rect.
+
+        When `only` is given just the cells whose kind is in `only` are changed; `mask` is an
+        optional boolean array with the same size of the Rect, selecting the cells to change.
+        """
+
+        area = self._slice(rect)
+        region = self.kind[area]
+        if only is None:
+            change = np.ones(region.shape, dtype=bool)
         else:
-            self._create_vertical_tunnel(start.y, end.y, start.x, v)
-            self._create_horizontal_tunnel(start.x, end.x, end.y, v)
+            change = np.isin(region, only)
+        if mask is not None:
+            change &= mask
+        region[change] = kind
+        self.kind[area] = region
+        self.journal.invalidate()
+
+    def wall_void_around(self, x, y, mask):
+        """Turn into walls the VOID cells surrounding the cells selected by a mask.
+
+        `mask` is a boolean array whose top left cell is at x, y; each selected cell gets its 8
+        neighbors walled, as long as they are VOID and inside the map.
+        """
 
-    def _create_horizontal_tunnel(self, x1, x2, y, v=None):
-        for x in range(min(x1, x2), max(x1, x2) + 1):
-            self._create_tunnel(x, y, v)
+        width, height = mask.shape
+        # dilate the mask by one cell in every direction
+        dilated = np.zeros((width + 2, height + 2), dtype=bool)
+        for dx, dy in product(range(3), range(3)):
+            dilated[dx : dx + width, dy : dy + height] |= mask
+        dilated[1 : width + 1, 1 : height + 1] &= ~mask
+
+        # clip the dilated mask to the map boundaries
+        x0, y0 = x - 1, y - 1
+        x1, y1 = min(x0 + width + 2, self.width), min(y0 + height + 2, self.height)
+        cx, cy = max(x0, 0), max(y0, 0)
+        dilated = dilated[cx - x0 : x1 - x0, cy - y0 : y1 - y0]
+
+        region = self.kind[cx:x1, cy:y1]
+        region[dilated & (region == VOID)] = WALL
+        self.kind[cx:x1, cy:y1] = region
+        self.journal.invalidate()
+
+    def carve_corridor(self, start, end, horizontal_first=True, value=None):
+        """Carve an L-shaped corridor between two Vector2's and wall off the void around it"""
+
+        if horizontal_first:
+            corner = Vector2(end.x, start.y)
+        else:
+            corner = Vector2(start.x, end.y)
 
-    def _create_vertical_tunnel(self, y1, y2, x, v=None):
-        for y in range(min(y1, y2), max(y1, y2) + 1):
-            self._create_tunnel(x, y, v)
+        for a, b in ((start, corner), (corner, end)):
+            segment = Rect(min(a.x, b.x), min(a.y, b.y), abs(a.x - b.x) + 1, abs(a.y - b.y) + 1)
+            self._carve_segment(segment, value)
 
-    def _create_tunnel(self, x, y, value=None):
-        """Create a single corridor tile and perform some checks"""
+    def _carve_segment(self, segment, value=None):
+        """Carve a straight corridor segment"""
+
+        area = self._slice(segment)
 
         # if this tunnel touches a room, tell it that it is connected now
-        room_id = self.cells[x][y].room_id
-        if room_id:
+        room_ids = self.room_id[area]
+        for room_id in set(room_ids[room_ids != NO_ROOM].tolist()):
             self.rooms[room_id].connected = True
 
-        self.cells[x][y].kind = CORRIDOR
+        self.kind[area] = CORRIDOR
+        self.journal.invalidate()
 
         # set up DEBUG value (the string representation of the tunnel ID)
         if value is not None:
-            self.cells[x][y].value = str(value)
+            cells = product(range(segment.x, segment.endX), range(segment.y, segment.endY))
+            self.values.update(dict.fromkeys(cells, str(value)))
 
-        # fill cells around this corridor cell if they are void
-        for c in [cell for cell in self.get_cells_around(x, y) if cell.kind == VOID]:
-            c.kind = WALL
+        # a straight segment is always fully selected by its own mask
+        self.wall_void_around(
+            segment.x, segment.y, np.ones((segment.width, segment.height), dtype=bool)
+        )
 
     def _cancel_room(self, room):
         """Remove a room from the map. Used by BSP.
@@ -173,22 +490,25 @@ class GameMap:
         To avoid deleting pieces of other rooms or corridors don't delete
         the outer walls of this room."""
 
-        for y in range(room.y + 1, room.endY - 1):
-            for x in range(room.x + 1, room.endX - 1):
-                self.cells[x][y].kind = VOID
-                self.cells[x][y].room_id = None
+        self.fill_rect(room.inflate(-1), VOID, NO_ROOM)
         del self.rooms[room.rid]
 
     def _place_creatures_in_rooms(self, level, entity_manager):
         rooms = [room for room in self.rooms.values() if room.rid != self.start_room_id]
+        if self.start_distances:
+            # don't waste monsters in the rooms the player can't reach
+            rooms = [room for room in rooms if room.rid in self.start_distances]
         floors_data = gamedata.get("floors")
-        # floors arrays starts from 0, levels starts from 1.
-        this_floor = floors_data[level - 1]
+        # floors arrays starts from 0, levels starts from 1; deeper levels reuse the last floor.
+        this_floor = floors_data[min(level, len(floors_data)) - 1]
 
         for creature_name, amount in this_floor["monsters"].items():
             for _ in range(amount):
                 for j in range(5):
                     # retries 5 times
+                    if not rooms:
+                        logger.warning("No more free rooms to place %s", creature_name)
+                        return
                     room = random.choice(rooms)
                     # if more than 4 enemies in the room, skip it and remove it from the pool
                     if len(self.get_entities_in_room(room.rid)) > 4:
@@ -208,11 +528,19 @@ class GameMap:
         potion = entity_manager.create_potion(PotionType.HEALTH)
         self.move_entity(potion, pos)
 
+    def _select_start_room(self):
+        """Pick the room of the stairs up, unless the digger already did; return its ID"""
+
+        if self.start_room_id is None:
+            self.start_room_id = random.choice(list(self.rooms.values())).rid
+        return self.start_room_id
+
     def _select_start_and_end(self, entity_manager):
         """Place stairs up and stairs down.
 
         NOTE: the current algorithm will pick up the "end room" between the 3 rooms with the
-        most distance from the start room.
+        most distance from the start room: the walking distance when start_distances are known,
+        otherwise the straight line distance.
         """
 
         rooms = list(self.rooms.values())
@@ -223,7 +551,10 @@ class GameMap:
         rooms.remove(start_room)
 
         # for each remaining room calculate the distance from the starting room
-        distances = [(start_room.center.distance(room.center), room) for room in rooms]
+        walking = self.start_distances or {}
+        distances = [(walking[room.rid], room) for room in rooms if room.rid in walking]
+        if not distances:
+            distances = [(start_room.center.distance(room.center), room) for room in rooms]
 
         # pick a random rom between the 3 more far from the starting room
         distances.sort(key=lambda x: x[0])
@@ -245,44 +576,27 @@ class GameMap:
         entity = entity_manager.create_entity(kind)
         self.move_entity(entity, pos)
 
-    def _put_wall_for_room(self, x, y, room):
-        if self.cells[x][y].kind == VOID:
-            self.cells[x][y].kind = WALL
-        self.cells[x][y].room_id = room.rid
-
     def _dig_room(self, room):
-        # room outer walls (y) - do not overwrite existing tunnel tho!
-        for y in range(room.y, room.endY):
-            self._put_wall_for_room(room.x, y, room)
-            self._put_wall_for_room(room.endX - 1, y, room)
-
-        # room outer walls (x)
-        for x in range(room.x, room.endX):
-            self._put_wall_for_room(x, room.y, room)
-            self._put_wall_for_room(x, room.endY - 1, room)
+        # room outer walls - do not overwrite existing tunnel tho! The interior is overwritten
+        # right after, so we can just wall the VOID cells of the whole room.
+        self.retag_region(room, WALL, only=(VOID,))
+        self.room_id[self._slice(room)] = room.rid
 
         # room interior
-        for y in range(room.y + 1, room.endY - 1):
-            for x in range(room.x + 1, room.endX - 1):
-                # detect when a room is digged over an existing corridor.
-                if self.cells[x][y].kind == CORRIDOR:
-                    room.connected = True
-                self.cells[x][y].kind = ROOM
-                self.cells[x][y].room_id = room.rid
+        interior = room.inflate(-1)
+        # detect when a room is digged over an existing corridor.
+        if (self.kind[self._slice(interior)] == CORRIDOR).any():
+            room.connected = True
+        self.fill_rect(interior, ROOM)
 
     def _tag_rooms(self):
         """Set the kind of each room cell to ROOM"""
 
         for room in self.rooms.values():
-            for y in range(room.y + 1, room.endY - 1):
-                for x in range(room.x + 1, room.endX - 1):
-                    if self.cells[x][y].kind not in (ROOM, WALL):
-                        self.cells[x][y].kind = ROOM
+            self.retag_region(room.inflate(-1), ROOM, only=(VOID, FLOOR, CORRIDOR))
 
-    def _add_features(self):
-        frequency = 8.0
-        fx = self.width / frequency
-        fy = self.height / frequency
+    def _add_features(self, seed=0, frequency=8.0):
+        """Assign a feature to each walkable cell, based on a Perlin noise field"""
 
         # thresholds
         # t1 = 0.2
@@ -292,20 +606,41 @@ class GameMap:
         t2 = t1 + random.uniform(0.1, 0.2)
         t3 = t2 + 0.1
 
-        for y in range(1, self.height - 1):
-            for x in range(1, self.width - 1):
-                if not self.cells[x][y].walkable:
-                    continue
-                # get noise and transform to a value between 1 and 0
-                n = noise.pnoise2(x / fx, y / fy) * 0.5 + 0.5
-                if n <= t1:
-                    self.cells[x][y].feature = "water"
-                elif n <= t2:
-                    self.cells[x][y].feature = "grass"
-                elif n <= t3:
-                    self.cells[x][y].feature = "dirt"
-                else:
-                    self.cells[x][y].feature = "floor"
+        if not self.chunked:
+            # the field is cached and shared between maps of this size.
+            field = noise_field(seed, self.width, self.height, frequency)
+
+        for region in self.iter_regions():
+            area = self._slice(region)
+
+            # the outer border of the map never gets a feature
+            walkable = self.walkable_mask(region)
+            if region.x == 0:
+                walkable[0, :] = False
+            if region.y == 0:
+                walkable[:, 0] = False
+            if region.endX == self.width:
+                walkable[-1, :] = False
+            if region.endY == self.height:
+                walkable[:, -1] = False
+            if not walkable.any():
+                continue
+
+            # noise values between 0 and 1, for the walkable cells only
+            if self.chunked:
+                xs, ys = np.nonzero(walkable)
+                n = noise_at(seed, self.width, self.height, frequency, xs + region.x, ys + region.y)
+            else:
+                n = field[area][walkable]
+            features = np.select(
+                [n <= t1, n <= t2, n <= t3],
+                [FEATURE_WATER, FEATURE_GRASS, FEATURE_DIRT],
+                FEATURE_FLOOR,
+            ).astype(np.uint8)
+
+            layer = self.feature[area]
+            layer[walkable] = features
+            self.feature[area] = layer
 
     def _place_doors(self, entity_manager):
         for room in self.rooms.values():
@@ -322,44 +657,42 @@ class GameMap:
             wall_start = room.x + 1
             wall_end = room.endX - 1
             sides = (room.y, room.endY - 1)
-            # for a door on the X axis walls must be on the left and right sides.
-            directions = (Direction.EAST, Direction.WEST)
         else:
             wall_start = room.y + 1
             wall_end = room.endY - 1
             sides = (room.x, room.endX - 1)
-            # for a door on the Y axis walls must be on the top and bottom sides.
-            directions = (Direction.NORTH, Direction.SOUTH)
-
-        for v in range(wall_start, wall_end):
-            for i in sides:
-                if axis == "x":
-                    pos = Vector2(v, i)
-                else:
-                    pos = Vector2(i, v)
-                cell = self.get_at(pos)
-                if cell.kind != CORRIDOR:
-                    continue
-
-                cell_one = self.get_at(pos + directions[0])
-                cell_two = self.get_at(pos + directions[1])
-                if cell_one.kind == WALL and cell_two.kind == WALL:
-                    self._maybe_place_door(entity_manager, pos)
 
-    def _place_outer_walls(self):
-        for x in range(self.width):
-            self.cells[x][0].kind = WALL
-            self.cells[x][self.height - 1].kind = WALL
+        candidates = []
+        for side, i in enumerate(sides):
+            # for a door on the X axis walls must be on the left and right sides, on the Y axis
+            # on the top and bottom sides.
+            if axis == "x":
+                line = self.kind[wall_start - 1 : wall_end + 1, i]
+            else:
+                line = self.kind[i, wall_start - 1 : wall_end + 1]
+            doors = (line[1:-1] == CORRIDOR) & (line[:-2] == WALL) & (line[2:] == WALL)
+            candidates.extend((int(v) + wall_start, side) for v in np.flatnonzero(doors))
+
+        # visit the candidates in the same order as walking along the wall
+        for v, side in sorted(candidates):
+            if axis == "x":
+                pos = Vector2(v, sides[side])
+            else:
+                pos = Vector2(sides[side], v)
+            self._maybe_place_door(entity_manager, pos)
 
-        for y in range(self.height):
-            self.cells[0][y].kind = WALL
-            self.cells[self.width - 1][y].kind = WALL
+    def _place_outer_walls(self):
+        self.kind[:, 0] = WALL
+        self.kind[:, self.height - 1] = WALL
+        self.kind[0, :] = WALL
+        self.kind[self.width - 1, :] = WALL
+        self.journal.invalidate()
 
     def _maybe_place_door(self, entity_manager, pos):
         # check adjacent cells for already existing corridors
         for d in Direction.cardinal():
-            a_cell = self.get_at(pos + d)
-            for entity_id in a_cell.entities:
+            a_pos = pos + d
+            for entity_id in self.entity_index.at(a_pos.x, a_pos.y):
                 entity = entity_manager.get_entity(entity_id)
                 if entity.name == "door":
                     return
@@ -368,45 +701,114 @@ class GameMap:
             door = entity_manager.create_entity("door")
             self.move_entity(door, pos)
 
+    def place_entity_id(self, eid, x, y):
+        """Place an entity, by ID, at x, y, moving it if it's already on the map"""
+
+        old_pos = self.entity_index.position(eid)
+        if old_pos == (x, y):
+            return
+        self.entity_index.add(eid, x, y)
+        if old_pos is not None:
+            self.journal.record(old_pos[0], old_pos[1], CHANGED_ENTITIES)
+        self.journal.record(x, y, CHANGED_ENTITIES)
+
+    def remove_entity_id(self, eid):
+        """Remove an entity, by ID, from the map; raises KeyError if it's not there"""
+
+        position = self.entity_index.position(eid)
+        if position is None:
+            raise KeyError(eid)
+        self.entity_index.remove(eid)
+        self.journal.record(position[0], position[1], CHANGED_ENTITIES)
+        door = self.doors.pop(eid, None)
+        if door is not None:
+            door.remove_listener(self._door_listeners.pop(eid))
+
     def move_entity(self, entity, pos):
-        if entity.position is not None:
-            old_cell = self.get_at(entity.position)
-            if entity.eid in old_cell.entities:
-                old_cell.remove_entity(entity)
-        cell = self.get_at(pos)
-        cell.add_entity(entity)
+        self.place_entity_id(entity.eid, pos.x, pos.y)
         entity.set_position(pos)
+        if entity.has_component("door") and entity.eid not in self.doors:
+            door = entity.get_component("door")
+            listener = functools.partial(self._door_changed, entity.eid)
+            door.add_listener(listener)
+            self.doors[entity.eid] = door
+            self._door_listeners[entity.eid] = listener
+
+    def _door_changed(self, eid, door):
+        x, y = self.entity_index.position(eid)
+        self.touch(x, y)
+
+    def closed_doors(self):
+        """Return the x, y positions of the closed doors, as two lists"""
+
+        positions = [
+            self.entity_index.position(eid) for eid, door in self.doors.items() if not door.is_open
+        ]
+        return [x for x, _ in positions], [y for _, y in positions]
+
+    def door_at(self, x, y):
+        """Return the DoorComponent of the door at x, y, or None"""
+
+        for eid in self.entity_index.at(x, y):
+            if eid in self.doors:
+                return self.doors[eid]
+        return None
+
+    def remove_entity(self, entity):
+        """Remove an entity from the map, if present"""
+
+        if entity.eid in self.entity_index:
+            self.remove_entity_id(entity.eid)
 
     def get_at(self, x_or_pos, y=None):
         if y is None and isinstance(x_or_pos, Vector2):
             if 0 <= x_or_pos.x < self.width and 0 <= x_or_pos.y < self.height:
-                return self.cells[x_or_pos.x][x_or_pos.y]
+                return GameCell(self, x_or_pos.x, x_or_pos.y)
             return None
         if 0 <= x_or_pos < self.width and 0 <= y < self.height:
-            return self.cells[x_or_pos][y]
+            return GameCell(self, x_or_pos, y)
         return None
 
-    def get_cells_around(self, x, y):
+    def walkable_mask(self, rect=None):
+        """Return a boolean array, True for each walkable cell of the map or of a Rect"""
+
+        if rect is None:
+            return np.isin(np.asarray(self.kind), WALKABLE)
+        return np.isin(self.kind[self._slice(rect)], WALKABLE)
+
+    def blocking_mask(self, rect=None):
+        """Return a boolean array, True for each cell blocking movement and sight"""
+
+        if rect is None:
+            return np.isin(np.asarray(self.kind), BLOCKING)
+        return np.isin(self.kind[self._slice(rect)], BLOCKING)
+
+    def get_cells_around(self, x, y, walkable_only=False):
         """Get cells around x, y, EXCEPT x,y!"""
 
+        if walkable_only:
+            return [GameCell(self, x + d.x, y + d.y) for d in self.walkable_directions(x, y)]
+
         cells = []
-        center = Vector2(x, y)
-        for d in Direction.all():
-            dest = center + d
-            if 0 <= dest.x < self.width and 0 <= dest.y < self.height:
-                cells.append(self.get_at(dest))
+        for dx, dy in NEIGHBOR_OFFSETS:
+            if 0 <= x + dx < self.width and 0 <= y + dy < self.height:
+                cells.append(GameCell(self, x + dx, y + dy))
         return cells
 
     def get_room(self, room_id):
         return self.rooms[room_id]
 
-    def get_entities_in_room(self, room_id):
+    def get_entities_in_room(self, room_id, only=None):
         """Get all the entities ID for the entities in a room"""
 
         room = self.get_room(room_id)
-        result = []
-        for x in range(room.x, room.endX):
-            for y in range(room.y, room.endY):
-                cell = self.get_at(x, y)
-                result.extend(cell.entities)
-        return result
+        return self.entity_index.in_rect(room.x, room.y, room.width, room.height, only)
+
+    def get_entities_in_radius(self, pos, radius, only=None):
+        """Get the entities ID for the entities within `radius` cells from `pos`.
+
+        `only` can be used to filter the result, e.g. with `entity_manager.components["monster_ai"]`
+        to get only the monsters.
+        """
+
+        return self.entity_index.in_radius(pos.x, pos.y, radius, only)
@@ -0,0 +1,66 @@
+"""
+Versioned journal of the changes made to the cells of a map.
+
+Every change bumps the journal version; code deriving data from a map (FOV maps, renderers, path
+caches...) remembers the version it was built from and later asks for changes_since() that
+version, applying just the changed cells instead of scanning the whole map again.
+
+The journal keeps the last `capacity` changes only: when a consumer is too far behind, or after a
+bulk change touching a whole area of the map, changes_since() returns None and the consumer must
+rebuild from scratch.
+"""
+from collections import deque
+
+
+# change flags
+CHANGED_KIND = 1
+CHANGED_TRANSPARENCY = 2
+CHANGED_ENTITIES = 4
+CHANGED_ALL = CHANGED_KIND | CHANGED_TRANSPARENCY | CHANGED_ENTITIES
+
+
+class ChangeJournal:
+    def __init__(self, capacity=4096):
+        self.capacity = capacity
+        self.version = 0
+        # (version, x, y, flags), oldest first
+        self._entries = deque(maxlen=capacity)
+        # the oldest version changes_since() can answer for
+        self._base = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def record(self, x, y, flags):
+        """Record a change to the cell at x, y; return the new version"""
+
+        self.version += 1
+        if len(self._entries) == self.capacity:
+            # the oldest entry is about to be dropped
+            self._base = self._entries[0][0]
+        self._entries.append((self.version, x, y, flags))
+        return self.version
+
+    def invalidate(self):
+        """Record a change that can't be described cell by cell: every consumer must rebuild"""
+
+        self.version += 1
+        self._entries.clear()
+        self._base = self.version
+        return self.version
+
+    def changes_since(self, version):
+        """Return a (x, y) -> flags dictionary of the cells changed after `version`.
+
+        Return None when the journal doesn't go back to `version` anymore.
+        """
+
+        if version < self._base:
+            return None
+
+        changes = {}
+        for entry_version, x, y, flags in reversed(self._entries):
+            if entry_version <= version:
+                break
+            changes[(x, y)] = changes.get((x, y), 0) | flags
+        return changes
@@ -0,0 +1,224 @@
+"""
+Compact binary format for game levels.
+
+A level file starts with a fixed header and a table of sections, followed by the sections
+themselves, each one aligned to SECTION_ALIGN bytes:
+
+    kind       uint8 array, (width, height)
+    room_id    int32 array, (width, height)
+    feature    uint8 array, (width, height)
+    visited    bool array, (width, height): the cells seen by the player
+    chunks     CHUNK_DTYPE records (only for chunked maps)
+    rooms      ROOM_DTYPE records
+    entities   ENTITY_DTYPE records (ID and position of each entity placed on the level)
+    entstate   UTF-8 JSON list with the state of each entity, in the same order
+
+For a chunked map (a non zero chunk size in the header) the map array sections hold just the
+allocated chunks, each one a (chunk size, chunk size) array, in the order of the chunks section.
+Files written before the visited section existed are loaded with no visited cells.
+
+load_level() memory maps the file copy-on-write and the map arrays are built directly on top of the
+mapping, so opening a level doesn't copy or parse the cells at all; pages are read on first access
+and writes never reach the file.
+"""
+import json
+import mmap
+import struct
+import numpy as np
+from .gamemap import GameMap, Room
+from .chunks import ChunkedLayer
+from .utils import Vector2
+from . import VOID, NO_ROOM, FEATURE_NONE
+
+
+MAGIC = b"PYROLVL\0"
+FORMAT_VERSION = 2
+
+# magic, version, width, height, level, start x/y, end x/y, start/end room IDs, chunk size,
+# sections count
+HEADER = struct.Struct("<8sIIIiiiiiiiII")
+# name, offset, size
+SECTION = struct.Struct("<8sQQ")
+SECTION_ALIGN = 64
+
+ROOM_DTYPE = np.dtype(
+    [
+        ("rid", "<i4"),
+        ("x", "<i4"),
+        ("y", "<i4"),
+        ("width", "<i4"),
+        ("height", "<i4"),
+        ("connected", "u1"),
+    ]
+)
+ENTITY_DTYPE = np.dtype([("eid", "<i8"), ("x", "<i4"), ("y", "<i4")])
+CHUNK_DTYPE = np.dtype([("cx", "<i4"), ("cy", "<i4")])
+
+# sections holding a map array, with their on-disk data type
+MAP_ARRAYS = (("kind", "u1"), ("room_id", "<i4"), ("feature", "u1"), ("visited", "?"))
+# value of the cells of a map array which are not stored in any chunk
+LAYER_FILL = {"kind": VOID, "room_id": NO_ROOM, "feature": FEATURE_NONE, "visited": False}
+
+
+class LevelFormatError(Exception):
+    pass
+
+
+def _vec_or_none(x, y):
+    if x < 0 or y < 0:
+        return None
+    return Vector2(x, y)
+
+
+def _none_as(value, default):
+    return default if value is None else value
+
+
+def _align(offset):
+    return (offset + SECTION_ALIGN - 1) // SECTION_ALIGN * SECTION_ALIGN
+
+
+def save_level(path, game_map, entity_manager):
+    """Write a level and the entities placed on it to `path`"""
+
+    sections = []
+    if game_map.chunked:
+        # the layers may have different chunks allocated: save the union of them
+        keys = set()
+        for name, _ in MAP_ARRAYS:
+            keys.update(getattr(game_map, name).chunk_keys())
+        keys = sorted(keys)
+        sections.append(("chunks", np.array(keys, dtype=CHUNK_DTYPE).tobytes()))
+
+    for name, dtype in MAP_ARRAYS:
+        layer = getattr(game_map, name)
+        if game_map.chunked:
+            size = game_map.chunk_size
+            empty = np.full((size, size), LAYER_FILL[name], dtype=dtype)
+            data = b"".join(
+                _none_as(layer.get_chunk(cx, cy), empty).astype(dtype).tobytes() for cx, cy in keys
+            )
+        else:
+            data = np.ascontiguousarray(layer, dtype=dtype).tobytes()
+        sections.append((name, data))
+
+    rooms = np.array(
+        [(r.rid, r.x, r.y, r.width, r.height, r.connected) for r in game_map.rooms.values()],
+        dtype=ROOM_DTYPE,
+    )
+    sections.append(("rooms", rooms.tobytes()))
+
+    positions = sorted((eid, pos) for pos, eids in game_map.entity_index.items() for eid in eids)
+    entities = np.array([(eid, x, y) for eid, (x, y) in positions], dtype=ENTITY_DTYPE)
+    sections.append(("entities", entities.tobytes()))
+    states = [entity_manager.get_entity(eid).get_state() for eid, _ in positions]
+    sections.append(("entstate", json.dumps(states).encode("utf-8")))
+
+    start = _none_as(game_map.start_vec, Vector2(-1, -1))
+    end = _none_as(game_map.end_vec, Vector2(-1, -1))
+    header = HEADER.pack(
+        MAGIC,
+        FORMAT_VERSION,
+        game_map.width,
+        game_map.height,
+        _none_as(game_map.level, -1),
+        start.x,
+        start.y,
+        end.x,
+        end.y,
+        _none_as(game_map.start_room_id, -1),
+        _none_as(game_map.end_room_id, -1),
+        _none_as(game_map.chunk_size, 0),
+        len(sections),
+    )
+
+    table = []
+    offset = _align(HEADER.size + SECTION.size * len(sections))
+    for name, data in sections:
+        table.append(SECTION.pack(name.encode("ascii"), offset, len(data)))
+        offset = _align(offset + len(data))
+
+    with open(path, "wb") as fd:
+        fd.write(header)
+        fd.write(b"".join(table))
+        for (_, data), entry in zip(sections, table):
+            _, offset, _ = SECTION.unpack(entry)
+            fd.write(b"\0" * (offset - fd.tell()))
+            fd.write(data)
+
+
+def read_sections(buf):
+    """Parse the header of a level; return the header fields and a name -> (offset, size) dict"""
+
+    if len(buf) < HEADER.size:
+        raise LevelFormatError("file too short")
+    header = HEADER.unpack_from(buf, 0)
+    if header[0] != MAGIC:
+        raise LevelFormatError("not a level file")
+    if header[1] != FORMAT_VERSION:
+        raise LevelFormatError("unsupported format version %d" % header[1])
+
+    sections = {}
+    for i in range(header[-1]):
+        name, offset, size = SECTION.unpack_from(buf, HEADER.size + i * SECTION.size)
+        sections[name.rstrip(b"\0").decode("ascii")] = (offset, size)
+    return header, sections
+
+
+def load_level(path):
+    """Load a level saved with save_level().
+
+    Return a (GameMap, entity states) tuple; the entities still need to be re-created, e.g. with
+    EntityManager.restore_entity(), and placed on the map at the position found in the state
+    "x" and "y" keys.
+    """
+
+    with open(path, "rb") as fd:
+        buf = mmap.mmap(fd.fileno(), 0, access=mmap.ACCESS_COPY)
+
+    header, sections = read_sections(buf)
+    _, _, width, height, level, sx, sy, ex, ey, start_room_id, end_room_id, chunk_size, _ = header
+
+    def section(name, dtype):
+        offset, size = sections[name]
+        dtype = np.dtype(dtype)
+        if size == 0:
+            return np.empty(0, dtype=dtype)
+        return np.frombuffer(buf, dtype=dtype, count=size // dtype.itemsize, offset=offset)
+
+    arrays = [(name, dtype) for name, dtype in MAP_ARRAYS if name in sections]
+    if chunk_size:
+        keys = [tuple(key) for key in section("chunks", CHUNK_DTYPE).tolist()]
+        layers = {}
+        for name, dtype in arrays:
+            data = section(name, dtype).reshape((len(keys), chunk_size, chunk_size))
+            chunks = dict(zip(keys, data))
+            layers[name] = ChunkedLayer(
+                (width, height), dtype, LAYER_FILL[name], chunk_size, chunks
+            )
+    else:
+        layers = {name: section(name, dtype).reshape((width, height)) for name, dtype in arrays}
+    cells = (layers["kind"], layers["room_id"], layers["feature"])
+    game_map = GameMap(width, height, cells=cells, chunk_size=chunk_size or None)
+    if "visited" in layers:
+        game_map.visited = layers["visited"]
+
+    for rid, x, y, width, height, connected in section("rooms", ROOM_DTYPE).tolist():
+        room = Room(x, y, width, height)
+        room.rid = rid
+        room.connected = bool(connected)
+        game_map.rooms[rid] = room
+
+    game_map.level = None if level < 0 else level
+    game_map.start_vec = _vec_or_none(sx, sy)
+    game_map.end_vec = _vec_or_none(ex, ey)
+    game_map.start_room_id = None if start_room_id < 0 else start_room_id
+    game_map.end_room_id = None if end_room_id < 0 else end_room_id
+
+    offset, size = sections["entstate"]
+    states = json.loads(bytes(buf[offset : offset + size]).decode("utf-8"))
+    for (_, x, y), state in zip(section("entities", ENTITY_DTYPE).tolist(), states):
+        state["x"] = x
+        state["y"] = y
+
+    return game_map, states
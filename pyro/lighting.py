@@ -0,0 +1,128 @@
+"""
+Light sources and the light map of a level.
+
+Entities with a LightComponent (e.g. the stairs) light the cells they see, through a FOV computed
+in a workspace of the scene's VisionPool, so walls and closed doors cast shadows. The brightness
+of a source fades linearly with the distance, reaching 1 / (radius + 1) at the radius; LightMap
+accumulates the contributions of all the sources in `intensity`, a (width, height) layer read by
+the renderer and by the monsters' Perception (the player standing in the light is seen from
+farther away).
+
+The contribution of a source is computed once and kept until the source moves, changes, or a
+cell around it changes transparency (see invalidate()): static lights are computed once per level,
+moving ones only when they move.
+"""
+import numpy as np
+import tcod
+
+
+# cells at least this bright are lit
+LIT_THRESHOLD = 0.25
+# how much the color of the light is added to the color of the lit cells
+LIGHT_TINT = 0.5
+
+
+def light_sources(game_map, entity_manager):
+    """Return the light sources placed on a map, by entity ID, as (x, y, radius, color) tuples"""
+
+    sources = {}
+    for eid, light in entity_manager.components.get("light", {}).items():
+        position = game_map.entity_index.position(eid)
+        if position is not None:
+            sources[eid] = (position[0], position[1], light.radius, light.color)
+    return sources
+
+
+def apply_light(color, light):
+    """Return color tinted by light, an RGB triple as returned by LightMap.colors()"""
+
+    return tuple(min(int(c + l * LIGHT_TINT), 255) for c, l in zip(color, light))
+
+
+class LightMap:
+    def __init__(self, game_map, vision, algorithm=tcod.FOV_DIAMOND):
+        self.vision = vision
+        self.algorithm = algorithm
+        self.intensity = game_map.new_layer(np.float32, 0.0)
+        # source ID -> ((x, y, radius, color), (x slice, y slice) of the lit square, brightness of
+        # the square cells)
+        self._sources = {}
+        # sources to compute again, because of a change of transparency
+        self._dirty = set()
+        # number of contributions computed
+        self.computed = 0
+
+    def __contains__(self, source_id):
+        return source_id in self._sources
+
+    def update(self, sources):
+        """Bring the light map up to date with sources, as returned by light_sources()"""
+
+        for source_id in list(self._sources):
+            if source_id not in sources:
+                self._remove(source_id)
+
+        for source_id, source in sources.items():
+            current = self._sources.get(source_id)
+            if current is not None:
+                if current[0] == source and source_id not in self._dirty:
+                    continue
+                self._remove(source_id)
+            self._add(source_id, source)
+        self._dirty.clear()
+
+    def invalidate(self, x, y):
+        """To be called when the transparency of x, y changed: the sources around it are dirty"""
+
+        for source_id, (_, (xs, ys), _) in self._sources.items():
+            if xs.start <= x < xs.stop and ys.start <= y < ys.stop:
+                self._dirty.add(source_id)
+
+    def invalidate_all(self):
+        self._dirty.update(self._sources)
+
+    def _add(self, source_id, source):
+        x, y, radius, _ = source
+        with self.vision.workspace() as workspace:
+            fov = workspace.compute(x, y, radius, algorithm=self.algorithm).T.copy()
+            left, top = workspace.left, workspace.top
+        square = (slice(left, left + fov.shape[0]), slice(top, top + fov.shape[1]))
+
+        dx = np.arange(left, left + fov.shape[0]) - x
+        dy = np.arange(top, top + fov.shape[1]) - y
+        distance = np.sqrt(dx[:, None] ** 2 + dy[None, :] ** 2)
+        brightness = np.where(fov, np.clip(1 - distance / (radius + 1), 0, 1), 0)
+        brightness = brightness.astype(np.float32)
+
+        self.intensity[square] = self.intensity[square] + brightness
+        self._sources[source_id] = (source, square, brightness)
+        self.computed += 1
+
+    def _remove(self, source_id):
+        _, square, brightness = self._sources.pop(source_id)
+        # don't let rounding errors leave a negative light
+        self.intensity[square] = np.maximum(self.intensity[square] - brightness, 0)
+
+    def is_lit(self, x, y):
+        return bool(self.intensity[x, y] >= LIT_THRESHOLD)
+
+    def colors(self, x0, y0, x1, y1):
+        """Return the color of the light on the cells from x0, y0 up to x1, y1 excluded.
+
+        The result is a (x1 - x0, y1 - y0, 3) array: the color of each source weighted by its
+        brightness, summed over the sources and clipped to 255.
+        """
+
+        result = np.zeros((max(x1 - x0, 0), max(y1 - y0, 0), 3), dtype=np.float32)
+        for (_, _, _, color), (xs, ys), brightness in self._sources.values():
+            left, right = max(xs.start, x0), min(xs.stop, x1)
+            top, bottom = max(ys.start, y0), min(ys.stop, y1)
+            if left >= right or top >= bottom:
+                continue
+            part = brightness[
+                left - xs.start : right - xs.start, top - ys.start : bottom - ys.start
+            ]
+            result[left - x0 : right - x0, top - y0 : bottom - y0] += part[:, :, None] * np.asarray(
+                color, dtype=np.float32
+            )
+        return np.minimum(result, 255)
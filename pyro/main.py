@@ -50,7 +50,13 @@ def validate_size(ctx, param, value):
     help="Specify the dungeon generation algorithm",
     show_default=True,
 )
-def main(seed, size, window, debug, font, log_level, algo):
+@click.option(
+    "--chunk-size",
+    "chunk_size",
+    type=click.INT,
+    help="Store the map in chunks of this size, allocated on demand (for very large maps)",
+)
+def main(seed, size, window, debug, font, log_level, algo, chunk_size):
     if seed is None:
         seed = int(time.time())
 
@@ -58,6 +64,7 @@ def main(seed, size, window, debug, font, log_level, algo):
     win_width, win_height = window
     game = Game(seed, width, height, font, win_width, win_height)
     game.dungeon_algorithm = algo
+    game.chunk_size = chunk_size
     game.init_game()
 
     logging.basicConfig(
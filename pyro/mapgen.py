@@ -0,0 +1,155 @@
+"""
+Headless bulk map generation.
+
+Generate many maps without a window, spreading the seeds over a pool of processes, and report how
+long each phase of the generation took. The JSON lines written with --output can be used as a seed
+corpus: each line describes the map generated with a given seed.
+"""
+import json
+import logging
+import random
+import time
+import multiprocessing
+from collections import OrderedDict
+import click
+from .utils import tcod_random
+from .gamedata import gamedata
+from .world import World
+from .main import validate_size
+
+
+def init_worker(log_level="WARNING"):
+    logging.basicConfig(
+        format="[%(levelname)s] %(asctime)s (%(module)s.%(funcName)s:%(lineno)d) %(message)s",
+        datefmt="%Y-%m-%d %H:%M:%S",
+        level=log_level,
+    )
+    gamedata.load()
+
+
+def generate_map(task):
+    """Generate a single map and return a dictionary describing it.
+
+    `task` is a (seed, width, height, algorithm) tuple, optionally followed by a chunk size.
+    """
+
+    seed, width, height, algorithm = task[:4]
+    chunk_size = task[4] if len(task) > 4 else None
+    random.seed(seed)
+    tcod_random.init(seed)
+
+    world = World()
+    start = time.perf_counter()
+    world.create_map(width, height, dungeon_algorithm=algorithm, chunk_size=chunk_size)
+    elapsed = time.perf_counter() - start
+
+    game_map = world.get_current_map()
+    return OrderedDict(
+        [
+            ("seed", seed),
+            ("algorithm", algorithm),
+            ("width", width),
+            ("height", height),
+            ("rooms", len(game_map.rooms)),
+            ("walkable", int(game_map.walkable_mask().sum())),
+            ("entities", len(world.entity_manager.entities)),
+            ("elapsed", elapsed),
+            ("timings", game_map.timings),
+        ]
+    )
+
+
+def generate_maps(tasks, jobs, log_level="WARNING"):
+    """Generate a map for each task, yielding the results in the same order"""
+
+    if jobs == 1:
+        init_worker(log_level)
+        for task in tasks:
+            yield generate_map(task)
+        return
+
+    with multiprocessing.Pool(jobs, initializer=init_worker, initargs=(log_level,)) as pool:
+        for result in pool.imap(generate_map, tasks, chunksize=4):
+            yield result
+
+
+def print_report(results, wall_time, jobs):
+    count = len(results)
+    rooms = sum(r["rooms"] for r in results)
+    cells = sum(r["width"] * r["height"] for r in results)
+
+    phases = OrderedDict()
+    for result in results:
+        for phase, elapsed in result["timings"].items():
+            phases[phase] = phases.get(phase, 0.0) + elapsed
+    total = sum(phases.values()) or 1.0
+
+    click.echo("Generated %d maps in %.3fs using %d processes" % (count, wall_time, jobs))
+    click.echo("%-12s %12s %12s %8s" % ("phase", "total (s)", "mean (ms)", "share"))
+    for phase, elapsed in phases.items():
+        click.echo(
+            "%-12s %12.3f %12.3f %7.1f%%"
+            % (phase, elapsed, elapsed / count * 1000, elapsed / total * 100)
+        )
+    click.echo("maps/sec:  %.1f" % (count / wall_time))
+    click.echo("rooms/sec: %.1f" % (rooms / wall_time))
+    click.echo("cells/sec: %.1f" % (cells / wall_time))
+
+
+@click.command()
+@click.option("--count", "-n", default=100, help="Number of maps to generate", show_default=True)
+@click.option("--seed", "-s", default=1, help="Seed of the first map", show_default=True)
+@click.option(
+    "--size",
+    "-S",
+    metavar="SIZE",
+    default="80x60",
+    callback=validate_size,
+    help="Specify map size",
+    show_default=True,
+)
+@click.option(
+    "--algo",
+    "-a",
+    type=click.Choice(["bsp", "tunneling"]),
+    default="bsp",
+    help="Specify the dungeon generation algorithm",
+    show_default=True,
+)
+@click.option(
+    "--jobs",
+    "-j",
+    type=click.INT,
+    default=multiprocessing.cpu_count(),
+    help="Number of worker processes",
+    show_default=True,
+)
+@click.option(
+    "--chunk-size",
+    "chunk_size",
+    type=click.INT,
+    help="Store the maps in chunks of this size, allocated on demand",
+)
+@click.option(
+    "--output", "-o", type=click.File("w"), help="Write a JSON line for each generated map"
+)
+@click.option(
+    "--log-level",
+    "log_level",
+    type=click.Choice(["DEBUG", "INFO", "WARNING", "ERROR"]),
+    default="WARNING",
+    show_default=True,
+)
+def main(count, seed, size, algo, jobs, chunk_size, output, log_level):
+    width, height = size
+    tasks = [(s, width, height, algo, chunk_size) for s in range(seed, seed + count)]
+
+    results = []
+    start = time.perf_counter()
+    for result in generate_maps(tasks, jobs, log_level):
+        results.append(result)
+        if output is not None:
+            output.write(json.dumps(result) + "\n")
+    wall_time = time.perf_counter() - start
+
+    print_report(results, wall_time, jobs)
@@ -0,0 +1,142 @@
+"""
+Vectorized Perlin "improved" noise.
+
+This is a NumPy port of the 2D noise function of the `noise` package (Casey Duncan), evaluating a
+whole grid of coordinates at once. With seed 0 it uses Ken Perlin's reference permutation and gives
+the same values as `noise.pnoise2(x, y)`; other seeds shuffle the permutation table.
+"""
+from functools import lru_cache
+import numpy as np
+
+
+# Ken Perlin's reference permutation
+# fmt: off
+PERLIN_PERMUTATION = (
+    151, 160, 137, 91, 90, 15, 131, 13, 201, 95, 96, 53, 194, 233, 7, 225,
+    140, 36, 103, 30, 69, 142, 8, 99, 37, 240, 21, 10, 23, 190, 6, 148,
+    247, 120, 234, 75, 0, 26, 197, 62, 94, 252, 219, 203, 117, 35, 11, 32,
+    57, 177, 33, 88, 237, 149, 56, 87, 174, 20, 125, 136, 171, 168, 68, 175,
+    74, 165, 71, 134, 139, 48, 27, 166, 77, 146, 158, 231, 83, 111, 229, 122,
+    60, 211, 133, 230, 220, 105, 92, 41, 55, 46, 245, 40, 244, 102, 143, 54,
+    65, 25, 63, 161, 1, 216, 80, 73, 209, 76, 132, 187, 208, 89, 18, 169,
+    200, 196, 135, 130, 116, 188, 159, 86, 164, 100, 109, 198, 173, 186, 3, 64,
+    52, 217, 226, 250, 124, 123, 5, 202, 38, 147, 118, 126, 255, 82, 85, 212,
+    207, 206, 59, 227, 47, 16, 58, 17, 182, 189, 28, 42, 223, 183, 170, 213,
+    119, 248, 152, 2, 44, 154, 163, 70, 221, 153, 101, 155, 167, 43, 172, 9,
+    129, 22, 39, 253, 19, 98, 108, 110, 79, 113, 224, 232, 178, 185, 112, 104,
+    218, 246, 97, 228, 251, 34, 242, 193, 238, 210, 144, 12, 191, 179, 162, 241,
+    81, 51, 145, 235, 249, 14, 239, 107, 49, 192, 214, 31, 181, 199, 106, 157,
+    184, 84, 204, 176, 115, 121, 50, 45, 127, 4, 150, 254, 138, 236, 205, 93,
+    222, 114, 67, 29, 24, 72, 243, 141, 128, 195, 78, 66, 215, 61, 156, 180,
+)
+# fmt: on
+
+# gradients for the 2D noise: the x and y components of the 16 GRAD3 vectors used by `noise`
+GRADIENTS = np.array(
+    [
+        (1, 1),
+        (-1, 1),
+        (1, -1),
+        (-1, -1),
+        (1, 0),
+        (-1, 0),
+        (1, 0),
+        (-1, 0),
+        (0, 1),
+        (0, -1),
+        (0, 1),
+        (0, -1),
+        (1, 0),
+        (-1, 0),
+        (0, -1),
+        (0, 1),
+    ],
+    dtype=np.float32,
+)
+
+
+@lru_cache(maxsize=32)
+def permutation_table(seed):
+    """Return the (doubled) permutation table for a seed"""
+
+    if seed == 0:
+        perm = np.array(PERLIN_PERMUTATION, dtype=np.intp)
+    else:
+        perm = np.random.RandomState(seed).permutation(256).astype(np.intp)
+    table = np.concatenate([perm, perm])
+    table.flags.writeable = False
+    return table
+
+
+def _fade(t):
+    return t * t * t * (t * (t * 6 - 15) + 10)
+
+
+def _lerp(t, a, b):
+    return a + t * (b - a)
+
+
+def _grad(hash_, x, y):
+    gradient = GRADIENTS[hash_ & 15]
+    return x * gradient[..., 0] + y * gradient[..., 1]
+
+
+def pnoise2(x, y, seed=0, repeat=1024):
+    """Perlin noise for arrays of coordinates; x and y are broadcast against each other"""
+
+    perm = permutation_table(seed)
+
+    # the reference implementation works with single precision floats
+    x = np.asarray(x, dtype=np.float32)
+    y = np.asarray(y, dtype=np.float32)
+    x, y = np.broadcast_arrays(x, y)
+
+    i = np.floor(np.fmod(x, repeat)).astype(np.intp)
+    j = np.floor(np.fmod(y, repeat)).astype(np.intp)
+    ii = np.fmod(i + 1, repeat) & 255
+    jj = np.fmod(j + 1, repeat) & 255
+    i &= 255
+    j &= 255
+
+    x = x - np.floor(x)
+    y = y - np.floor(y)
+    fx = _fade(x)
+    fy = _fade(y)
+
+    a = perm[i]
+    aa = perm[a + j]
+    ab = perm[a + jj]
+    b = perm[ii]
+    ba = perm[b + j]
+    bb = perm[b + jj]
+
+    one = np.float32(1)
+    return _lerp(
+        fy,
+        _lerp(fx, _grad(perm[aa], x, y), _grad(perm[ba], x - one, y)),
+        _lerp(fx, _grad(perm[ab], x, y - one), _grad(perm[bb], x - one, y - one)),
+    )
+
+
+@lru_cache(maxsize=8)
+def noise_field(seed, width, height, frequency):
+    """Return a read-only (width, height) array of noise values between 0 and 1.
+
+    The grid is sampled every `width / frequency` and `height / frequency` cells, so that the noise
+    pattern has the same look regardless of the size of the map. Fields are cached, so generating
+    a map of the same size again reuses the field computed the first time.
+    """
+
+    xs = np.arange(width)
+    ys = np.arange(height)
+    field = noise_at(seed, width, height, frequency, xs[:, np.newaxis], ys[np.newaxis, :])
+    field.flags.writeable = False
+    return field
+
+
+def noise_at(seed, width, height, frequency, xs, ys):
+    """Return the values of noise_field() at the cells xs, ys, without computing the whole field"""
+
+    fx = width / frequency
+    fy = height / frequency
+    return pnoise2(xs / fx, ys / fy, seed).astype(np.float32) * 0.5 + 0.5
@@ -0,0 +1,116 @@
+"""
+Cache of the A* paths found on a map.
+
+Paths are cached by (start, goal, diagonal) and every cell of a cached path is indexed too: since
+any part of a shortest path is a shortest path itself, a monster that moved one step along its
+path gets the rest of it from the cache without searching again. The whole cache is dropped when
+the walkable cells change or a door is opened or closed (see ChangeJournal).
+
+Paths are searched with Jump Point Search unless `jps` is False.
+"""
+import weakref
+from collections import OrderedDict
+from .astar import astar
+from .journal import CHANGED_KIND, CHANGED_TRANSPARENCY
+from .utils import Vector2
+
+
+class PathCache:
+    def __init__(self, game_map, max_paths=256, jps=True):
+        self._game_map = weakref.ref(game_map)
+        self.max_paths = max_paths
+        self.jps = jps
+        # (start x, start y, goal x, goal y, diagonal) -> path, as a tuple of (x, y) including the
+        # start position; least recently used first.
+        self._paths = OrderedDict()
+        # (x, y, goal x, goal y, diagonal) -> (key of a path through x, y; position in the path)
+        self._index = {}
+        # the map version the cached paths are valid for
+        self.version = game_map.version
+
+        self.hits = 0
+        self.suffix_hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._paths)
+
+    @property
+    def hit_rate(self):
+        total = self.hits + self.suffix_hits + self.misses
+        return (self.hits + self.suffix_hits) / total if total else 0.0
+
+    def stats(self):
+        return {
+            "paths": len(self._paths),
+            "hits": self.hits,
+            "suffix_hits": self.suffix_hits,
+            "misses": self.misses,
+            "hit_rate": self.hit_rate,
+        }
+
+    def clear(self):
+        self._paths.clear()
+        self._index.clear()
+
+    def _validate(self, game_map):
+        if self.version == game_map.version:
+            return
+
+        changes = game_map.journal.changes_since(self.version)
+        if changes is None or any(
+            flags & (CHANGED_KIND | CHANGED_TRANSPARENCY) for flags in changes.values()
+        ):
+            self.clear()
+        self.version = game_map.version
+
+    def get(self, start, goal, diagonal=True):
+        """Return the path from start to goal, like astar()"""
+
+        game_map = self._game_map()
+        self._validate(game_map)
+        diagonal = bool(diagonal)
+
+        found = self._index.get((start.x, start.y, goal.x, goal.y, diagonal))
+        if found is not None:
+            path_key, offset = found
+            if offset == 0:
+                self.hits += 1
+            else:
+                self.suffix_hits += 1
+            self._paths.move_to_end(path_key)
+            return [Vector2(x, y) for x, y in self._paths[path_key][offset + 1 :]]
+
+        self.misses += 1
+        path = astar(game_map, start, goal, diagonal, jps=self.jps)
+        if path:
+            self._add((start.x, start.y, goal.x, goal.y, diagonal), path)
+        return path
+
+    def _add(self, key, path):
+        _, _, gx, gy, diagonal = key
+        cells = (key[:2],) + tuple((pos.x, pos.y) for pos in path)
+        self._paths[key] = cells
+        for offset, (x, y) in enumerate(cells[:-1]):
+            self._index[(x, y, gx, gy, diagonal)] = (key, offset)
+
+        while len(self._paths) > self.max_paths:
+            old_key, old_cells = self._paths.popitem(last=False)
+            _, _, ogx, ogy, odiagonal = old_key
+            for x, y in old_cells[:-1]:
+                index_key = (x, y, ogx, ogy, odiagonal)
+                # the cell may be indexed by a newer path now
+                if self._index.get(index_key, (None,))[0] == old_key:
+                    del self._index[index_key]
+
+
+_caches = weakref.WeakKeyDictionary()
+
+
+def get_path_cache(game_map):
+    """Return the PathCache of a map, creating it on first use"""
+
+    cache = _caches.get(game_map)
+    if cache is None:
+        cache = _caches[game_map] = PathCache(game_map)
+    return cache
@@ -0,0 +1,89 @@
+"""
+What the monsters can see of the player.
+
+Instead of computing a FOV from every monster, Perception computes a single FOV from the player,
+as far as the monster with the largest radius can see, together with the distance of each cell
+from the player: a monster sees the player when its own cell is lit and close enough. This relies
+on the symmetry of the FOV algorithm (what I can see can see me), guaranteed by the symmetric
+shadowcasting: FOV_SYMMETRIC_SHADOWCAST of recent tcod releases, or pyro.fov.symmetric_shadowcast
+on the older ones. With a non symmetric algorithm (e.g. tcod.FOV_DIAMOND) each monster computes its
+own FOV instead, in a workspace of the VisionPool (whose cache spares the monsters that don't move).
+
+The player standing in the light (see pyro.lighting) is seen from LIT_SIGHT_FACTOR times farther.
+"""
+import numpy as np
+import tcod
+from .fov import SYMMETRIC_SHADOWCAST
+from .lighting import LIT_THRESHOLD
+
+
+PERCEPTION_ALGORITHM = getattr(tcod, "FOV_SYMMETRIC_SHADOWCAST", SYMMETRIC_SHADOWCAST)
+LIT_SIGHT_FACTOR = 2
+
+
+class Perception:
+    def __init__(self, algorithm=PERCEPTION_ALGORITHM):
+        self.algorithm = algorithm
+        # is the FOV from the origin the same as the FOVs from the other cells
+        self.symmetric = algorithm in (
+            SYMMETRIC_SHADOWCAST,
+            getattr(tcod, "FOV_SYMMETRIC_SHADOWCAST", SYMMETRIC_SHADOWCAST),
+        )
+        self.vision = None
+        self.origin = None
+        self.radius = 0
+        # the sight radius of every monster is multiplied by this
+        self.factor = 1
+        # position of the square around the origin on the map
+        self.left = 0
+        self.top = 0
+        # for each cell of the square, indexed by [x, y]: is it seen from the origin, and the square
+        # of its distance from the origin
+        self.visible = np.zeros((0, 0), dtype=bool)
+        self.distance2 = np.zeros((0, 0), dtype=int)
+
+    def update(self, vision, origin, radius, light=0.0):
+        """Compute what is seen from origin (a Vector2) up to radius, in a workspace of vision.
+
+        vision is the VisionPool of the scene: only the square around origin is copied. light is
+        the intensity of the light on origin. With a non symmetric algorithm nothing is computed
+        here, see can_see().
+        """
+
+        self.vision = vision
+        self.origin = origin.copy()
+        self.factor = LIT_SIGHT_FACTOR if light >= LIT_THRESHOLD else 1
+        radius *= self.factor
+        self.radius = radius
+        if not self.symmetric:
+            return
+
+        with vision.workspace() as workspace:
+            workspace.compute(origin.x, origin.y, radius, algorithm=self.algorithm)
+            self.left, self.top = workspace.left, workspace.top
+            self.visible = workspace.fov.T.copy()
+        right, bottom = self.left + self.visible.shape[0], self.top + self.visible.shape[1]
+
+        xs = np.arange(self.left, right) - origin.x
+        ys = np.arange(self.top, bottom) - origin.y
+        self.distance2 = xs[:, None] ** 2 + ys[None, :] ** 2
+
+    def can_see(self, pos, radius):
+        """Return True when pos and the origin see each other within radius, times `factor`.
+
+        radius must not be larger than the radius given to update().
+        """
+
+        radius *= self.factor
+        if not self.symmetric:
+            with self.vision.workspace() as workspace:
+                workspace.compute(pos.x, pos.y, radius, algorithm=self.algorithm)
+                return workspace.is_visible(self.origin.x, self.origin.y)
+
+        x, y = pos.x - self.left, pos.y - self.top
+        if not (0 <= x < self.visible.shape[0] and 0 <= y < self.visible.shape[1]):
+            return False
+        if not self.visible[x, y]:
+            return False
+        # the symmetric shadowcasting lights the cells closer than the radius
+        return int(self.distance2[x, y]) < radius * radius
@@ -0,0 +1,434 @@
+"""
+Abstract graph of the rooms of a map, for long distance path finding.
+
+The nodes of a RoomGraph are the doorways of the rooms (the walkable cells of their walls), the
+room centers and the corridor crossings. Each node is joined to the nodes it reaches without going
+through another node, with the walking cost of the shortest such path: any path between two nodes
+is a chain of these legs, so the shortest paths over the graph cost as much as the shortest paths
+over the cells.
+
+A HierarchicalPathfinder routes over the graph first, then looks for the cells of the next leg of
+the route only: a query across the whole map visits a few hundred nodes instead of most cells.
+
+The graph and the RoomDistances between all the rooms are built on first use. Map generation only
+needs the distances from the start room, which walking_distances() measures with a single search
+over the cells.
+"""
+import heapq
+import logging
+import math
+import weakref
+from collections import OrderedDict
+from itertools import combinations
+import numpy as np
+from .astar import DIAGONAL_COST, get_engine
+from .gamemap import NEIGHBOR_OFFSETS, MASK_DIRECTIONS
+from .journal import CHANGED_KIND
+from .utils import Vector2
+from . import NO_ROOM
+
+
+logger = logging.getLogger(__name__)
+
+# monsters use the hierarchical path finder on maps larger than this (in cells)
+HIERARCHICAL_MIN_CELLS = 1 << 16
+# neighbor mask bits of the cardinal directions
+CARDINAL_BITS = tuple(
+    NEIGHBOR_OFFSETS.index(offset) for offset in ((0, -1), (1, 0), (0, 1), (-1, 0))
+)
+
+
+class RoomGraph:
+    """The room centers, doorways and corridor crossings of a map, joined by their walking costs"""
+
+    def __init__(self, game_map, diagonal=True):
+        self.diagonal = diagonal
+        self.height = game_map.height
+        self.version = game_map.version
+        # room ID -> flat index of the room center, or of the walkable cell of the room closest to
+        # it, for the rooms with a walkable interior
+        self.room_nodes = OrderedDict()
+        # flat index of each doorway -> IDs of the rooms it opens into
+        self.doorways = {}
+        # room ID -> (interior Rect, nodes inside the room) for the rooms without walls inside.
+        # Their nodes are the room center and the portals, the cells just inside the doorways: the
+        # walking cost between two cells inside these rooms is just their distance, so the rooms are
+        # never searched.
+        self.open_rooms = {}
+        # flat indexes of the corridor cells where three or more ways meet, and of their neighbors
+        self.crossings = set()
+        self._find_nodes(game_map)
+        self.nodes = set(self.doorways)
+        self.nodes.update(self.room_nodes.values())
+        self.nodes.update(self.crossings)
+        inside = set()
+        for _, room_nodes in self.open_rooms.values():
+            inside.update(room_nodes)
+        self.nodes.update(inside)
+
+        # node -> {neighbor node: walking cost}
+        self.edges = {node: {} for node in self.nodes}
+        for _, room_nodes in self.open_rooms.values():
+            for a, b in combinations(room_nodes, 2):
+                self._add_edge(a, b, self.distance(self.position(a), self.position(b)))
+        engine = get_engine(game_map)
+        for node in self.nodes - inside:
+            costs, _ = engine.dijkstra(self.position(node), diagonal, stop=self.nodes)
+            for other in self.nodes.intersection(costs):
+                if other != node:
+                    self._add_edge(node, other, costs[other])
+        logger.debug(
+            "Room graph: %d nodes, %d edges",
+            len(self.nodes),
+            sum(len(edges) for edges in self.edges.values()),
+        )
+
+    def _add_edge(self, a, b, cost):
+        if cost < self.edges[a].get(b, math.inf):
+            self.edges[a][b] = cost
+            self.edges[b][a] = cost
+
+    def _find_nodes(self, game_map):
+        for room in game_map.rooms.values():
+            walkable = game_map.walkable_mask(room)
+            walls = walkable.copy()
+            walls[1:-1, 1:-1] = False
+            doorways = []
+            for x, y in zip(*np.nonzero(walls)):
+                x, y = int(x) + room.x, int(y) + room.y
+                self.doorways.setdefault(x * self.height + y, []).append(room.rid)
+                doorways.append((x, y))
+
+            center = room_node(game_map, room, walkable)
+            if center is not None:
+                self.room_nodes[room.rid] = center.x * self.height + center.y
+
+            interior = room.inflate(-1)
+            if interior.width > 0 and interior.height > 0 and walkable[1:-1, 1:-1].all():
+                room_nodes = set()
+                for x, y in doorways:
+                    for dx, dy in NEIGHBOR_OFFSETS:
+                        if (
+                            interior.x <= x + dx < interior.endX
+                            and interior.y <= y + dy < interior.endY
+                        ):
+                            room_nodes.add((x + dx) * self.height + y + dy)
+                if room.rid in self.room_nodes:
+                    room_nodes.add(self.room_nodes[room.rid])
+                self.open_rooms[room.rid] = (interior, sorted(room_nodes))
+
+        walk = game_map.neighbor_masks()[0]
+        for region in game_map.iter_regions():
+            area = (slice(region.x, region.endX), slice(region.y, region.endY))
+            masks = walk[area]
+            ways = sum((masks >> bit) & 1 for bit in CARDINAL_BITS)
+            crossings = (ways >= 3) & game_map.walkable_mask(region)
+            crossings &= game_map.room_id[area] == NO_ROOM
+            for x, y in zip(*np.nonzero(crossings)):
+                x, y = int(x) + region.x, int(y) + region.y
+                self.crossings.add(x * self.height + y)
+                # with diagonal moves a crossing can be walked around: its neighbors are nodes too
+                for d in MASK_DIRECTIONS[walk[x, y]]:
+                    self.crossings.add((x + d.x) * self.height + y + d.y)
+
+    def position(self, node):
+        return Vector2(*divmod(node, self.height))
+
+    def distance(self, a, b):
+        """The walking cost between two cells with no walls in between"""
+
+        dx = abs(a.x - b.x)
+        dy = abs(a.y - b.y)
+        if self.diagonal:
+            return dx + dy + (DIAGONAL_COST - 2) * min(dx, dy)
+        return dx + dy
+
+    def open_room_at(self, game_map, pos):
+        """Return the ID of the open room whose interior holds pos, None if there's none"""
+
+        room_id = int(game_map.room_id[pos.x, pos.y])
+        if room_id not in self.open_rooms:
+            return None
+        interior = self.open_rooms[room_id][0]
+        if interior.x <= pos.x < interior.endX and interior.y <= pos.y < interior.endY:
+            return room_id
+        return None
+
+    def local_costs(self, game_map, pos):
+        """Return the walking cost from pos to the cells reachable without going through a node.
+
+        The result is a {flat index: cost} dictionary; inside an open room only the nodes of the
+        room are returned.
+        """
+
+        room_id = self.open_room_at(game_map, pos)
+        if room_id is not None:
+            room_nodes = self.open_rooms[room_id][1]
+            costs = {node: self.distance(pos, self.position(node)) for node in room_nodes}
+            costs[pos.x * self.height + pos.y] = 0.0
+            return costs
+
+        costs, _ = get_engine(game_map).dijkstra(pos, self.diagonal, stop=self.nodes)
+        return costs
+
+    def is_valid(self, game_map):
+        """Return True when the walkable cells of the map didn't change since the graph was built"""
+
+        if self.version == game_map.version:
+            return True
+
+        changes = game_map.journal.changes_since(self.version)
+        if changes is None or any(flags & CHANGED_KIND for flags in changes.values()):
+            return False
+        self.version = game_map.version
+        return True
+
+    def room_distances(self):
+        """Return the RoomDistances between the rooms of the graph"""
+
+        room_of = {node: room_id for room_id, node in self.room_nodes.items()}
+        # the rooms reached from each room without going through another room
+        adjacency = OrderedDict()
+        for room_id, source in self.room_nodes.items():
+            adjacency[room_id] = neighbors = {}
+            best = {source: 0.0}
+            heap = [(0.0, source)]
+            done = set()
+            while heap:
+                cost, node = heapq.heappop(heap)
+                if node in done:
+                    continue
+                done.add(node)
+                if node != source and node in room_of:
+                    neighbors[room_of[node]] = cost
+                    continue
+                for other, step in self.edges[node].items():
+                    if cost + step < best.get(other, math.inf):
+                        best[other] = cost + step
+                        heapq.heappush(heap, (cost + step, other))
+        return RoomDistances(self, adjacency)
+
+
+def room_node(game_map, room, walkable=None):
+    """Return the center of a room, or its walkable cell closest to the center; None if none is.
+
+    walkable is the walkable mask of the room, when the caller already has it.
+    """
+
+    center = room.center
+    if game_map.get_at(center).walkable:
+        return center
+    if walkable is None:
+        walkable = game_map.walkable_mask(room)
+    cells = np.argwhere(walkable[1:-1, 1:-1]) + (room.x + 1, room.y + 1)
+    if not len(cells):
+        return None
+    closest = np.abs(cells - (center.x, center.y)).sum(axis=1).argmin()
+    return Vector2(*map(int, cells[closest]))
+
+
+def walking_distances(game_map, room_id, diagonal=True):
+    """Return the walking distance from a room to the rooms reached from it, by room ID.
+
+    The distances are measured between the room nodes (see room_node()) with a single search over
+    the cells, like the ones of RoomDistances; the room itself is at distance 0.
+    """
+
+    height = game_map.height
+    source = room_node(game_map, game_map.get_room(room_id))
+    if source is None:
+        return {}
+    costs, _ = get_engine(game_map).dijkstra(source, diagonal)
+    distances = {}
+    for room in game_map.rooms.values():
+        node = room_node(game_map, room)
+        if node is not None and node.x * height + node.y in costs:
+            distances[room.rid] = costs[node.x * height + node.y]
+    return distances
+
+
+class RoomDistances:
+    """Walking distances between the centers of the rooms of a map, computed on a RoomGraph.
+
+    `adjacency` maps each room ID to the rooms reached from it without going through another room,
+    with their distance; the distances between all the pairs of rooms are computed from it at once
+    (Floyd-Warshall, one NumPy pass for each room). Unreachable rooms are at an infinite distance.
+    """
+
+    def __init__(self, graph, adjacency):
+        self.graph = graph
+        self.adjacency = adjacency
+        self.room_ids = list(adjacency)
+        self._index = {room_id: i for i, room_id in enumerate(self.room_ids)}
+
+        size = len(self.room_ids)
+        matrix = np.full((size, size), np.inf)
+        np.fill_diagonal(matrix, 0.0)
+        for room_id, neighbors in adjacency.items():
+            for other, cost in neighbors.items():
+                matrix[self._index[room_id], self._index[other]] = cost
+        for k in range(size):
+            np.minimum(matrix, matrix[:, k, None] + matrix[None, k, :], out=matrix)
+        self.matrix = matrix
+
+    def __contains__(self, room_id):
+        return room_id in self._index
+
+    def distance(self, room_a, room_b):
+        """Return the walking distance between the centers of two rooms, inf if unreachable"""
+
+        return float(self.matrix[self._index[room_a], self._index[room_b]])
+
+    def reachable(self, room_a, room_b):
+        return self.distance(room_a, room_b) != math.inf
+
+    def all_connected(self):
+        """Return True when every room can be reached from every other one"""
+
+        return bool(np.isfinite(self.matrix).all())
+
+
+def get_room_distances(game_map):
+    """Return the RoomDistances of a map, computing them again when the map changed"""
+
+    graph = get_room_graph(game_map)
+    if game_map.room_distances is None or game_map.room_distances.graph is not graph:
+        game_map.room_distances = graph.room_distances()
+    return game_map.room_distances
+
+
+def get_room_graph(game_map, diagonal=True):
+    """Return the RoomGraph of a map, building it again when the map changed"""
+
+    diagonal = bool(diagonal)
+    graph = game_map.room_graphs.get(diagonal)
+    if graph is None or not graph.is_valid(game_map):
+        graph = game_map.room_graphs[diagonal] = RoomGraph(game_map, diagonal)
+    return graph
+
+
+class HierarchicalPathfinder:
+    """Path finding over the RoomGraph of a map, see route()"""
+
+    def __init__(self, game_map, max_goals=16):
+        self._game_map = weakref.ref(game_map)
+        # (goal index, diagonal) -> (graph, {node: walking cost to the goal}), least recently used
+        # first: monsters chasing the same target share the search around it.
+        self._exits = OrderedDict()
+        self.max_goals = max_goals
+        # number of graph nodes expanded by the last route()
+        self.expanded = 0
+
+    def _goal_exits(self, graph, goal, diagonal):
+        key = (goal.x * graph.height + goal.y, diagonal)
+        found = self._exits.get(key)
+        if found is not None and found[0] is graph:
+            self._exits.move_to_end(key)
+            return found[1]
+
+        costs = graph.local_costs(self._game_map(), goal)
+        exits = {node: costs[node] for node in graph.nodes.intersection(costs)}
+        self._exits[key] = (graph, exits)
+        while len(self._exits) > self.max_goals:
+            self._exits.popitem(last=False)
+        return exits
+
+    def route(self, start, goal, diagonal=True):
+        """Return the waypoints from start to goal: the graph nodes to go through, then the goal.
+
+        Walking straight from each waypoint to the next one gives a shortest path. The list is
+        empty when the goal can't be reached, or when start is the goal.
+        """
+
+        game_map = self._game_map()
+        diagonal = bool(diagonal)
+        graph = get_room_graph(game_map, diagonal)
+        height = graph.height
+        if start == goal:
+            return []
+
+        # cells reachable from start without going through a node: the goal itself may be one
+        from_start = graph.local_costs(game_map, start)
+        best = from_start.get(goal.x * height + goal.y, math.inf)
+        room_id = graph.open_room_at(game_map, start)
+        if room_id is not None and room_id == graph.open_room_at(game_map, goal):
+            # in open rooms only the nodes are in from_start
+            best = graph.distance(start, goal)
+        best_node = None
+        exits = self._goal_exits(graph, goal, diagonal)
+
+        def heuristic(node):
+            return graph.distance(graph.position(node), goal)
+
+        g = {}
+        parent = {}
+        heap = []
+        for node in graph.nodes.intersection(from_start):
+            g[node] = from_start[node]
+            parent[node] = None
+            heap.append((g[node] + heuristic(node), node))
+        heapq.heapify(heap)
+
+        closed = set()
+        expanded = 0
+        while heap:
+            f, node = heapq.heappop(heap)
+            if f >= best:
+                break
+            if node in closed:
+                continue
+            closed.add(node)
+            expanded += 1
+
+            cost = g[node]
+            if node in exits and cost + exits[node] < best:
+                best = cost + exits[node]
+                best_node = node
+            for other, step in graph.edges[node].items():
+                new_cost = cost + step
+                if other not in closed and new_cost < g.get(other, math.inf):
+                    g[other] = new_cost
+                    parent[other] = node
+                    heapq.heappush(heap, (new_cost + heuristic(other), other))
+        self.expanded = expanded
+
+        if best == math.inf:
+            return []
+        waypoints = [goal]
+        node = best_node
+        while node is not None:
+            pos = graph.position(node)
+            if pos != start and pos != waypoints[-1]:
+                waypoints.append(pos)
+            node = parent[node]
+        waypoints.reverse()
+        return waypoints
+
+    def next_segment(self, start, goal, diagonal=True):
+        """Return the path from start to the first waypoint toward goal, see route()"""
+
+        waypoints = self.route(start, goal, diagonal)
+        if not waypoints:
+            return []
+        return get_engine(self._game_map()).jump_search(start, waypoints[0], diagonal)
+
+    def path(self, start, goal, diagonal=True):
+        """Return the whole path from start to goal, like astar()"""
+
+        engine = get_engine(self._game_map())
+        path = []
+        for waypoint in self.route(start, goal, diagonal):
+            path.extend(engine.jump_search(path[-1] if path else start, waypoint, diagonal))
+        return path
+
+
+_pathfinders = weakref.WeakKeyDictionary()
+
+
+def get_pathfinder(game_map):
+    """Return the HierarchicalPathfinder of a map, creating it on first use"""
+
+    pathfinder = _pathfinders.get(game_map)
+    if pathfinder is None:
+        pathfinder = _pathfinders[game_map] = HierarchicalPathfinder(game_map)
+    return pathfinder
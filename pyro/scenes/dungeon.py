@@ -4,7 +4,10 @@ import tcod
 import tdl
 from . import Scene
 from ..combat import roll_to_hit, chance_to_hit
+from ..lighting import LightMap, light_sources, apply_light
+from ..perception import Perception
 from ..potions import PotionSystem
+from ..vision import VisionPool
 from ..world import World
 from ..utils import darken_color, clamp, Direction, PopupWindow
 from ..camera import Camera
@@ -79,7 +82,16 @@ class DungeonScene(Scene):
         self.game_map = None
         self.camera = None
         self.fov_map = None
-        self.visited = None
+        # version of the map the FOV map was built from
+        self.fov_version = None
+        # the square of fov_map lit by the last compute_fov()
+        self.fov_square = None
+        # FOV workspaces sharing the transparent cells of fov_map
+        self.vision = None
+        # what the monsters see of the player, updated before they move
+        self.perception = Perception()
+        # the light sources of the level
+        self.light_map = None
         self.enemies_turn = False
         self.player_is_dead = False
         self.info_popup = None
@@ -93,11 +105,14 @@ class DungeonScene(Scene):
 
         # devel options
         self.dungeon_algorithm = None
+        self.chunk_size = None
 
     def setup(self, game):
         """Configure the UI and initialize the game."""
 
         self.DEBUG = game.DEBUG
+        self.dungeon_algorithm = game.dungeon_algorithm
+        self.chunk_size = game.chunk_size
 
         self.game_width = game.game_width
         self.game_height = game.game_height
@@ -155,7 +170,11 @@ class DungeonScene(Scene):
         # Initialize world and current dungeon
         self.world = World()
         self.world.create_map(
-            self.game_width, self.game_height, level=1, dungeon_algorithm=self.dungeon_algorithm
+            self.game_width,
+            self.game_height,
+            level=1,
+            dungeon_algorithm=self.dungeon_algorithm,
+            chunk_size=self.chunk_size,
         )
         cur_map = self.world.get_current_map()
 
@@ -168,7 +187,10 @@ class DungeonScene(Scene):
         # setup player
         self.player = self.world.entity_manager.create_entity("player")
         cur_map.move_entity(self.player, cur_map.start_vec)
-        self.fov_map.compute_fov(cur_map.start_vec.x, cur_map.start_vec.y, radius=6)
+        self.compute_fov(cur_map.start_vec.x, cur_map.start_vec.y)
+
+        # setup lights: the static ones won't be computed again
+        self.update_lights()
 
         # setup visited cells
         self.init_visited()
@@ -176,38 +198,94 @@ class DungeonScene(Scene):
     def init_fov(self, cur_map):
         """Initialize the Field of View handler.
 
-        During initialization each dungeon map cell is visited and the FOV map is updated to record
-        wether the cell is walkable and transparent.
+        The FOV map is built from the walkable cells of the dungeon map, then the cells holding
+        a closed door, found in the door index of the map, are made opaque.
 
         NOTE: fov requires [y,x] addressing!
         """
 
         fov_map = tcod.map.Map(width=self.game_width, height=self.game_height)
-        for y in range(self.game_height):
-            for x in range(self.game_width):
-                cell = cur_map.get_at(x, y)
-                if cell.walkable:
-                    fov_map.walkable[y, x] = True
-                    fov_map.transparent[y, x] = True
-                # doors will block sight
-                for entity_id in cell.entities:
-                    entity = self.world.entity_manager.get_entity(entity_id)
-                    if entity.has_component("door"):
-                        dc = entity.get_component("door")
-                        if dc.is_open:
-                            fov_map.transparent[y, x] = True
-                        else:
-                            fov_map.transparent[y, x] = False
+        # on a chunked map only the allocated chunks can hold walkable cells
+        for region in cur_map.iter_regions():
+            area = (slice(region.y, region.endY), slice(region.x, region.endX))
+            walkable = cur_map.walkable_mask(region).T
+            fov_map.walkable[area] = walkable
+            fov_map.transparent[area] = walkable
+
+        # doors will block sight
+        xs, ys = cur_map.closed_doors()
+        fov_map.transparent[ys, xs] = False
         self.fov_map = fov_map
+        self.fov_version = cur_map.version
+        self.fov_square = None
+        self.vision = VisionPool(fov_map.transparent)
+        self.light_map = LightMap(cur_map, self.vision)
+
+    def sync_fov(self, cur_map):
+        """Bring the FOV map up to date, applying only the cells changed since it was built.
+
+        Return True when a cell of the FOV map changed.
+        """
+
+        if self.fov_version == cur_map.version:
+            return False
+
+        changes = cur_map.journal.changes_since(self.fov_version)
+        if changes is None:
+            # the new light map is empty until its sources are added back
+            self.init_fov(cur_map)
+            self.light_map.update(light_sources(cur_map, self.world.entity_manager))
+            return True
+
+        changed = False
+        for x, y in changes:
+            walkable = cur_map.get_at(x, y).walkable
+            transparent = walkable
+            door = cur_map.door_at(x, y)
+            if door is not None:
+                transparent = door.is_open
+            # most changes are entity moves, which leave the cell as it was
+            if (
+                self.fov_map.walkable[y, x] != walkable
+                or self.fov_map.transparent[y, x] != transparent
+            ):
+                self.fov_map.walkable[y, x] = walkable
+                self.fov_map.transparent[y, x] = transparent
+                self.light_map.invalidate(x, y)
+                changed = True
+        self.fov_version = cur_map.version
+        if changed:
+            self.vision.changed()
+        return changed
+
+    def update_lights(self):
+        """Bring the light map up to date: only the moved sources, or those whose area changed"""
+
+        cur_map = self.world.get_current_map()
+        self.sync_fov(cur_map)
+        self.light_map.update(light_sources(cur_map, self.world.entity_manager))
+
+    def compute_fov(self, x, y):
+        """Compute the player FOV from x, y, or take it from the FOV cache of vision"""
+
+        if self.fov_square is not None:
+            self.fov_map.fov[self.fov_square] = False
+        self.fov_square = self.vision.compute_map_fov(
+            self.fov_map, x, y, self.fov_radius, algorithm=tcod.FOV_DIAMOND
+        )
+
+        # remember the cells seen: the FOV is [y, x], visited [x, y]
+        visited = self.world.get_current_map().visited
+        ys, xs = self.fov_square
+        visited[xs, ys] = visited[xs, ys] | self.fov_map.fov[self.fov_square].T
 
     def init_visited(self):
-        """Initialize the visited cells map.
+        """Initialize the visited cells of a new level (see GameMap.visited).
 
         Initially the starting room is the only room already entirely marked as visited.
         """
 
         cur_map = self.world.get_current_map()
-        self.visited = [[False for y in range(self.game_height)] for x in range(self.game_width)]
 
         # the starting room is always entirely visited.
         start_cell = cur_map.get_at(cur_map.start_vec.x, cur_map.start_vec.y)
@@ -217,9 +295,7 @@ class DungeonScene(Scene):
         start_room = cur_map.get_room(start_cell.room_id)
         logger.debug("Start room: %r", start_room)
 
-        for y in range(start_room.y, start_room.y + start_room.height):
-            for x in range(start_room.x, start_room.x + start_room.width):
-                self.visited[x][y] = True
+        cur_map.visited[start_room.x : start_room.endX, start_room.y : start_room.endY] = True
 
     def render_all(self, game):
         """Render the game UI and elements."""
@@ -237,24 +313,29 @@ class DungeonScene(Scene):
         self.panel.draw_str(0, 0, "You, the rogue.")
         self.panel.draw_str(0, 1, "Player position: %d/%d" % (player_pos.x, player_pos.y))
 
-        for y in range(self.game_height):
-            for x in range(self.game_width):
+        # only visit the cells in the camera view
+        min_x = max(self.camera.x, 0)
+        max_x = min(self.camera.x + game.screen_width + 1, self.game_width)
+        min_y = max(self.camera.y, 0)
+        max_y = min(self.camera.y + game.screen_height + 1, self.game_height)
+        visible = self.fov_map.fov[min_y:max_y, min_x:max_x].T
+        visited = game_map.visited[min_x:max_x, min_y:max_y]
+        light = self.light_map.colors(min_x, min_y, max_x, max_y)
+        is_lit = light.any(axis=2)
+        for y in range(min_y, max_y):
+            for x in range(min_x, max_x):
                 # from camera coordinates to game world coordinates
                 xx = x - self.camera.x
                 yy = y - self.camera.y
 
-                # skip rendering of cells out of the camera view
-                if xx < 0 or xx > game.screen_width or yy < 0 or yy > game.screen_height:
-                    continue
-
                 if self.is_looking and x == self.eye_position.x and y == self.eye_position.y:
                     bg_color = (194, 194, 194)
                 else:
                     bg_color = DARK_BACKGROUND
 
                 # do not print if not on FOV
-                is_visible = self.is_visible(x, y)
-                is_visited = self.is_visited(x, y)
+                is_visible = visible[x - min_x, y - min_y]
+                is_visited = visited[x - min_x, y - min_y]
                 has_fog_of_war = not is_visible and is_visited
 
                 if not is_visible and not is_visited:
@@ -262,9 +343,6 @@ class DungeonScene(Scene):
                         self.console.draw_char(xx, yy, " ", bg=bg_color, fg=(0, 0, 0))
                     if not self.DEBUG:
                         continue
-                elif is_visible and not is_visited:
-                    # mark visible cells as visited
-                    self.visited[x][y] = True
 
                 cell = game_map.get_at(x, y)
                 if cell.kind == WALL:
@@ -295,6 +373,9 @@ class DungeonScene(Scene):
                         else:
                             color = feature["color"]
 
+                if is_visible and is_lit[x - min_x, y - min_y]:
+                    color = apply_light(color, light[x - min_x, y - min_y])
+
                 if (
                     cell.kind == WALL
                     and self.is_looking
@@ -415,6 +496,7 @@ class DungeonScene(Scene):
                 dc = entity.get_component("door")
                 if not dc.is_open:
                     # currently we don't distinguish between opened and closed doors.
+                    # opening the door records the change in the map journal, see DoorComponent.
                     dc.open()
                 # returning True here means that the player will pass, but this is not OK
                 # when there could be more entities in the same cell (e.g. a monster).
@@ -471,7 +553,14 @@ class DungeonScene(Scene):
     def move_enemies(self):
         self.do_render = True
         em = self.world.entity_manager
-        for entity_id, ai_cc in em.components["monster_ai"].items():
+        monsters = em.components["monster_ai"]
+        # a single FOV from the player, as far as the most far-sighted monster can see
+        self.update_lights()
+        position = self.player.position
+        radius = max((ai_cc.radius for ai_cc in monsters.values()), default=0)
+        light = self.light_map.intensity[position.x, position.y]
+        self.perception.update(self.vision, position, radius, light)
+        for entity_id, ai_cc in monsters.items():
             entity = em.get_entity(entity_id)
             ai_cc.update(entity, self)
 
@@ -483,10 +572,8 @@ class DungeonScene(Scene):
         if can:
             game_map = self.world.get_current_map()
             game_map.move_entity(self.player, dest_vec)
-            self.fov_map.compute_fov(
-                dest_vec.x, dest_vec.y, radius=self.fov_radius, algorithm=tcod.FOV_DIAMOND
-            )
-            self.visited[dest_vec.x][dest_vec.y] = True
+            self.sync_fov(game_map)
+            self.compute_fov(dest_vec.x, dest_vec.y)
             self.enemies_turn = True
 
     def move_eye(self, direction):
@@ -505,17 +592,17 @@ class DungeonScene(Scene):
         return self.fov_map.fov[y, x]
 
     def is_visited(self, x, y):
-        return self.visited[x][y]
+        return self.world.get_current_map().visited[x, y]
 
     def update(self, game):
         position = self.player.get_position()
 
         if self.enemies_turn:
             self.move_enemies()
-            # re-calculate the FOV after the enemies were moved
-            self.fov_map.compute_fov(
-                position.x, position.y, radius=self.fov_radius, algorithm=tcod.FOV_DIAMOND
-            )
+            # the monsters don't use the FOV map: re-calculate the FOV only if they changed the
+            # map, e.g. opening a door
+            if self.sync_fov(self.world.get_current_map()):
+                self.compute_fov(position.x, position.y)
 
         if self.do_render:
             self.render_all(game)
@@ -566,12 +653,12 @@ class DungeonScene(Scene):
             entity = em.get_entity(entity_id)
             if entity.is_potion():
                 ic.take_item(entity)
-                to_remove.append(entity.eid)
+                to_remove.append(entity)
                 name = self.potion_system.get_name_for_potion(entity)
                 self.post_message("You took a %s potion" % name)
 
         if not to_remove:
             return
-        for entity_id in to_remove:
-            cell.entities.remove(entity_id)
+        for entity in to_remove:
+            cur_map.remove_entity(entity)
         self.enemies_turn = True
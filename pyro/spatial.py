@@ -0,0 +1,126 @@
+"""
+Spatial index of the entities placed on a map.
+
+Entities are stored both by exact cell, for O(1) lookups, and in a coarse grid of square buckets,
+so that rectangle and radius queries only inspect the buckets overlapping the queried area.
+"""
+
+
+# returned by SpatialIndex.at() for cells without entities
+EMPTY_CELL = frozenset()
+
+
+class SpatialIndex:
+    def __init__(self, bucket_size=8):
+        self.bucket_size = bucket_size
+        # (x, y) -> set of entity IDs
+        self._cells = {}
+        # (bucket x, bucket y) -> set of entity IDs
+        self._buckets = {}
+        # entity ID -> (x, y)
+        self._positions = {}
+
+    def __len__(self):
+        return len(self._positions)
+
+    def __contains__(self, eid):
+        return eid in self._positions
+
+    def _bucket_key(self, x, y):
+        return (x // self.bucket_size, y // self.bucket_size)
+
+    def add(self, eid, x, y):
+        """Place an entity at x, y, moving it if it was already indexed"""
+
+        old_pos = self._positions.get(eid)
+        if old_pos is not None:
+            if old_pos == (x, y):
+                return
+            self.remove(eid)
+
+        self._positions[eid] = (x, y)
+        self._cells.setdefault((x, y), set()).add(eid)
+        self._buckets.setdefault(self._bucket_key(x, y), set()).add(eid)
+
+    def remove(self, eid):
+        """Remove an entity from the index; raises KeyError if the entity is not indexed"""
+
+        x, y = self._positions.pop(eid)
+        cell = self._cells[(x, y)]
+        cell.remove(eid)
+        if not cell:
+            del self._cells[(x, y)]
+
+        bucket_key = self._bucket_key(x, y)
+        bucket = self._buckets[bucket_key]
+        bucket.remove(eid)
+        if not bucket:
+            del self._buckets[bucket_key]
+
+    def discard(self, eid):
+        if eid in self._positions:
+            self.remove(eid)
+
+    def position(self, eid):
+        return self._positions.get(eid)
+
+    def at(self, x, y):
+        """Return the set of entity IDs at x, y"""
+
+        return self._cells.get((x, y), EMPTY_CELL)
+
+    def items(self):
+        """Iterate over ((x, y), entity IDs) for each occupied cell"""
+
+        return self._cells.items()
+
+    def _query(self, min_x, min_y, max_x, max_y, accept, only):
+        result = []
+        if not self._positions:
+            return result
+
+        bmin_x, bmin_y = self._bucket_key(min_x, min_y)
+        bmax_x, bmax_y = self._bucket_key(max_x, max_y)
+        if (bmax_x - bmin_x + 1) * (bmax_y - bmin_y + 1) > len(self._buckets):
+            # the area is larger than the populated part of the map: walk the buckets instead
+            buckets = [
+                bucket
+                for (bx, by), bucket in self._buckets.items()
+                if bmin_x <= bx <= bmax_x and bmin_y <= by <= bmax_y
+            ]
+        else:
+            buckets = []
+            for bx in range(bmin_x, bmax_x + 1):
+                for by in range(bmin_y, bmax_y + 1):
+                    bucket = self._buckets.get((bx, by))
+                    if bucket is not None:
+                        buckets.append(bucket)
+
+        positions = self._positions
+        for bucket in buckets:
+            for eid in bucket:
+                if only is not None and eid not in only:
+                    continue
+                x, y = positions[eid]
+                if min_x <= x <= max_x and min_y <= y <= max_y and accept(x, y):
+                    result.append(eid)
+        return result
+
+    def in_rect(self, x, y, width, height, only=None):
+        """Return the IDs of the entities inside a rectangle.
+
+        `only` is an optional container of entity IDs used as a filter, for example
+        `entity_manager.components["monster_ai"]`.
+        """
+
+        return self._query(x, y, x + width - 1, y + height - 1, lambda x, y: True, only)
+
+    def in_radius(self, x, y, radius, only=None):
+        """Return the IDs of the entities within `radius` cells from x, y"""
+
+        radius_squared = radius * radius
+
+        def accept(ex, ey):
+            return (ex - x) ** 2 + (ey - y) ** 2 <= radius_squared
+
+        return self._query(x - radius, y - radius, x + radius, y + radius, accept, only)
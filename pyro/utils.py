@@ -19,6 +19,7 @@ class TcodRandom:
 
     def init(self, seed):
         self.seed = seed
+        self._rng = None
 
     @property
     def rng(self):
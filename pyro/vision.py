@@ -0,0 +1,155 @@
+"""
+FOV workspaces for the observers other than the player.
+
+The player's FOV lives on the scene's tcod map, which is also the single copy of the transparent
+cells. Other observers (the monsters' Perception) check a FovWorkspace out of the VisionPool of the
+scene, compute their FOV in it and return it: a workspace copies only the square around the
+observer from the shared transparency array and writes to its own result buffer, so the player's
+visible cells stay as they are while the AI runs, and each thread can own a workspace.
+
+The FOVs computed through the pool, the player's included, are kept in a FovCache until the scene
+reports a change of the transparent cells with changed().
+"""
+import threading
+from contextlib import contextmanager
+import tcod
+from .fov import SYMMETRIC_SHADOWCAST, symmetric_shadowcast
+from .fovcache import FovCache
+
+
+class FovWorkspace:
+    """A FOV computed on the square around an origin, in a tcod map of its own"""
+
+    def __init__(self, pool):
+        self.pool = pool
+        self._map = None
+        self._fov = None
+        self.origin = None
+        self.radius = 0
+        # position of the square on the game map
+        self.left = 0
+        self.top = 0
+
+    def compute(self, x, y, radius, algorithm=tcod.FOV_DIAMOND):
+        """Compute the FOV from x, y up to radius; return it, see `fov`.
+
+        algorithm is a tcod FOV algorithm, or pyro.fov.SYMMETRIC_SHADOWCAST.
+        """
+
+        pool = self.pool
+        self.origin = (x, y)
+        self.radius = radius
+        (top, bottom), (left, right) = pool.window(x, y, radius)
+        self.left, self.top = left, top
+
+        key = (x, y, radius, algorithm, pool.version)
+        fov = pool.cache_get(key)
+        if fov is not None:
+            self._fov = fov
+            return fov
+
+        if algorithm == SYMMETRIC_SHADOWCAST:
+            window = pool.transparent[top:bottom, left:right]
+            self._fov = symmetric_shadowcast(window.T, x - left, y - top, radius).T
+            pool.cache_put(key, self._fov)
+            return self._fov
+
+        # the tcod map is kept as long as the square has the same size
+        if self._map is None or self._map.width != right - left or self._map.height != bottom - top:
+            self._map = tcod.map.Map(width=right - left, height=bottom - top)
+        self._map.transparent[:] = pool.transparent[top:bottom, left:right]
+        self._map.compute_fov(x - left, y - top, radius=radius, algorithm=algorithm)
+        self._fov = self._map.fov
+        pool.cache_put(key, self._fov)
+        return self._fov
+
+    @property
+    def fov(self):
+        """The lit cells of the square, indexed by [y, x] relative to left and top"""
+
+        return self._fov
+
+    def is_visible(self, x, y):
+        x, y = x - self.left, y - self.top
+        fov = self._fov
+        return 0 <= y < fov.shape[0] and 0 <= x < fov.shape[1] and bool(fov[y, x])
+
+
+class VisionPool:
+    """The FovWorkspaces sharing a transparency array.
+
+    transparent is indexed by [y, x], like the arrays of a tcod map; it's usually the `transparent`
+    array of the player's FOV map, kept up to date by the scene.
+    """
+
+    def __init__(self, transparent, max_cached=256):
+        self.transparent = transparent
+        self._free = []
+        self._lock = threading.Lock()
+        self.created = 0
+        # incremented by every change of transparent
+        self.version = 0
+        self.cache = FovCache(max_cached)
+
+    def changed(self):
+        """To be called when cells of transparent changed: drop the cached FOVs"""
+
+        with self._lock:
+            self.version += 1
+            self.cache.clear()
+
+    def window(self, x, y, radius):
+        """Return the (start, stop) rows and columns of the square of radius around x, y"""
+
+        height, width = self.transparent.shape
+        return (
+            (max(y - radius, 0), min(y + radius + 1, height)),
+            (max(x - radius, 0), min(x + radius + 1, width)),
+        )
+
+    def cache_get(self, key):
+        with self._lock:
+            return self.cache.get(key)
+
+    def cache_put(self, key, fov):
+        with self._lock:
+            self.cache.put(key, fov)
+
+    def compute_map_fov(self, fov_map, x, y, radius, algorithm=tcod.FOV_DIAMOND):
+        """Compute the FOV from x, y on fov_map, the tcod map transparent belongs to.
+
+        When the FOV is cached only the square around x, y is written, the caller clears the square
+        of the previous call: return it as a pair of slices, [y, x].
+        """
+
+        (top, bottom), (left, right) = self.window(x, y, radius)
+        square = (slice(top, bottom), slice(left, right))
+        key = (x, y, radius, algorithm, self.version)
+        fov = self.cache_get(key)
+        if fov is None:
+            fov_map.compute_fov(x, y, radius=radius, algorithm=algorithm)
+            self.cache_put(key, fov_map.fov[square])
+        else:
+            fov_map.fov[square] = fov
+        return square
+
+    def checkout(self):
+        with self._lock:
+            if self._free:
+                return self._free.pop()
+            self.created += 1
+        return FovWorkspace(self)
+
+    def release(self, workspace):
+        with self._lock:
+            self._free.append(workspace)
+
+    @contextmanager
+    def workspace(self):
+        """Check a workspace out for the duration of a with block"""
+
+        workspace = self.checkout()
+        try:
+            yield workspace
+        finally:
+            self.release(workspace)
@@ -1,36 +1,203 @@
+import os
+import json
+import shutil
+import tempfile
 from .diggers.bsp import BspGameMap
 from .diggers.tunnel import TunnelingGameMap
 from .entities import EntityManager
+from .levelfile import save_level, load_level
+from .utils import Vector2
+
+
+# name of the file describing a world saved with World.save()
+WORLD_FILE = "world.json"
 
 
 class World:
-    def __init__(self):
+    """The game world: all the dungeon levels and the entities living in them.
+
+    Only the current level and the `resident_levels` most recently used ones are kept in memory;
+    older levels are spilled to a level file, their entities are detached from the EntityManager
+    and `self.maps` holds None in their place until they are needed again (see get_map()).
+    """
+
+    def __init__(self, resident_levels=3, spill_directory=None):
         self.maps = []
         self.current_map = 0
         self.entity_manager = EntityManager()
 
-    def create_map(self, width, height, level=1, dungeon_algorithm=None):
+        self.resident_levels = resident_levels
+        self.spill_directory = spill_directory
+        self._spill_tempdir = None
+        self._spill_count = 0
+        # map index -> path of the level file holding a spilled level
+        self.spilled = {}
+        # map index -> path of the level file a reloaded level was read from: its arrays can be
+        # mapped on the file, which is removed only when the level is spilled again
+        self._loaded = {}
+        # level files that couldn't be removed yet (a mapped file can't be removed on Windows)
+        self._stale = []
+        # map indexes, least recently used first
+        self._recent = []
+
+    def create_map(self, width, height, level=1, dungeon_algorithm=None, chunk_size=None):
+        """Generate a new level; with a `chunk_size` the map is chunked (see GameMap)"""
+
         if dungeon_algorithm in (None, "bsp"):
             MapClass = BspGameMap
         else:
             MapClass = TunnelingGameMap
 
-        game_map = MapClass(width, height)
+        game_map = MapClass(width, height, chunk_size=chunk_size)
+        game_map.level = level
         game_map.generate(level, self.entity_manager)
         game_map.describe()
 
         self.maps.append(game_map)
+        self._touch(len(self.maps) - 1)
 
     def get_current_map(self):
-        return self.maps[self.current_map]
+        game_map = self.maps[self.current_map]
+        if game_map is None:
+            game_map = self.get_map(self.current_map)
+        return game_map
+
+    def set_current_map(self, index):
+        game_map = self.get_map(index)
+        self.current_map = index
+        return game_map
+
+    def get_map(self, index):
+        """Return a map, loading it back into memory if it was spilled to disk"""
+
+        if self.maps[index] is None:
+            path = self.spilled.pop(index)
+            self.maps[index] = self._read_level(path)
+            self._loaded[index] = path
+        self._touch(index)
+        return self.maps[index]
+
+    def is_resident(self, index):
+        return self.maps[index] is not None
+
+    def _touch(self, index):
+        """Mark a map as the most recently used and spill the ones exceeding resident_levels"""
+
+        if index in self._recent:
+            self._recent.remove(index)
+        self._recent.append(index)
+
+        hot = [i for i in self._recent if self.maps[i] is not None and i != self.current_map]
+        while len(hot) > self.resident_levels and hot[0] != index:
+            self._spill(hot.pop(0))
+
+    def _spill(self, index):
+        """Save a map to disk, then drop it and its entities from memory"""
+
+        directory = self.spill_directory
+        if directory is None:
+            if self._spill_tempdir is None:
+                self._spill_tempdir = tempfile.TemporaryDirectory(prefix="pyro-")
+            directory = self._spill_tempdir.name
+
+        # always use a new file: the old one could still back the arrays of a reloaded map
+        self._spill_count += 1
+        path = os.path.join(directory, "spill-%03d-%d.pyrolvl" % (index, self._spill_count))
+        game_map = self.maps[index]
+        save_level(path, game_map, self.entity_manager)
+
+        for _, eids in list(game_map.entity_index.items()):
+            for eid in list(eids):
+                self.entity_manager.destroy_entity(eid)
+        self.maps[index] = None
+        self.spilled[index] = path
+
+        # the file the map was read from, if any, isn't needed anymore
+        stale = self._stale
+        if index in self._loaded:
+            stale.append(self._loaded.pop(index))
+        self._stale = []
+        for path in stale:
+            try:
+                os.remove(path)
+            except OSError:
+                # the file is still mapped: try again at the next spill
+                self._stale.append(path)
 
     def destroy_entity(self, eid):
         cur_map = self.get_current_map()
         entity = self.entity_manager.get_entity(eid)
-        cell = cur_map.get_at(entity.get_position())
-        if eid not in cell.entities:
-            print("Entity %r not in cell %r" % (entity, cell))
+        if eid not in cur_map.entity_index:
+            print("Entity %r not in map %r" % (entity, cur_map))
         else:
-            cell.remove_entity(entity)
+            cur_map.remove_entity(entity)
 
         self.entity_manager.destroy_entity(eid)
+
+    def _read_level(self, path):
+        """Read a level file, re-creating its entities"""
+
+        game_map, states = load_level(path)
+        for state in states:
+            entity = self.entity_manager.restore_entity(state)
+            game_map.move_entity(entity, Vector2(state["x"], state["y"]))
+        return game_map
+
+    def save_level(self, index, path):
+        """Save a level, with the entities placed on it, to a level file"""
+
+        if self.maps[index] is None:
+            shutil.copyfile(self.spilled[index], path)
+        else:
+            save_level(path, self.maps[index], self.entity_manager)
+
+    def load_level(self, path):
+        """Load a level file as a new map, re-creating its entities; return the map index"""
+
+        self.maps.append(self._read_level(path))
+        index = len(self.maps) - 1
+        self._touch(index)
+        return index
+
+    def save(self, directory):
+        """Checkpoint the whole world into a directory.
+
+        Each level is saved in its own level file; the entities which are not placed on any level
+        (e.g. the items in the player inventory) are saved in the world file.
+        """
+
+        os.makedirs(directory, exist_ok=True)
+        levels = []
+        placed = set()
+        for index, game_map in enumerate(self.maps):
+            filename = "level-%03d.pyrolvl" % index
+            self.save_level(index, os.path.join(directory, filename))
+            levels.append(filename)
+            if game_map is not None:
+                placed.update(eid for _, eids in game_map.entity_index.items() for eid in eids)
+
+        em = self.entity_manager
+        world = {
+            "current_map": self.current_map,
+            "next_eid": em._eid,
+            "levels": levels,
+            "entities": [e.get_state() for eid, e in em.entities.items() if eid not in placed],
+        }
+        with open(os.path.join(directory, WORLD_FILE), "w") as fd:
+            json.dump(world, fd)
+
+    @classmethod
+    def load(cls, directory, **kwargs):
+        """Load a world saved with World.save()"""
+
+        with open(os.path.join(directory, WORLD_FILE)) as fd:
+            data = json.load(fd)
+
+        world = cls(**kwargs)
+        world.current_map = data["current_map"]
+        for filename in data["levels"]:
+            world.load_level(os.path.join(directory, filename))
+        for state in data["entities"]:
+            world.entity_manager.restore_entity(state)
+        world.entity_manager._eid = max(world.entity_manager._eid, data["next_eid"])
+        return world
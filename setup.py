@@ -19,6 +19,7 @@ setup(
     entry_points={
         'console_scripts': [
             'pyro = pyro.main:main',
+            'pyro-mapgen = pyro.mapgen:main',
             'char-finder = pyro.char_finder:char_finder',
         ]
     }
@@ -0,0 +1,122 @@
+"""
+Options of the benchmark suite, see test_benchmarks.py:
+
+    pytest --bench                              run the benchmarks too
+    pytest --bench --bench-json bench.json      write the results to bench.json
+    pytest --bench --bench-baseline bench.json  fail the benchmarks slower than in bench.json
+"""
+import json
+import platform
+import time
+from collections import OrderedDict
+import pytest
+
+
+def pytest_addoption(parser):
+    group = parser.getgroup("benchmarks")
+    group.addoption("--bench", action="store_true", help="run the benchmarks")
+    group.addoption("--bench-json", metavar="PATH", help="write the benchmark results to PATH")
+    group.addoption(
+        "--bench-baseline",
+        metavar="PATH",
+        help="fail the benchmarks slower than in PATH, written by --bench-json",
+    )
+    group.addoption(
+        "--bench-threshold",
+        type=float,
+        default=0.25,
+        help="slowdown allowed against the baseline (default: 0.25, i.e. 25%%)",
+    )
+
+
+def pytest_configure(config):
+    config.addinivalue_line("markers", "bench: a benchmark, run only with --bench")
+    config.bench_results = OrderedDict()
+    config.bench_baseline = {}
+    path = config.getoption("--bench-baseline")
+    if path:
+        with open(path) as f:
+            config.bench_baseline = json.load(f)["benchmarks"]
+
+
+def pytest_collection_modifyitems(config, items):
+    if config.getoption("--bench"):
+        return
+    skip = pytest.mark.skip(reason="benchmark, use --bench to run it")
+    for item in items:
+        if "bench" in item.keywords:
+            item.add_marker(skip)
+
+
+@pytest.fixture
+def bench(request):
+    """Time a function: bench(func, rounds=5, number=1) returns the result of its last call.
+
+    The result of a benchmark is the time taken by a single call of func, for the fastest round;
+    each round calls func `number` times.
+    """
+
+    config = request.config
+
+    def run(func, rounds=5, number=1):
+        times = []
+        for _ in range(rounds):
+            start = time.perf_counter()
+            for _ in range(number):
+                result = func()
+            times.append((time.perf_counter() - start) / number)
+
+        name = request.node.name
+        config.bench_results[name] = OrderedDict(
+            [("min", min(times)), ("mean", sum(times) / rounds), ("rounds", rounds)]
+        )
+
+        baseline = config.bench_baseline.get(name)
+        if baseline is not None:
+            threshold = config.getoption("--bench-threshold")
+            limit = baseline["min"] * (1 + threshold)
+            assert (
+                min(times) <= limit
+            ), "%s took %.6fs, %.6fs in the baseline (%d%% slowdown allowed)" % (
+                name,
+                min(times),
+                baseline["min"],
+                threshold * 100,
+            )
+        return result
+
+    return run
+
+
+def pytest_terminal_summary(terminalreporter, config):
+    results = config.bench_results
+    if not results:
+        return
+
+    terminalreporter.section("benchmarks")
+    baseline = config.bench_baseline
+    for name, result in results.items():
+        line = "%-50s %12.6fs" % (name, result["min"])
+        if name in baseline:
+            line += " %+7.1f%%" % ((result["min"] / baseline[name]["min"] - 1) * 100)
+        terminalreporter.write_line(line)
+
+
+def pytest_sessionfinish(session):
+    config = session.config
+    path = config.getoption("--bench-json")
+    if not path or not config.bench_results:
+        return
+
+    with open(path, "w") as f:
+        json.dump(
+            OrderedDict(
+                [
+                    ("python", platform.python_version()),
+                    ("platform", platform.platform()),
+                    ("benchmarks", config.bench_results),
+                ]
+            ),
+            f,
+            indent=2,
+        )
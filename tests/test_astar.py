@@ -0,0 +1,125 @@
+import gc
+import heapq
+import math
+import unittest
+import numpy as np
+from pyro.astar import astar, get_engine, _engines
+from pyro.gamemap import GameMap
+from pyro.utils import Rect, Vector2, Direction
+from pyro import ROOM, WALL
+
+
+def dijkstra(game_map, start, goal, diagonal, costs=None):
+    """Reference path cost, computed on GameCell's"""
+
+    directions = Direction.all() if diagonal else Direction.cardinal()
+    best = {(start.x, start.y): 0.0}
+    heap = [(0.0, start.x, start.y)]
+    while heap:
+        cost, x, y = heapq.heappop(heap)
+        if (x, y) == (goal.x, goal.y):
+            return cost
+        for d in directions:
+            cell = game_map.get_at(x + d.x, y + d.y)
+            if cell is None or not cell.walkable:
+                continue
+            step = math.sqrt(2) if d.x and d.y else 1.0
+            if costs is not None:
+                step *= costs[cell.x, cell.y]
+            if cost + step < best.get((cell.x, cell.y), math.inf):
+                best[(cell.x, cell.y)] = cost + step
+                heapq.heappush(heap, (cost + step, cell.x, cell.y))
+    return None
+
+
+def path_cost(start, path, costs=None):
+    total = 0.0
+    for a, b in zip([start] + path, path):
+        assert max(abs(a.x - b.x), abs(a.y - b.y)) == 1
+        step = math.sqrt(2) if a.x != b.x and a.y != b.y else 1.0
+        total += step * (1 if costs is None else costs[b.x, b.y])
+    return total
+
+
+class AStarTest(unittest.TestCase):
+    def setUp(self):
+        self.game_map = GameMap(30, 20)
+        self.game_map.fill_rect(Rect(1, 1, 28, 18), ROOM)
+        # a wall with a gap at the bottom
+        self.game_map.fill_rect(Rect(14, 1, 1, 15), WALL)
+        self.start = Vector2(3, 3)
+        self.goal = Vector2(25, 4)
+
+    def check(self, diagonal, costs=None, jps=False):
+        path = astar(self.game_map, self.start, self.goal, diagonal, costs=costs, jps=jps)
+        assert path[-1] == self.goal
+        expected = dijkstra(self.game_map, self.start, self.goal, diagonal, costs)
+        assert math.isclose(path_cost(self.start, path, costs), expected)
+        for pos in path:
+            assert self.game_map.get_at(pos).walkable
+        return path
+
+    def test_optimal_paths(self):
+        self.check(diagonal=True)
+        path = self.check(diagonal=False)
+        # down to the gap in the wall, then up to the goal
+        assert len(path) == (11 + 13) + (11 + 12)
+
+    def test_costs(self):
+        costs = np.ones((30, 20))
+        costs[10:20, 10:20] = 5
+        self.check(diagonal=True, costs=costs)
+
+    def test_unreachable(self):
+        self.game_map.set_kind(14, 16, WALL)
+        self.game_map.set_kind(14, 17, WALL)
+        self.game_map.set_kind(14, 18, WALL)
+        assert astar(self.game_map, self.start, self.goal) == []
+        # the engine follows the map changes
+        self.game_map.set_kind(14, 10, ROOM)
+        self.check(diagonal=True)
+
+    def test_max_nodes(self):
+        assert astar(self.game_map, self.start, self.goal, max_nodes=20) == []
+        assert get_engine(self.game_map).expanded == 20
+        assert astar(self.game_map, self.start, self.goal, max_nodes=1000)
+
+    def test_start_is_goal(self):
+        assert astar(self.game_map, self.start, self.start) == []
+
+    def test_jump_point_search(self):
+        for diagonal in (True, False):
+            self.check(diagonal, jps=True)
+
+        # a maze of pillars, all the cells are jump points
+        for x in range(2, 28, 2):
+            for y in range(2, 19, 2):
+                self.game_map.set_kind(x, y, WALL)
+        for diagonal in (True, False):
+            self.check(diagonal, jps=True)
+
+    def test_jump_point_search_expansions(self):
+        game_map = GameMap(50, 50)
+        game_map.fill_rect(Rect(1, 1, 48, 48), ROOM)
+        start, goal = Vector2(2, 3), Vector2(45, 40)
+        engine = get_engine(game_map)
+        for diagonal in (True, False):
+            path = astar(game_map, start, goal, diagonal)
+            nodes = engine.expanded
+            jps_path = astar(game_map, start, goal, diagonal, jps=True)
+            assert math.isclose(path_cost(start, jps_path), path_cost(start, path))
+            assert engine.expanded * 10 < nodes
+
+    def test_jump_point_search_costs(self):
+        costs = np.ones((30, 20))
+        costs[10:20, 10:20] = 5
+        # falls back to A*
+        self.check(diagonal=True, costs=costs, jps=True)
+
+    def test_engine_does_not_keep_the_map(self):
+        game_map = GameMap(10, 10)
+        astar(game_map, Vector2(1, 1), Vector2(2, 2))
+        count = len(_engines)
+        del game_map
+        gc.collect()
+        assert len(_engines) == count - 1
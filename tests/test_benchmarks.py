@@ -0,0 +1,165 @@
+"""
+Micro benchmarks of path finding, FOV and the monster turns on maps generated with fixed seeds.
+
+They run only with `pytest --bench`, see conftest.py for the other options.
+"""
+import functools
+import random
+import numpy as np
+import pytest
+import tcod
+from pyro.astar import astar
+from pyro.fov import Fov
+from pyro.gamedata import gamedata
+from pyro.perception import Perception
+from pyro.utils import Vector2, tcod_random
+from pyro.vision import VisionPool
+from pyro.world import World
+
+
+pytestmark = pytest.mark.bench
+
+SEED = 1
+MAPS = [
+    (algorithm, width, height)
+    for algorithm in ("bsp", "tunneling")
+    for width, height in ((80, 60), (250, 250), (1000, 1000))
+]
+
+
+def generate(algorithm, width, height):
+    gamedata.load()
+    random.seed(SEED)
+    tcod_random.init(SEED)
+    world = World()
+    world.create_map(width, height, dungeon_algorithm=algorithm)
+    return world
+
+
+@functools.lru_cache(maxsize=None)
+def cached_world(algorithm, width, height):
+    """A world shared by the benchmarks that don't change it"""
+
+    return generate(algorithm, width, height)
+
+
+@pytest.fixture(params=MAPS, ids=["%s-%dx%d" % params for params in MAPS])
+def map_params(request):
+    return request.param
+
+
+@pytest.fixture
+def game_map(map_params):
+    return cached_world(*map_params).get_current_map()
+
+
+def tcod_fov_map(game_map):
+    fov_map = tcod.map.Map(width=game_map.width, height=game_map.height)
+    walkable = game_map.walkable_mask().T
+    fov_map.walkable[:] = walkable
+    fov_map.transparent[:] = walkable
+    return fov_map
+
+
+@pytest.mark.parametrize("algorithm", ["bsp", "tunneling"])
+def test_generate(bench, algorithm):
+    # the room distances must not make the generation of small maps slower
+    assert bench(lambda: generate(algorithm, 120, 80), rounds=5).get_current_map().rooms
+
+
+def test_astar_short(bench, game_map):
+    start = game_map.start_vec
+    # the walkable cell farthest from start within 8 cells
+    x0, y0 = max(start.x - 8, 0), max(start.y - 8, 0)
+    cells = np.argwhere(game_map.walkable_mask()[x0 : start.x + 9, y0 : start.y + 9])
+    cells += (x0, y0)
+    x, y = cells[np.abs(cells - (start.x, start.y)).sum(axis=1).argmax()]
+    goal = Vector2(int(x), int(y))
+    assert bench(lambda: astar(game_map, start, goal), number=10)
+
+
+def test_astar_long(bench, game_map):
+    assert bench(lambda: astar(game_map, game_map.start_vec, game_map.end_vec))
+
+
+def test_astar_unreachable(bench, game_map):
+    # the corner of the map is a wall: the search visits every cell reachable from start
+    assert bench(lambda: astar(game_map, game_map.start_vec, Vector2(0, 0)), rounds=3) == []
+
+
+def test_fov_calculate(bench, game_map):
+    # no cache: every call runs the shadowcaster
+    fov = Fov(radius=6, max_cached=0)
+    fov.setup(game_map)
+    start = game_map.start_vec
+    assert len(bench(lambda: fov.calculate(start.x, start.y), number=10))
+
+
+def test_fov_calculate_cached(bench, game_map):
+    fov = Fov(radius=6)
+    fov.setup(game_map)
+    start = game_map.start_vec
+    assert len(bench(lambda: fov.calculate(start.x, start.y), number=10))
+
+
+def test_tcod_compute_fov(bench, game_map):
+    fov_map = tcod_fov_map(game_map)
+    start = game_map.start_vec
+
+    def compute():
+        fov_map.compute_fov(start.x, start.y, radius=6, algorithm=tcod.FOV_DIAMOND)
+        return fov_map.fov
+
+    assert bench(compute, number=10)[start.y, start.x]
+
+
+def test_vision_cached_fov(bench, game_map):
+    # the player waiting: the FOV comes from the cache of the pool
+    fov_map = tcod_fov_map(game_map)
+    vision = VisionPool(fov_map.transparent)
+    start = game_map.start_vec
+
+    def compute():
+        square = vision.compute_map_fov(fov_map, start.x, start.y, 6)
+        fov_map.fov[square] = False
+        return vision.compute_map_fov(fov_map, start.x, start.y, 6)
+
+    assert bench(compute, number=10)
+
+
+class TurnLoop:
+    """The parts of DungeonScene used by the monsters on their turn"""
+
+    def __init__(self, world):
+        self.world = world
+        game_map = world.get_current_map()
+        self.player = world.entity_manager.create_entity("player")
+        game_map.move_entity(self.player, game_map.start_vec)
+        self.fov_map = tcod_fov_map(game_map)
+        self.vision = VisionPool(self.fov_map.transparent)
+        self.perception = Perception()
+        self.attacks = 0
+
+    def fight(self, attacker, defender):
+        self.attacks += 1
+
+    def turn(self):
+        em = self.world.entity_manager
+        monsters = em.components["monster_ai"]
+        radius = max((ai_cc.radius for ai_cc in monsters.values()), default=0)
+        self.perception.update(self.vision, self.player.position, radius)
+        for entity_id, ai_cc in monsters.items():
+            ai_cc.update(em.get_entity(entity_id), self)
+
+
+def test_monster_turns(bench, map_params):
+    # the monsters move around: don't use the shared world
+    loop = TurnLoop(generate(*map_params))
+    random.seed(SEED)
+
+    def turns():
+        for _ in range(10):
+            loop.turn()
+        return loop
+
+    assert bench(turns, rounds=3)
@@ -0,0 +1,87 @@
+import random
+import unittest
+import numpy as np
+from pyro.chunks import ChunkedLayer
+from pyro.gamedata import gamedata
+from pyro.gamemap import GameMap, Room
+from pyro.utils import Rect, tcod_random
+from pyro.world import World
+from pyro import VOID, WALL, ROOM, NO_ROOM
+
+
+class ChunkedLayerTest(unittest.TestCase):
+    def setUp(self):
+        self.layer = ChunkedLayer((50, 30), np.int32, NO_ROOM, chunk_size=8)
+        self.array = np.full((50, 30), NO_ROOM, dtype=np.int32)
+
+    def assert_same(self):
+        assert np.array_equal(np.asarray(self.layer), self.array)
+
+    def test_lazy_allocation(self):
+        assert self.layer.allocated == 0
+        assert self.layer[10, 10] == NO_ROOM
+        # writing the fill value doesn't allocate anything
+        self.layer[0:20, 0:20] = NO_ROOM
+        assert self.layer.allocated == 0
+
+        self.layer[10, 10] = 3
+        self.array[10, 10] = 3
+        assert self.layer.allocated == 1
+        self.assert_same()
+
+    def test_regions(self):
+        for key, value in (
+            ((slice(5, 20), slice(3, 17)), 1),
+            ((slice(None), 0), 2),
+            ((-1, slice(None)), 3),
+            ((slice(45, 60), slice(25, 40)), 4),
+        ):
+            self.layer[key] = value
+            self.array[key] = value
+        self.assert_same()
+
+        region = self.layer[4:21, 2:18]
+        assert np.array_equal(region, self.array[4:21, 2:18])
+        assert np.array_equal(self.layer[:, 29], self.array[:, 29])
+        assert np.array_equal(self.layer[7, :], self.array[7, :])
+
+        # regions are copies: changes must be written back
+        region[region == 1] = 5
+        self.layer[4:21, 2:18] = region
+        self.array[4:21, 2:18] = region
+        self.assert_same()
+
+    def test_out_of_bounds(self):
+        with self.assertRaises(IndexError):
+            self.layer[50, 0]
+        with self.assertRaises(IndexError):
+            self.layer[0:2]
+
+
+class ChunkedGameMapTest(unittest.TestCase):
+    def test_carving(self):
+        game_map = GameMap(300, 200, chunk_size=16)
+        game_map.fill_rect(Rect(10, 10, 10, 10), ROOM, 1)
+        game_map.wall_void_around(10, 10, np.ones((10, 10), dtype=bool))
+        assert game_map.get_at(15, 15).kind == ROOM
+        assert game_map.get_at(9, 9).kind == WALL
+        assert game_map.get_at(250, 150).kind == VOID
+        assert game_map.kind.allocated == 4
+        regions = list(game_map.iter_regions())
+        assert [(r.x, r.y) for r in regions] == [(0, 0), (0, 16), (16, 0), (16, 16)]
+
+    def test_same_map_as_dense(self):
+        gamedata.load()
+        maps = []
+        for chunk_size in (None, 32):
+            random.seed(1)
+            tcod_random.init(1)
+            Room.LAST_ID = 0
+            world = World()
+            world.create_map(120, 90, dungeon_algorithm="bsp", chunk_size=chunk_size)
+            maps.append(world.get_current_map())
+
+        dense, chunked = maps
+        assert chunked.chunked
+        for name in ("kind", "room_id", "feature"):
+            assert np.array_equal(np.asarray(getattr(chunked, name)), getattr(dense, name))
@@ -0,0 +1,72 @@
+import math
+import unittest
+from pyro.astar import astar
+from pyro.entities import Entity
+from pyro.flowfield import FlowField, FlowFields
+from pyro.gamemap import GameMap
+from pyro.utils import Rect, Vector2
+from pyro import ROOM, WALL
+
+
+class FlowFieldTest(unittest.TestCase):
+    def setUp(self):
+        self.game_map = GameMap(30, 20)
+        self.game_map.fill_rect(Rect(1, 1, 28, 18), ROOM)
+        self.game_map.fill_rect(Rect(14, 1, 1, 15), WALL)
+        self.target = Vector2(25, 4)
+
+    def walk(self, field, pos):
+        steps = []
+        while pos != field.target:
+            pos = field.next_step(pos)
+            steps.append(pos)
+        return steps
+
+    def test_matches_astar(self):
+        for diagonal in (True, False):
+            field = FlowField(self.game_map, self.target, diagonal, max_cost=100)
+            for start in (Vector2(3, 3), Vector2(10, 17), Vector2(20, 10)):
+                steps = self.walk(field, start)
+                path = astar(self.game_map, start, self.target, diagonal)
+                assert len(steps) == len(path)
+                cost = sum(
+                    math.sqrt(2) if a.x != b.x and a.y != b.y else 1
+                    for a, b in zip([start] + path, path)
+                )
+                assert math.isclose(field.cost(start), cost)
+
+    def test_max_cost(self):
+        field = FlowField(self.game_map, self.target, max_cost=5)
+        assert Vector2(21, 4) in field
+        assert Vector2(3, 3) not in field
+        assert field.next_step(Vector2(3, 3)) is None
+        assert field.next_step(self.target) is None
+
+
+class FlowFieldsTest(unittest.TestCase):
+    def setUp(self):
+        self.game_map = GameMap(20, 12)
+        self.game_map.fill_rect(Rect(1, 1, 18, 10), ROOM)
+        self.fields = FlowFields(self.game_map, max_fields=2)
+
+    def test_shared_and_rebuilt(self):
+        target = Vector2(5, 5)
+        field = self.fields.get(target)
+        assert self.fields.get(target.copy()) is field
+
+        # entities moving around don't invalidate the field
+        entity = Entity(1, "test", "@", (255, 255, 255))
+        self.game_map.move_entity(entity, Vector2(3, 3))
+        assert self.fields.get(target) is field
+        assert (self.fields.builds, self.fields.hits) == (1, 2)
+
+        # walls do
+        self.game_map.set_kind(6, 5, WALL)
+        assert self.fields.get(target) is not field
+        assert self.fields.builds == 2
+
+    def test_lru(self):
+        first = self.fields.get(Vector2(2, 2))
+        self.fields.get(Vector2(3, 3))
+        self.fields.get(Vector2(4, 4))
+        assert self.fields.get(Vector2(2, 2)) is not first
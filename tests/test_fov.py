@@ -0,0 +1,130 @@
+import unittest
+import numpy as np
+from pyro.fov import Fov, octant_tables, symmetric_shadowcast
+from pyro.gamemap import GameMap
+from pyro.utils import Rect
+from pyro import ROOM, WALL
+
+
+class FovTest(unittest.TestCase):
+    def setUp(self):
+        self.game_map = GameMap(40, 30)
+        self.game_map.fill_rect(Rect(1, 1, 38, 28), ROOM)
+        self.game_map.fill_rect(Rect(20, 1, 1, 28), WALL)
+        self.fov = Fov(radius=6)
+        self.fov.setup(self.game_map)
+
+    def lit(self):
+        return set(map(tuple, self.fov.lit.tolist()))
+
+    def test_open_area(self):
+        lit = self.fov.calculate(10, 10)
+        assert lit.shape[1] == 2
+        expected = {
+            (x, y)
+            for x in range(4, 17)
+            for y in range(4, 17)
+            if 0 < (x - 10) ** 2 + (y - 10) ** 2 < 36
+        }
+        assert self.lit() == expected
+        assert self.fov.fovmap.sum() == len(expected)
+
+    def test_walls_block(self):
+        self.fov.calculate(18, 10)
+        assert self.fov.is_lit(20, 10)
+        assert not self.fov.is_lit(21, 10)
+        assert not self.fov.is_lit(22, 10)
+
+    def test_map_border(self):
+        self.fov.calculate(1, 1)
+        assert (0, 0) in self.lit()
+        assert all(x >= 0 and y >= 0 for x, y in self.lit())
+
+    def test_reset(self):
+        self.fov.calculate(10, 10)
+        first = self.lit()
+        self.fov.calculate(30, 20)
+        second = self.lit()
+        assert not first & second
+        assert self.fov.fovmap.sum() == len(second)
+        assert not any(self.fov.is_lit(x, y) for x, y in first)
+
+    def test_sync(self):
+        self.fov.calculate(18, 10)
+        self.game_map.set_kind(20, 10, ROOM)
+        self.fov.sync(self.game_map)
+        self.fov.calculate(18, 10)
+        assert self.fov.is_lit(21, 10)
+
+    def test_cached(self):
+        first = self.fov.calculate(10, 10).tolist()
+        self.fov.calculate(30, 20)
+        assert self.fov.cache.misses == 2
+        assert self.fov.calculate(10, 10).tolist() == first
+        assert self.fov.cache.hits == 1
+        assert self.fov.fovmap.sum() == len(first)
+        assert not self.fov.is_lit(30, 20)
+
+    def test_sync_clears_cache(self):
+        self.fov.calculate(18, 10)
+        self.game_map.set_kind(20, 10, ROOM)
+        self.fov.sync(self.game_map)
+        assert len(self.fov.cache) == 0
+
+    def test_octant_tables(self):
+        tables = octant_tables(6)
+        assert octant_tables(6) is tables
+        assert len(tables) == 8
+        assert [len(row) for row in tables[0]] == [2, 3, 4, 5, 6, 7]
+        # every cell of the square but the origin is scanned, the axes and diagonals twice
+        indices = [cell[0] for rows in tables for row in rows for cell in row]
+        assert len(set(indices)) == 13 * 13 - 1
+        assert 13 * 6 + 6 not in indices
+
+    def test_pillars(self):
+        for x, y in ((12, 10), (10, 13), (7, 8)):
+            self.game_map.set_kind(x, y, WALL)
+        self.fov.sync(self.game_map)
+        self.fov.calculate(10, 10)
+        assert self.fov.is_lit(12, 10)
+        assert not self.fov.is_lit(14, 10)
+        assert self.fov.is_lit(10, 13)
+        assert not self.fov.is_lit(10, 15)
+        assert not self.fov.is_lit(4, 6)
+        assert self.fov.is_lit(13, 11)
+
+
+class SymmetricShadowcastTest(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.RandomState(1)
+        self.transparent = rng.random_sample((30, 20)) > 0.25
+
+    def test_open_area(self):
+        transparent = np.ones((30, 20), dtype=bool)
+        lit = symmetric_shadowcast(transparent, 10, 10, 4)
+        assert lit[10, 10] and lit[13, 12] and lit[10, 7]
+        # the cells at the radius are dark
+        assert not lit[10, 6] and not lit[14, 10]
+        assert lit.sum() == sum(x * x + y * y < 16 for x in range(-4, 5) for y in range(-4, 5))
+
+    def test_walls(self):
+        transparent = np.ones((30, 20), dtype=bool)
+        transparent[12, :] = False
+        lit = symmetric_shadowcast(transparent, 10, 10, 6)
+        # the walls are lit, the cells behind them aren't
+        assert lit[12, 10] and lit[12, 12]
+        assert not lit[13, 10]
+
+    def test_map_border(self):
+        lit = symmetric_shadowcast(np.ones((30, 20), dtype=bool), 1, 1, 4)
+        assert lit.shape == (30, 20)
+        assert lit[0, 0] and lit[3, 2]
+
+    def test_symmetric(self):
+        transparent = self.transparent
+        floors = [tuple(map(int, cell)) for cell in np.argwhere(transparent)]
+        for x, y in floors[::7]:
+            lit = symmetric_shadowcast(transparent, x, y, 6)
+            for other_x, other_y in np.argwhere(lit & transparent):
+                back = symmetric_shadowcast(transparent, int(other_x), int(other_y), 6)
+                assert back[x, y], ((x, y), (other_x, other_y))
@@ -0,0 +1,36 @@
+import unittest
+import numpy as np
+from pyro.fovcache import FovCache
+
+
+class FovCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.cache = FovCache(max_entries=2)
+        self.fov = np.random.RandomState(1).rand(9, 7) > 0.5
+
+    def test_get(self):
+        assert self.cache.get((1, 1)) is None
+        self.cache.put((1, 1), self.fov)
+        fov = self.cache.get((1, 1))
+        assert fov.dtype == bool
+        assert np.array_equal(fov, self.fov)
+        assert (self.cache.hits, self.cache.misses) == (1, 1)
+        assert self.cache.hit_rate == 0.5
+
+    def test_packed(self):
+        self.cache.put((1, 1), self.fov)
+        assert self.cache.stats()["bytes"] == 8
+
+    def test_least_recently_used(self):
+        self.cache.put((1, 1), self.fov)
+        self.cache.put((2, 2), self.fov)
+        self.cache.get((1, 1))
+        self.cache.put((3, 3), self.fov)
+        assert len(self.cache) == 2
+        assert self.cache.get((2, 2)) is None
+        assert self.cache.get((1, 1)) is not None
+
+    def test_clear(self):
+        self.cache.put((1, 1), self.fov)
+        self.cache.clear()
+        assert self.cache.get((1, 1)) is None
@@ -0,0 +1,151 @@
+import unittest
+import numpy as np
+from pyro.gamemap import GameMap, Room
+from pyro.entities import Entity
+from pyro.utils import Rect, Vector2, Direction
+from pyro import VOID, WALL, ROOM, CORRIDOR, NO_ROOM, FEATURE_GRASS
+
+
+class GameCellTest(unittest.TestCase):
+    def setUp(self):
+        self.game_map = GameMap(10, 8)
+
+    def test_defaults(self):
+        cell = self.game_map.get_at(3, 4)
+        assert cell.kind == VOID
+        assert cell.room_id is None
+        assert cell.feature is None
+        assert cell.value is None
+        assert not cell.has_entities()
+
+    def test_view_writes_through(self):
+        cell = self.game_map.get_at(Vector2(3, 4))
+        cell.kind = ROOM
+        cell.room_id = 7
+        cell.feature = "grass"
+        assert self.game_map.kind[3, 4] == ROOM
+        assert self.game_map.room_id[3, 4] == 7
+        assert self.game_map.feature[3, 4] == FEATURE_GRASS
+        assert cell.walkable
+
+        cell.room_id = None
+        assert self.game_map.room_id[3, 4] == NO_ROOM
+
+    def test_out_of_bounds(self):
+        assert self.game_map.get_at(10, 0) is None
+        assert self.game_map.get_at(Vector2(0, -1)) is None
+
+
+class GameMapTest(unittest.TestCase):
+    def test_outer_walls(self):
+        game_map = GameMap(10, 8)
+        game_map._place_outer_walls()
+        assert (game_map.kind[:, 0] == WALL).all()
+        assert (game_map.kind[9, :] == WALL).all()
+        assert game_map.kind[1:-1, 1:-1].sum() == 0
+
+    def test_move_entity(self):
+        game_map = GameMap(10, 8)
+        entity = Entity(1, "test", "@", (255, 255, 255))
+        game_map.move_entity(entity, Vector2(2, 2))
+        game_map.move_entity(entity, Vector2(3, 2))
+        assert game_map.get_at(3, 2).entities == {1}
+        assert not game_map.get_at(2, 2).has_entities()
+        assert game_map.entity_index.position(1) == (3, 2)
+
+        game_map.remove_entity(entity)
+        assert not game_map.get_at(3, 2).has_entities()
+
+
+class CarvingTest(unittest.TestCase):
+    def setUp(self):
+        self.game_map = GameMap(20, 12)
+
+    def test_dig_room(self):
+        room = Room(2, 2, 5, 4)
+        self.game_map.rooms[room.rid] = room
+        self.game_map._dig_room(room)
+        kind = self.game_map.kind
+        assert (kind[3:6, 3:5] == ROOM).all()
+        assert (kind[2, 2:6] == WALL).all()
+        assert (kind[2:7, 5] == WALL).all()
+        assert (self.game_map.room_id[2:7, 2:6] == room.rid).all()
+        assert not room.connected
+
+    def test_carve_corridor(self):
+        self.game_map.carve_corridor(Vector2(2, 2), Vector2(8, 6), horizontal_first=True)
+        kind = self.game_map.kind
+        assert (kind[2:9, 2] == CORRIDOR).all()
+        assert (kind[8, 2:7] == CORRIDOR).all()
+        # walls around the corridor, including the corners
+        assert kind[1, 1] == WALL
+        assert kind[9, 7] == WALL
+        assert kind[7, 3] == WALL
+        # nothing else is touched
+        assert kind[2, 6] == VOID
+        assert (kind == CORRIDOR).sum() == 11
+
+    def test_corridor_connects_rooms(self):
+        room = Room(4, 4, 5, 5)
+        self.game_map.rooms[room.rid] = room
+        self.game_map._dig_room(room)
+        self.game_map.carve_corridor(Vector2(1, 6), Vector2(6, 6))
+        assert room.connected
+        # corridors do not overwrite room walls with new walls
+        assert self.game_map.kind[4, 6] == CORRIDOR
+
+    def test_wall_void_around_clips_to_map(self):
+        mask = np.zeros((2, 2), dtype=bool)
+        mask[0, 0] = True
+        self.game_map.wall_void_around(0, 0, mask)
+        assert (self.game_map.kind[0:2, 0:2] == [[VOID, WALL], [WALL, WALL]]).all()
+        assert (self.game_map.kind == WALL).sum() == 3
+
+    def test_retag_region(self):
+        self.game_map.fill_rect(Rect(0, 0, 4, 4), CORRIDOR)
+        self.game_map.kind[1, 1] = WALL
+        self.game_map.retag_region(Rect(0, 0, 5, 5), ROOM, only=(VOID, CORRIDOR))
+        assert self.game_map.kind[1, 1] == WALL
+        assert (self.game_map.kind[0:5, 0:5] == ROOM).sum() == 24
+
+
+class NeighborMaskTest(unittest.TestCase):
+    def setUp(self):
+        self.game_map = GameMap(20, 12)
+        self.game_map.fill_rect(Rect(0, 0, 6, 5), ROOM)
+        self.game_map.carve_corridor(Vector2(5, 2), Vector2(15, 8))
+
+    def expected_masks(self):
+        walk = np.zeros((20, 12), dtype=np.uint8)
+        sight = np.zeros((20, 12), dtype=np.uint8)
+        for x in range(20):
+            for y in range(12):
+                for bit, cell in enumerate(
+                    self.game_map.get_at(x + d.x, y + d.y) for d in Direction.all()
+                ):
+                    if cell is not None and cell.walkable:
+                        walk[x, y] |= 1 << bit
+                    if cell is not None and not cell.blocking:
+                        sight[x, y] |= 1 << bit
+        return walk, sight
+
+    def test_bulk(self):
+        walk, sight = self.game_map.neighbor_masks()
+        expected_walk, expected_sight = self.expected_masks()
+        assert np.array_equal(walk, expected_walk)
+        assert np.array_equal(sight, expected_sight)
+
+    def test_incremental(self):
+        self.game_map.neighbor_masks()
+        self.game_map.get_at(0, 0).kind = WALL
+        self.game_map.set_kind(10, 10, CORRIDOR)
+        walk, sight = self.game_map.neighbor_masks()
+        expected_walk, expected_sight = self.expected_masks()
+        assert np.array_equal(walk, expected_walk)
+        assert np.array_equal(sight, expected_sight)
+
+    def test_walkable_directions(self):
+        directions = self.game_map.walkable_directions(0, 0)
+        assert directions == (Direction.EAST, Direction.SOUTH, Direction.SOUTH_EAST)
+        directions = self.game_map.walkable_directions(0, 0, diagonal=False)
+        assert directions == (Direction.EAST, Direction.SOUTH)
@@ -0,0 +1,87 @@
+import unittest
+from pyro.components import DoorComponent
+from pyro.entities import Entity
+from pyro.gamemap import GameMap
+from pyro.journal import ChangeJournal, CHANGED_KIND, CHANGED_TRANSPARENCY, CHANGED_ENTITIES
+from pyro.utils import Rect, Vector2
+from pyro import WALL, ROOM, CORRIDOR
+
+
+class ChangeJournalTest(unittest.TestCase):
+    def test_changes_since(self):
+        journal = ChangeJournal()
+        journal.record(1, 1, CHANGED_KIND)
+        version = journal.version
+        journal.record(2, 2, CHANGED_KIND)
+        journal.record(2, 2, CHANGED_ENTITIES)
+        assert journal.changes_since(version) == {(2, 2): CHANGED_KIND | CHANGED_ENTITIES}
+        assert journal.changes_since(journal.version) == {}
+        assert len(journal.changes_since(0)) == 2
+
+    def test_capacity(self):
+        journal = ChangeJournal(capacity=4)
+        for x in range(6):
+            journal.record(x, 0, CHANGED_KIND)
+        assert journal.changes_since(1) is None
+        assert set(journal.changes_since(2)) == {(2, 0), (3, 0), (4, 0), (5, 0)}
+
+    def test_invalidate(self):
+        journal = ChangeJournal()
+        journal.record(1, 1, CHANGED_KIND)
+        version = journal.version
+        journal.invalidate()
+        assert journal.changes_since(version) is None
+        assert journal.changes_since(journal.version) == {}
+
+
+class GameMapJournalTest(unittest.TestCase):
+    def setUp(self):
+        self.game_map = GameMap(20, 12)
+        self.game_map.fill_rect(Rect(2, 2, 8, 8), ROOM)
+        self.version = self.game_map.version
+
+    def test_set_kind(self):
+        self.game_map.get_at(3, 3).kind = CORRIDOR
+        self.game_map.set_kind(4, 4, WALL)
+        # no change, nothing recorded
+        self.game_map.set_kind(5, 5, ROOM)
+        changes = self.game_map.journal.changes_since(self.version)
+        assert changes == {(3, 3): CHANGED_KIND, (4, 4): CHANGED_KIND | CHANGED_TRANSPARENCY}
+
+    def test_entities(self):
+        entity = Entity(1, "test", "@", (255, 255, 255))
+        self.game_map.move_entity(entity, Vector2(3, 3))
+        self.game_map.move_entity(entity, Vector2(4, 3))
+        self.game_map.remove_entity(entity)
+        changes = self.game_map.journal.changes_since(self.version)
+        assert changes == {(3, 3): CHANGED_ENTITIES, (4, 3): CHANGED_ENTITIES}
+
+    def test_doors(self):
+        entity = Entity(1, "door", "+", (255, 255, 255))
+        entity.add_component(DoorComponent())
+        door = entity.get_component("door")
+        self.game_map.move_entity(entity, Vector2(3, 3))
+        assert self.game_map.door_at(3, 3) is door
+        assert self.game_map.closed_doors() == ([3], [3])
+
+        version = self.game_map.version
+        door.open()
+        # already open, nothing recorded
+        door.open()
+        assert self.game_map.journal.changes_since(version) == {(3, 3): CHANGED_TRANSPARENCY}
+        assert self.game_map.closed_doors() == ([], [])
+
+        self.game_map.remove_entity(entity)
+        version = self.game_map.version
+        door.close()
+        assert self.game_map.journal.changes_since(version) == {}
+        assert self.game_map.door_at(3, 3) is None
+        assert not door.listeners
+
+    def test_bulk_changes_invalidate(self):
+        self.game_map.carve_corridor(Vector2(1, 1), Vector2(5, 1))
+        assert self.game_map.journal.changes_since(self.version) is None
+
+        version = self.game_map.version
+        self.game_map._place_outer_walls()
+        assert self.game_map.journal.changes_since(version) is None
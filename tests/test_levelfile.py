@@ -0,0 +1,103 @@
+import os
+import random
+import shutil
+import tempfile
+import unittest
+import numpy as np
+from pyro.gamedata import gamedata
+from pyro.levelfile import load_level, LevelFormatError
+from pyro.utils import tcod_random
+from pyro.world import World
+from pyro import PotionType
+
+
+class LevelFileTest(unittest.TestCase):
+    def setUp(self):
+        gamedata.load()
+        random.seed(1)
+        tcod_random.init(1)
+        self.world = World()
+        self.world.create_map(60, 40, dungeon_algorithm="tunneling")
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, "level.pyrolvl")
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_roundtrip(self):
+        game_map = self.world.get_current_map()
+        self.world.save_level(0, self.path)
+        loaded, states = load_level(self.path)
+
+        assert np.array_equal(loaded.kind, game_map.kind)
+        assert np.array_equal(loaded.room_id, game_map.room_id)
+        assert np.array_equal(loaded.feature, game_map.feature)
+        assert list(loaded.rooms) == list(game_map.rooms)
+        assert loaded.start_vec == game_map.start_vec
+        assert loaded.end_vec == game_map.end_vec
+        assert loaded.level == 1
+        assert len(states) == len(game_map.entity_index)
+
+        # loaded arrays are copy-on-write: changing them doesn't touch the file
+        loaded.kind[0, 0] = 42
+        again, _ = load_level(self.path)
+        assert again.kind[0, 0] == game_map.kind[0, 0]
+
+    def test_chunked_roundtrip(self):
+        self.world.create_map(200, 150, dungeon_algorithm="tunneling", chunk_size=32)
+        game_map = self.world.maps[1]
+        self.world.save_level(1, self.path)
+        loaded, states = load_level(self.path)
+
+        assert loaded.chunk_size == 32
+        assert loaded.kind.chunk_keys() == game_map.kind.chunk_keys()
+        for name in ("kind", "room_id", "feature"):
+            assert np.array_equal(
+                np.asarray(getattr(loaded, name)), np.asarray(getattr(game_map, name))
+            )
+        assert len(states) == len(game_map.entity_index)
+
+    def test_visited(self):
+        for chunk_size, index in ((None, 0), (32, 1)):
+            if chunk_size:
+                self.world.create_map(200, 150, dungeon_algorithm="tunneling", chunk_size=32)
+            game_map = self.world.maps[index]
+            start = game_map.start_vec
+            game_map.visited[start.x - 3 : start.x + 4, start.y - 2 : start.y + 3] = True
+            self.world.save_level(index, self.path)
+            loaded, _ = load_level(self.path)
+
+            assert np.asarray(loaded.visited).dtype == bool
+            assert np.array_equal(np.asarray(loaded.visited), np.asarray(game_map.visited))
+            assert np.asarray(loaded.visited).sum() == 35
+
+    def test_load_level_restores_entities(self):
+        game_map = self.world.get_current_map()
+        door = self.world.entity_manager.create_entity("door")
+        door.get_component("door").open()
+        game_map.move_entity(door, game_map.start_vec)
+        self.world.save_level(0, self.path)
+
+        world = World()
+        index = world.load_level(self.path)
+        loaded = world.maps[index]
+        assert len(world.entity_manager.entities) == len(game_map.entity_index)
+        restored = world.entity_manager.get_entity(door.eid)
+        assert restored.get_component("door").is_open
+        assert door.eid in loaded.get_at(game_map.start_vec).entities
+
+    def test_checkpoint(self):
+        potion = self.world.entity_manager.create_potion(PotionType.POISON)
+        self.world.save(self.directory)
+        world = World.load(self.directory)
+        assert len(world.maps) == 1
+        assert set(world.entity_manager.entities) == set(self.world.entity_manager.entities)
+        restored = world.entity_manager.get_entity(potion.eid)
+        restored_type = restored.get_component("potion").potion_type
+        assert restored_type == potion.get_component("potion").potion_type
+
+    def test_bad_file(self):
+        with open(self.path, "wb") as fd:
+            fd.write(b"x" * 100)
+        with self.assertRaises(LevelFormatError):
+            load_level(self.path)
@@ -0,0 +1,89 @@
+import unittest
+import numpy as np
+import tcod
+from pyro.components import LightComponent
+from pyro.entities import Entity, EntityManager
+from pyro.gamemap import GameMap
+from pyro.lighting import LightMap, light_sources, apply_light, LIT_THRESHOLD
+from pyro.utils import Rect, Vector2
+from pyro.vision import VisionPool
+from pyro import ROOM, WALL
+
+
+class LightMapTest(unittest.TestCase):
+    def setUp(self):
+        self.game_map = GameMap(40, 30)
+        self.game_map.fill_rect(Rect(1, 1, 38, 28), ROOM)
+        self.game_map.fill_rect(Rect(20, 1, 1, 28), WALL)
+        self.fov_map = tcod.map.Map(width=40, height=30)
+        self.fov_map.transparent[:] = self.game_map.walkable_mask().T
+        self.vision = VisionPool(self.fov_map.transparent)
+        self.light_map = LightMap(self.game_map, self.vision)
+
+    def test_single_source(self):
+        self.light_map.update({1: (10, 10, 4, (255, 0, 0))})
+        intensity = np.asarray(self.light_map.intensity)
+        assert intensity[10, 10] == 1
+        assert intensity[12, 10] == np.float32(1 - 2 / 5)
+        assert intensity[10, 15] == 0
+        assert self.light_map.is_lit(12, 10)
+        assert not self.light_map.is_lit(10, 15)
+
+    def test_sources_add_up(self):
+        self.light_map.update({1: (10, 10, 4, (255, 0, 0)), 2: (13, 10, 4, (0, 0, 255))})
+        assert abs(self.light_map.intensity[12, 10] - (3 / 5 + 4 / 5)) < 1e-6
+        colors = self.light_map.colors(10, 10, 14, 11)
+        assert colors.shape == (4, 1, 3)
+        assert np.allclose(colors[0, 0], [255, 0, 2 / 5 * 255])
+
+    def test_walls_cast_shadows(self):
+        self.light_map.update({1: (18, 10, 6, (255, 255, 255))})
+        # the wall itself is lit, the other side is not
+        assert self.light_map.is_lit(20, 10)
+        assert self.light_map.intensity[22, 10] == 0
+
+    def test_static_sources_computed_once(self):
+        sources = {1: (10, 10, 4, (255, 0, 0))}
+        self.light_map.update(sources)
+        self.light_map.update(sources)
+        assert self.light_map.computed == 1
+
+    def test_moving_source(self):
+        self.light_map.update({1: (10, 10, 4, (255, 0, 0)), 2: (30, 10, 3, (255, 0, 0))})
+        self.light_map.update({1: (10, 20, 4, (255, 0, 0)), 2: (30, 10, 3, (255, 0, 0))})
+        assert self.light_map.computed == 3
+        assert self.light_map.intensity[10, 10] == 0
+        assert self.light_map.intensity[10, 20] == 1
+
+        self.light_map.update({2: (30, 10, 3, (255, 0, 0))})
+        assert 1 not in self.light_map
+        assert np.asarray(self.light_map.intensity)[:20].max() == 0
+
+    def test_invalidate(self):
+        sources = {1: (18, 10, 6, (255, 255, 255)), 2: (5, 25, 2, (255, 255, 255))}
+        self.light_map.update(sources)
+        self.fov_map.transparent[10, 20] = True
+        self.vision.changed()
+        self.light_map.invalidate(20, 10)
+        self.light_map.update(sources)
+        assert self.light_map.computed == 3
+        assert self.light_map.intensity[22, 10] > LIT_THRESHOLD
+
+
+class LightSourcesTest(unittest.TestCase):
+    def test_light_sources(self):
+        game_map = GameMap(20, 12)
+        em = EntityManager()
+        for eid, position in ((1, Vector2(3, 3)), (2, None)):
+            entity = Entity(eid, "torch", "*", (255, 255, 255))
+            light = LightComponent()
+            light.setup({"RADIUS": "3", "COLOR": "255,160,60"})
+            entity.add_component(light)
+            em.entities[eid] = entity
+            em.register_component(entity, light)
+            if position is not None:
+                game_map.move_entity(entity, position)
+        assert light_sources(game_map, em) == {1: (3, 3, 3, (255, 160, 60))}
+
+    def test_apply_light(self):
+        assert apply_light((100, 100, 100), (255, 0, 60)) == (227, 100, 130)
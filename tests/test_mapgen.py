@@ -0,0 +1,30 @@
+import unittest
+from pyro.gamedata import gamedata
+from pyro.mapgen import generate_map, generate_maps
+
+
+class MapgenTest(unittest.TestCase):
+    def setUp(self):
+        gamedata.load()
+
+    def test_generate_map(self):
+        result = generate_map((1, 80, 60, "bsp"))
+        assert result["seed"] == 1
+        assert result["rooms"] > 0
+        assert list(result["timings"]) == [
+            "split",
+            "traverse",
+            "tag",
+            "graph",
+            "stairs",
+            "creatures",
+            "doors",
+            "features",
+            "items",
+        ]
+
+    def test_same_seed_same_map(self):
+        tasks = [(3, 80, 60, "tunneling"), (3, 80, 60, "tunneling")]
+        first, second = generate_maps(tasks, jobs=1)
+        assert first["rooms"] == second["rooms"]
+        assert first["walkable"] == second["walkable"]
@@ -0,0 +1,24 @@
+import unittest
+import noise
+import numpy as np
+from pyro.noisefield import pnoise2, noise_field
+
+
+class NoiseFieldTest(unittest.TestCase):
+    def test_matches_reference_noise(self):
+        rng = np.random.RandomState(1)
+        xs = rng.uniform(0, 300, 500)
+        ys = rng.uniform(0, 300, 500)
+        expected = [noise.pnoise2(x, y) for x, y in zip(xs, ys)]
+        assert np.array_equal(pnoise2(xs, ys), np.array(expected, dtype=np.float32))
+
+    def test_seed(self):
+        xs = np.linspace(0, 20, 50)
+        assert not np.array_equal(pnoise2(xs, xs, seed=0), pnoise2(xs, xs, seed=1))
+
+    def test_field_is_cached(self):
+        field = noise_field(0, 40, 30, 8.0)
+        assert field.shape == (40, 30)
+        assert field.min() >= 0 and field.max() <= 1
+        assert noise_field(0, 40, 30, 8.0) is field
+        assert not field.flags.writeable
@@ -0,0 +1,72 @@
+import unittest
+from pyro.astar import astar
+from pyro.entities import Entity
+from pyro.gamemap import GameMap
+from pyro.pathcache import PathCache
+from pyro.utils import Rect, Vector2
+from pyro import ROOM, WALL
+
+
+class PathCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.game_map = GameMap(30, 20)
+        self.game_map.fill_rect(Rect(1, 1, 28, 18), ROOM)
+        self.game_map.fill_rect(Rect(14, 1, 1, 15), WALL)
+        self.cache = PathCache(self.game_map, max_paths=2)
+        self.start = Vector2(3, 3)
+        self.goal = Vector2(25, 4)
+
+    def test_hit_and_suffix(self):
+        path = self.cache.get(self.start, self.goal)
+        assert path == astar(self.game_map, self.start, self.goal, jps=True)
+        assert self.cache.get(self.start, self.goal) == path
+        # one step along the path
+        assert self.cache.get(path[0], self.goal) == path[1:]
+        assert self.cache.get(path[-2], self.goal) == path[-1:]
+        # the other kind of moves is a different path
+        self.cache.get(self.start, self.goal, diagonal=False)
+        assert (self.cache.hits, self.cache.suffix_hits, self.cache.misses) == (1, 2, 2)
+        assert self.cache.hit_rate == 0.6
+
+    def test_returns_copies(self):
+        path = self.cache.get(self.start, self.goal)
+        path[0].x = 0
+        assert self.cache.get(self.start, self.goal)[0].x != 0
+
+    def test_invalidation(self):
+        path = self.cache.get(self.start, self.goal)
+
+        # entities moving around don't invalidate the paths
+        entity = Entity(1, "test", "@", (255, 255, 255))
+        self.game_map.move_entity(entity, Vector2(20, 18))
+        self.cache.get(self.start, self.goal)
+        assert self.cache.hits == 1
+
+        # walls do
+        blocked = path[len(path) // 2]
+        self.game_map.set_kind(blocked.x, blocked.y, WALL)
+        new_path = self.cache.get(self.start, self.goal)
+        assert self.cache.misses == 2
+        assert blocked not in new_path
+
+        # and so do doors
+        self.game_map.touch(1, 1)
+        self.cache.get(self.start, self.goal)
+        assert self.cache.misses == 3
+
+    def test_lru(self):
+        self.cache.get(self.start, self.goal)
+        path = self.cache.get(Vector2(3, 10), self.goal)
+        self.cache.get(Vector2(5, 17), self.goal)
+        assert len(self.cache) == 2
+
+        self.cache.get(self.start, self.goal)
+        assert self.cache.misses == 4
+        # the cells of the evicted path that are on newer paths are still indexed
+        self.cache.get(path[-2], self.goal)
+        assert self.cache.suffix_hits == 1
+
+    def test_unreachable(self):
+        self.game_map.fill_rect(Rect(14, 1, 1, 18), WALL)
+        assert self.cache.get(self.start, self.goal) == []
+        assert len(self.cache) == 0
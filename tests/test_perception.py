@@ -0,0 +1,88 @@
+import itertools
+import unittest
+import tcod
+from pyro.fov import SYMMETRIC_SHADOWCAST, symmetric_shadowcast
+from pyro.perception import Perception
+from pyro.utils import Vector2
+from pyro.vision import VisionPool
+
+
+def fov_map(width, height, walls=()):
+    fov_map = tcod.map.Map(width=width, height=height)
+    fov_map.transparent[:] = True
+    for x, y in walls:
+        fov_map.transparent[y, x] = False
+    return fov_map
+
+
+def vision(width, height, walls=()):
+    return VisionPool(fov_map(width, height, walls).transparent)
+
+
+class PerceptionTest(unittest.TestCase):
+    def setUp(self):
+        self.perception = Perception()
+
+    def test_open_area(self):
+        self.perception.update(vision(30, 20), Vector2(10, 10), 6)
+        assert self.perception.can_see(Vector2(13, 12), 4)
+        assert self.perception.can_see(Vector2(10, 5), 6)
+        assert not self.perception.can_see(Vector2(10, 5), 4)
+
+    def test_outside_the_window(self):
+        self.perception.update(vision(30, 20), Vector2(10, 10), 4)
+        assert not self.perception.can_see(Vector2(20, 10), 4)
+        assert not self.perception.can_see(Vector2(0, 0), 4)
+
+    def test_map_border(self):
+        self.perception.update(vision(30, 20), Vector2(1, 1), 4)
+        if self.perception.symmetric:
+            assert self.perception.left == 0 and self.perception.top == 0
+        assert self.perception.can_see(Vector2(0, 0), 4)
+        assert self.perception.can_see(Vector2(3, 2), 4)
+
+    def test_walls_block(self):
+        walls = [(12, y) for y in range(20)]
+        self.perception.update(vision(30, 20, walls), Vector2(10, 10), 6)
+        assert self.perception.can_see(Vector2(11, 10), 4)
+        assert not self.perception.can_see(Vector2(13, 10), 4)
+
+    def check_monster_fov(self, perception):
+        """What perception reports matches the FOV computed from each monster"""
+
+        walls = [(12, y) for y in range(4, 9)] + [(6, 13), (7, 13), (15, 14), (9, 6)]
+        game_fov = fov_map(25, 21, walls)
+        player = Vector2(10, 10)
+        perception.update(VisionPool(game_fov.transparent), player, 6)
+        for x, y in itertools.product(range(25), range(21)):
+            if (x, y) in walls or (x, y) == (player.x, player.y):
+                continue
+            for radius in (3, 4, 6):
+                if perception.algorithm == SYMMETRIC_SHADOWCAST:
+                    fov = symmetric_shadowcast(game_fov.transparent.T, x, y, radius)
+                    seen = bool(fov[player.x, player.y])
+                else:
+                    game_fov.compute_fov(x, y, radius=radius, algorithm=perception.algorithm)
+                    seen = bool(game_fov.fov[player.y, player.x])
+                assert perception.can_see(Vector2(x, y), radius) == seen, (x, y, radius)
+
+    def test_same_as_monster_fov(self):
+        self.check_monster_fov(self.perception)
+
+    def test_symmetric_shadowcast(self):
+        # the shadowcaster of pyro.fov, used when tcod has no symmetric algorithm
+        perception = Perception(algorithm=SYMMETRIC_SHADOWCAST)
+        assert perception.symmetric
+        self.check_monster_fov(perception)
+
+    def test_not_symmetric(self):
+        # the diamond raycasting isn't symmetric: each monster computes its own FOV
+        perception = Perception(algorithm=tcod.FOV_DIAMOND)
+        assert not perception.symmetric
+        self.check_monster_fov(perception)
+
+    def test_lit_origin(self):
+        self.perception.update(vision(30, 20), Vector2(10, 10), 4, light=1.0)
+        assert self.perception.factor == 2
+        assert self.perception.can_see(Vector2(16, 10), 4)
+        assert not self.perception.can_see(Vector2(19, 10), 4)
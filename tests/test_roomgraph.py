@@ -0,0 +1,160 @@
+import math
+import random
+import unittest
+from pyro.astar import astar
+from pyro.gamedata import gamedata
+from pyro.gamemap import GameMap, Room
+from pyro.roomgraph import (
+    RoomGraph,
+    HierarchicalPathfinder,
+    get_room_graph,
+    get_room_distances,
+    walking_distances,
+)
+from pyro.utils import Vector2, tcod_random
+from pyro.world import World
+from pyro import WALL
+
+
+def path_cost(start, path):
+    total = 0.0
+    for a, b in zip([start] + path, path):
+        assert max(abs(a.x - b.x), abs(a.y - b.y)) == 1
+        total += math.sqrt(2) if a.x != b.x and a.y != b.y else 1.0
+    return total
+
+
+def three_rooms():
+    """Three rooms in a row, joined by corridors; the last one has a pillar inside"""
+
+    game_map = GameMap(60, 20)
+    for x in (1, 21, 41):
+        room = Room(x, 2, 12, 10)
+        game_map.rooms[room.rid] = room
+        game_map._dig_room(room)
+    rooms = list(game_map.rooms.values())
+    game_map._connect_rooms(rooms[0], rooms[1])
+    game_map._connect_rooms(rooms[1], rooms[2])
+    game_map.carve_corridor(Vector2(7, 6), Vector2(50, 16))
+    game_map._tag_rooms()
+    game_map.set_kind(44, 5, WALL)
+    return game_map, rooms
+
+
+class RoomGraphTest(unittest.TestCase):
+    def setUp(self):
+        self.game_map, self.rooms = three_rooms()
+
+    def test_nodes(self):
+        graph = RoomGraph(self.game_map)
+        assert set(graph.room_nodes) == {room.rid for room in self.rooms}
+        assert set(graph.open_rooms) == {self.rooms[0].rid, self.rooms[1].rid}
+        for doorway, room_ids in graph.doorways.items():
+            x, y = divmod(doorway, self.game_map.height)
+            assert self.game_map.get_at(x, y).walkable
+            for room_id in room_ids:
+                room = self.game_map.get_room(room_id)
+                assert x in (room.x, room.endX - 1) or y in (room.y, room.endY - 1)
+        for node, edges in graph.edges.items():
+            for other, cost in edges.items():
+                assert graph.edges[other][node] == cost
+
+    def test_optimal_paths(self):
+        pathfinder = HierarchicalPathfinder(self.game_map)
+        targets = [Vector2(2, 3), Vector2(7, 6), Vector2(27, 10), Vector2(43, 5), Vector2(50, 16)]
+        for diagonal in (True, False):
+            for start in targets:
+                for goal in targets:
+                    path = pathfinder.path(start, goal, diagonal)
+                    expected = astar(self.game_map, start, goal, diagonal)
+                    assert path[-1:] == expected[-1:]
+                    assert math.isclose(path_cost(start, path), path_cost(start, expected))
+
+                    segment = pathfinder.next_segment(start, goal, diagonal)
+                    assert path[: len(segment)] == segment or math.isclose(
+                        path_cost(start, segment), path_cost(start, path[: len(segment)])
+                    )
+
+    def test_unreachable(self):
+        pathfinder = HierarchicalPathfinder(self.game_map)
+        self.game_map.set_kind(0, 0, WALL)
+        assert pathfinder.route(Vector2(2, 3), Vector2(0, 0)) == []
+        assert pathfinder.path(Vector2(2, 3), Vector2(2, 3)) == []
+
+    def test_rebuilt_on_changes(self):
+        graph = get_room_graph(self.game_map)
+        assert get_room_graph(self.game_map) is graph
+        assert get_room_graph(self.game_map, diagonal=False) is not graph
+
+        self.game_map.set_kind(30, 6, WALL)
+        assert get_room_graph(self.game_map) is not graph
+
+
+class RoomDistancesTest(unittest.TestCase):
+    def setUp(self):
+        self.game_map, self.rooms = three_rooms()
+
+    def test_distances(self):
+        distances = get_room_distances(self.game_map)
+        assert distances.all_connected()
+        a, b, c = self.rooms
+        # the corridor from the first room to the last one doesn't go through the second one
+        assert set(distances.adjacency[a.rid]) == {b.rid, c.rid}
+        for room in self.rooms:
+            for other in self.rooms:
+                path = astar(self.game_map, room.center, other.center)
+                assert math.isclose(
+                    distances.distance(room.rid, other.rid), path_cost(room.center, path)
+                )
+        assert get_room_distances(self.game_map) is distances
+
+    def test_unreachable(self):
+        a, b, c = self.rooms
+        # wall off the last room
+        for y in range(4, 11):
+            self.game_map.set_kind(42, y, WALL)
+        self.game_map.set_kind(42, 3, WALL)
+        self.game_map.set_kind(42, 11, WALL)
+        for x in range(42, 52):
+            self.game_map.set_kind(x, 3, WALL)
+        distances = get_room_distances(self.game_map)
+        assert not distances.all_connected()
+        assert distances.reachable(a.rid, b.rid)
+        assert not distances.reachable(a.rid, c.rid)
+        assert distances.distance(c.rid, b.rid) == math.inf
+        assert set(walking_distances(self.game_map, a.rid)) == {a.rid, b.rid}
+
+    def test_walking_distances(self):
+        distances = get_room_distances(self.game_map)
+        for room in self.rooms:
+            walking = walking_distances(self.game_map, room.rid)
+            assert set(walking) == set(distances.room_ids)
+            for other, cost in walking.items():
+                assert math.isclose(cost, distances.distance(room.rid, other))
+
+
+class GeneratedMapsTest(unittest.TestCase):
+    def setUp(self):
+        gamedata.load()
+
+    def test_all_rooms_reachable(self):
+        for algorithm in ("bsp", "tunneling"):
+            for seed in range(1, 6):
+                random.seed(seed)
+                tcod_random.init(seed)
+                world = World()
+                world.create_map(80, 60, dungeon_algorithm=algorithm)
+                game_map = world.get_current_map()
+                # generation measures only the distances from the start room
+                assert game_map.room_distances is None
+                distances = get_room_distances(game_map)
+                assert set(distances.room_ids) == set(game_map.rooms)
+                assert distances.all_connected()
+
+                # the stairs down are in one of the 3 rooms farthest from the stairs up
+                start = game_map.start_room_id
+                assert set(game_map.start_distances) == set(game_map.rooms)
+                farthest = sorted(game_map.rooms, key=lambda rid: game_map.start_distances[rid])
+                assert game_map.end_room_id in farthest[-3:]
+                for rid, cost in game_map.start_distances.items():
+                    assert math.isclose(cost, distances.distance(start, rid))
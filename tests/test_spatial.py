@@ -0,0 +1,41 @@
+import unittest
+from pyro.spatial import SpatialIndex
+
+
+class SpatialIndexTest(unittest.TestCase):
+    def setUp(self):
+        self.index = SpatialIndex(bucket_size=4)
+        self.index.add(1, 2, 2)
+        self.index.add(2, 5, 3)
+        self.index.add(3, 20, 20)
+        self.index.add(4, 2, 2)
+
+    def test_at(self):
+        assert self.index.at(2, 2) == {1, 4}
+        assert self.index.at(5, 3) == {2}
+        assert not self.index.at(0, 0)
+
+    def test_move(self):
+        self.index.add(1, 19, 20)
+        assert self.index.at(2, 2) == {4}
+        assert self.index.position(1) == (19, 20)
+        assert sorted(self.index.in_rect(16, 16, 8, 8)) == [1, 3]
+
+    def test_remove(self):
+        self.index.remove(2)
+        assert 2 not in self.index
+        assert not self.index.at(5, 3)
+        with self.assertRaises(KeyError):
+            self.index.remove(2)
+        self.index.discard(2)
+        assert len(self.index) == 3
+
+    def test_in_rect(self):
+        assert sorted(self.index.in_rect(0, 0, 6, 4)) == [1, 2, 4]
+        assert sorted(self.index.in_rect(0, 0, 5, 4)) == [1, 4]
+        assert sorted(self.index.in_rect(0, 0, 100, 100)) == [1, 2, 3, 4]
+
+    def test_in_radius(self):
+        assert sorted(self.index.in_radius(2, 2, 4)) == [1, 2, 4]
+        assert sorted(self.index.in_radius(2, 2, 3)) == [1, 4]
+        assert sorted(self.index.in_radius(2, 2, 4, only={2, 3})) == [2]
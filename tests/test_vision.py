@@ -0,0 +1,77 @@
+import unittest
+import numpy as np
+import tcod
+from pyro.vision import VisionPool
+
+
+class VisionPoolTest(unittest.TestCase):
+    def setUp(self):
+        self.fov_map = tcod.map.Map(width=30, height=20)
+        self.fov_map.transparent[:] = True
+        self.fov_map.transparent[:, 12] = False
+        self.pool = VisionPool(self.fov_map.transparent)
+
+    def test_same_as_full_map(self):
+        with self.pool.workspace() as workspace:
+            fov = workspace.compute(10, 10, 4)
+            assert (workspace.left, workspace.top) == (6, 6)
+            assert fov.shape == (9, 9)
+
+            self.fov_map.compute_fov(10, 10, radius=4, algorithm=tcod.FOV_DIAMOND)
+            assert np.array_equal(fov, self.fov_map.fov[6:15, 6:15])
+            assert self.fov_map.fov.sum() == fov.sum()
+
+            assert workspace.is_visible(11, 10)
+            assert not workspace.is_visible(13, 10)
+            assert not workspace.is_visible(25, 10)
+
+    def test_map_border(self):
+        with self.pool.workspace() as workspace:
+            fov = workspace.compute(1, 2, 4)
+            assert (workspace.left, workspace.top) == (0, 0)
+            assert fov.shape == (7, 6)
+            assert workspace.is_visible(0, 0)
+
+    def test_player_fov_untouched(self):
+        self.fov_map.compute_fov(20, 10, radius=6, algorithm=tcod.FOV_DIAMOND)
+        player_fov = self.fov_map.fov.copy()
+        with self.pool.workspace() as workspace:
+            workspace.compute(5, 5, 4)
+        assert np.array_equal(self.fov_map.fov, player_fov)
+
+    def test_shared_transparency(self):
+        with self.pool.workspace() as workspace:
+            workspace.compute(10, 10, 4)
+            assert not workspace.is_visible(13, 10)
+            self.fov_map.transparent[:, 12] = True
+            self.pool.changed()
+            workspace.compute(10, 10, 4)
+            assert workspace.is_visible(13, 10)
+
+    def test_reuse(self):
+        first = self.pool.checkout()
+        second = self.pool.checkout()
+        assert first is not second
+        self.pool.release(first)
+        assert self.pool.checkout() is first
+        assert self.pool.created == 2
+
+    def test_cached(self):
+        with self.pool.workspace() as workspace:
+            fov = workspace.compute(10, 10, 4).copy()
+            workspace.compute(20, 10, 4)
+            assert np.array_equal(workspace.compute(10, 10, 4), fov)
+            assert workspace.is_visible(11, 10)
+        assert (self.pool.cache.hits, self.pool.cache.misses) == (1, 2)
+
+    def test_compute_map_fov(self):
+        self.fov_map.compute_fov(10, 10, radius=4, algorithm=tcod.FOV_DIAMOND)
+        expected = self.fov_map.fov.copy()
+        square = self.pool.compute_map_fov(self.fov_map, 10, 10, 4)
+        assert np.array_equal(self.fov_map.fov, expected)
+
+        # the caller clears the previous square, the cached FOV is written back
+        self.fov_map.fov[square] = False
+        self.pool.compute_map_fov(self.fov_map, 10, 10, 4)
+        assert self.pool.cache.hits == 1
+        assert np.array_equal(self.fov_map.fov, expected)
@@ -0,0 +1,71 @@
+import os
+import random
+import unittest
+import numpy as np
+from pyro.gamedata import gamedata
+from pyro.utils import tcod_random
+from pyro.world import World
+
+
+class WorldResidencyTest(unittest.TestCase):
+    def setUp(self):
+        gamedata.load()
+        random.seed(1)
+        tcod_random.init(1)
+        self.world = World(resident_levels=2)
+        for level in range(1, 7):
+            self.world.create_map(60, 40, level=level, dungeon_algorithm="tunneling")
+
+    def test_old_levels_are_spilled(self):
+        resident = [i for i in range(6) if self.world.is_resident(i)]
+        # the current level (0) plus the 2 most recently created ones
+        assert resident == [0, 4, 5]
+        assert sorted(self.world.spilled) == [1, 2, 3]
+
+    def test_spilled_entities_are_detached(self):
+        em = self.world.entity_manager
+        on_maps = sum(len(self.world.maps[i].entity_index) for i in (0, 4, 5))
+        assert len(em.entities) == on_maps
+
+    def test_reload(self):
+        game_map = self.world.get_map(1)
+        assert game_map.level == 2
+        assert self.world.is_resident(1)
+        # loading level 1 spilled the least recently used level
+        assert not self.world.is_resident(4)
+        for _, eids in game_map.entity_index.items():
+            for eid in eids:
+                assert eid in self.world.entity_manager.entities
+
+    def test_roundtrip_keeps_cells(self):
+        kind = np.array(self.world.get_map(5).kind)
+        self.world.get_map(1)
+        self.world.get_map(2)
+        assert not self.world.is_resident(5)
+        assert np.array_equal(self.world.get_map(5).kind, kind)
+
+    def test_roundtrip_keeps_visited(self):
+        self.world.get_map(5).visited[10:20, 5:8] = True
+        self.world.get_map(1)
+        self.world.get_map(2)
+        assert not self.world.is_resident(5)
+        assert np.asarray(self.world.get_map(5).visited).sum() == 30
+
+    def test_revisit_spilled_level(self):
+        kind = np.array(self.world.get_map(1).kind)
+        first = self.world._loaded[1]
+        # the reloaded level can be mapped on its file
+        assert os.path.exists(first)
+
+        for _ in range(2):
+            self.world.get_map(2)
+            self.world.get_map(3)
+            assert not self.world.is_resident(1)
+            assert np.array_equal(self.world.get_map(1).kind, kind)
+        assert not os.path.exists(first)
+
+    def test_current_map_stays_resident(self):
+        self.world.set_current_map(3)
+        for i in range(6):
+            self.world.get_map(i)
+        assert self.world.is_resident(3)